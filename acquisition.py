@@ -0,0 +1,295 @@
+"""
+This module contains the acquisition of the sensors on its own thread. The producer thread runs the two tier
+detection of UltraManager (its scan_stream generator) without stopping and writes scan frames into a single
+producer / single consumer ring buffer; the state machine and the network run on the main thread and only read
+frames. On the ESP32 port the MicroPython threads share one core under the global interpreter lock: the producer
+scans while the main thread waits on the network or sleeps, it does not add a core. The frames:
+    * QUICK - every quick scan: the quick distances and the sensor that changed (-1 if none)
+    * DART - a dart was confirmed: the distances of the region of interest scan and the location of the dart
+      (solved against the baseline if the board had darts on it)
+    * FULL - a full scan asked by the consumer with request_full (confirmation of a clear board)
+
+The ring is lock free: only the producer writes head and only the consumer writes tail, the frames are
+copied into and out of preallocated arrays. If the ring is full a new QUICK frame is dropped (and counted),
+a DART or FULL frame is held by the producer until the consumer made room: the producer scans nothing and
+keeps the baseline of the dart until its frame is in the ring.
+The consumer controls the producer through request counters that only it increments and that the producer
+only copies once the request is done: rebase (new baseline of the changes, the frames of the old baseline
+are discarded) and request_full.
+
+Without threads (threaded=False, the default on the simulated board whose virtual clock is not thread safe)
+every poll of the consumer runs one step of the producer first, with the same frames.
+The producer thread leaves the garbage collector on (GcPolicy mode "auto"): gc.disable() stops it for the
+whole process, and an allocation of the main thread (HTTP, JSON, the uasyncio tasks) during a scan of several
+seconds would fail with MemoryError instead of collecting.
+The state machine awaits the frames with frame(), the other uasyncio tasks run while it waits.
+"""
+
+# Import the libraries
+from array import array
+from hal import time, asyncio, _thread, BACKEND
+from ultraSensor import QUICK, DART
+
+FULL = 3
+NO_LOCATION = -1.0e9  #   x and y of a DART frame whose location was not found
+HEADER = 4  #   kind, changed sensor, epoch, ticks_ms of every frame
+WRAP = 0xFFFF  #   head and tail wrap at 16 bits
+
+
+#   Ring buffer class
+class FrameRing:
+    """
+    This class is a single producer / single consumer ring of fixed size frames
+
+    Attributes:
+        *   width - number of values of a frame
+        *   slots - number of frames, a power of 2
+        *   head - frames written, only the producer writes it
+        *   tail - frames read, only the consumer writes it
+        *   dropped - frames dropped because the ring was full
+    """
+
+    def __init__(self, width, slots=8):
+        if slots & (slots - 1):
+            raise ValueError(slots)
+        self.width = width
+        self.slots = slots
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self._values = array("d", [0.0] * (width * slots))
+        self._header = array("l", [0] * (HEADER * slots))
+
+    #   Number of frames waiting
+    def __len__(self):
+        return (self.head - self.tail) & WRAP
+
+    #   Producer: copy a frame into the ring, False if the ring is full
+    def push(self, kind, changed, epoch, stamp, values):
+        head = self.head
+        if ((head - self.tail) & WRAP) >= self.slots:
+            self.dropped += 1
+            return False
+        slot = head & (self.slots - 1)
+        header = self._header
+        k = slot * HEADER
+        header[k] = kind
+        header[k + 1] = changed
+        header[k + 2] = epoch
+        header[k + 3] = stamp
+        buf = self._values
+        k = slot * self.width
+        for i in range(self.width):
+            buf[k + i] = values[i]
+        #   The frame is complete before the consumer can see it
+        self.head = (head + 1) & WRAP
+        return True
+
+    #   Consumer: copy the oldest frame into values and its header into header, False if the ring is empty
+    def pop(self, values, header):
+        tail = self.tail
+        if tail == self.head:
+            return False
+        slot = tail & (self.slots - 1)
+        k = slot * HEADER
+        for i in range(HEADER):
+            header[i] = self._header[k + i]
+        buf = self._values
+        k = slot * self.width
+        for i in range(self.width):
+            values[i] = buf[k + i]
+        self.tail = (tail + 1) & WRAP
+        return True
+
+    #   Consumer: drop every waiting frame
+    def flush(self):
+        self.tail = self.head
+
+
+#   Acquisition class
+class Acquisition:
+    """
+    This class runs the detection of the sensor manager as the producer of a frame ring
+
+    Attributes:
+        *   ring - FrameRing of the frames, width number of sensors + 2 (x and y of a dart)
+        *   threaded - True if the producer runs on its own thread
+        *   values - values of the last frame read by the consumer
+        *   distances - the distances of the sensors in values
+        *   kind, changed, stamp - header of the last frame read by the consumer
+        *   location - (x, y) of the last DART frame, ("None", "None") if it was not found
+        *   frames - frames produced
+        *   held - kind of the DART or FULL frame waiting for room in the ring, 0 if none
+    """
+
+    def __init__(self, manager, slots=8, threaded=None):
+        self._manager = manager
+        n = len(manager._sensors)
+        self._n = n
+        self.ring = FrameRing(n + 2, slots)
+        if threaded is None:
+            threaded = _thread is not None and BACKEND != "sim"
+        self.threaded = threaded
+        self.values = array("d", [0.0] * (n + 2))
+        self.distances = memoryview(self.values)[:n]
+        self.kind = 0
+        self.changed = -1
+        self.stamp = 0
+        self.location = ("None", "None")
+        self.frames = 0
+        self._frame = array("d", [0.0] * (n + 2))
+        self._header = array("l", [0] * HEADER)
+        self.held = 0
+        self._heldChanged = -1
+        self._heldStamp = 0
+        self._heldRequest = 0
+        #   Requests of the consumer (written by the consumer) and the requests done (written by the producer)
+        self._rebaseReq = 0
+        self._rebaseDone = 0
+        self._rebaseDistances = None
+        self._fullReq = 0
+        self._fullDone = 0
+        #   The baseline has darts on it, the location of a new dart is the change against it
+        self._stacked = False
+        self._stream = manager.scan_stream()
+        self._running = False
+        self._stopped = True
+
+    ################################ Producer ################################
+
+    #   Start the producer thread, its scans do not turn the garbage collector off (the main thread allocates)
+    def start(self):
+        if not self.threaded or self._running:
+            return
+        self._manager.gc.mode = "auto"
+        self._running = True
+        self._stopped = False
+        _thread.start_new_thread(self._run, ())
+
+    #   Ask the producer thread to stop after its current step, stopped is True once it did
+    def stop(self):
+        self._running = False
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def _run(self):
+        try:
+            while self._running:
+                self.step()
+        finally:
+            self._stopped = True
+
+    #   Copy a frame into the ring, a DART or FULL frame that does not fit is held until it does
+    def _push(self, kind, changed, distances, x=0.0, y=0.0, request=0):
+        frame = self._frame
+        for i in range(self._n):
+            frame[i] = distances[i]
+        frame[self._n] = x
+        frame[self._n + 1] = y
+        self.frames += 1
+        if kind == QUICK:
+            self.ring.push(kind, changed, self._rebaseDone, time.ticks_ms(), frame)
+            return
+        self.held = kind
+        self._heldChanged = changed
+        self._heldStamp = time.ticks_ms()
+        self._heldRequest = request
+        self._release()
+
+    #   Copy the held frame into the ring and do what comes after it: the board with a dart becomes the baseline
+    #   of the next one, a full scan request is done. Returns False if the ring is still full
+    def _release(self):
+        kind = self.held
+        if not self.ring.push(kind, self._heldChanged, self._rebaseDone, self._heldStamp, self._frame):
+            return False
+        self.held = 0
+        if kind == DART:
+            self._manager.set_baseline(memoryview(self._frame)[:self._n])
+            self._stacked = True
+        else:
+            self._fullDone = self._heldRequest
+        return True
+
+    #   One step of the producer: the held frame, the requests of the consumer, then the next frame of the scan
+    #   stream
+    def step(self):
+        manager = self._manager
+        if self.held:
+            if self.held == DART and self._rebaseReq != self._rebaseDone:
+                #   The consumer asked for a new baseline, the dart of the old one is not wanted any more
+                self.held = 0
+            elif not self._release():
+                if self.threaded:
+                    time.sleep_ms(1)
+                return
+        if self._fullReq != self._fullDone:
+            self._push(FULL, -1, manager.read_distances(), request=self._fullReq)
+            return
+        if self._rebaseReq != self._rebaseDone:
+            request = self._rebaseReq
+            distances = self._rebaseDistances
+            manager.set_baseline(distances)
+            self._stacked = distances is not None
+            self._rebaseDone = request
+        kind, index, distances = next(self._stream)
+        if kind != DART:
+            self._push(kind, index, distances)
+            return
+        if self._stacked:
+            x, y = manager.get_new_location()
+        else:
+            x, y = manager.get_location()
+        if not isinstance(x, (int, float)):
+            x, y = NO_LOCATION, NO_LOCATION
+        #   Once the frame is in the ring the board with this dart is the baseline of the next one
+        self._push(DART, index, distances, x, y)
+
+    ################################ Consumer ################################
+
+    #   Drop the waiting frames
+    def flush(self):
+        self.ring.flush()
+
+    #   Ask for a new baseline: the given distances (a board with darts) or a quick scan of the board as it is
+    #   The waiting frames and the frames of the old baseline are dropped
+    def rebase(self, distances=None):
+        self._rebaseDistances = list(distances) if distances is not None else None
+        self._rebaseReq = (self._rebaseReq + 1) & WRAP
+        self.ring.flush()
+
+    #   Ask for a full scan, it comes as a FULL frame
+    def request_full(self):
+        self._fullReq = (self._fullReq + 1) & WRAP
+
+    #   Read the next frame of the current baseline, returns its kind (0 if there is none)
+    def poll(self):
+        if not self.threaded:
+            self.step()
+        header = self._header
+        while self.ring.pop(self.values, header):
+            if header[2] != self._rebaseReq:
+                continue
+            self.kind = header[0]
+            self.changed = header[1]
+            self.stamp = header[3]
+            if self.kind == DART:
+                x = self.values[self._n]
+                y = self.values[self._n + 1]
+                self.location = ("None", "None") if x == NO_LOCATION else (x, y)
+            return self.kind
+        return 0
+
+    #   Wait for a frame of the given kind until the deadline (ticks_ms), the other tasks run while there is no
+    #   frame. Returns the kind, 0 once the deadline passed
+    async def frame(self, kind, deadline):
+        while time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            got = self.poll()
+            if got == kind:
+                return got
+            #   Let the other tasks run: right away after a frame of another kind (without threads every poll
+            #   is a scan), for 5 ms while the ring is empty
+            await asyncio.sleep_ms(5 if self.threaded and got == 0 else 0)
+        return 0
+
@@ -0,0 +1,89 @@
+"""
+This module contains the state of the turn of a player for the dart detection of the state machine.
+One GameDart state finds every dart of the turn, what it does for each dart comes from a table with one
+row per dart (PLAN):
+    * baseline - CLEAR: the player pulled the darts out, the changes are tested against the clear board
+                 STACKED: the darts stay on the board, the changes are tested against the board with the
+                 darts before this one and the location is solved from what changed
+    * timeout_ms - time to wait for the dart, after it the dart is sent as missed
+
+The distances and the location of every dart are kept in fixed arrays, reused from one turn to the next.
+"""
+
+# Import the libraries
+from array import array
+
+CLEAR = 0
+STACKED = 1
+MISSED = -1.0e9     #   x and y of a dart that was not found
+
+#   Darts of a turn: the board is cleared before every dart
+PLAN = ((CLEAR, 10000), (CLEAR, 10000), (CLEAR, 10000))
+
+
+#   Bullseye: every sensor sees the dart at the center of the board (about 20 cm away)
+def bullseye(distances):
+    for distance in distances:
+        if distance <= 18 or distance >= 22:
+            return False
+    return True
+
+
+#   Turn class
+class Turn:
+    """
+    This class keeps the darts of the turn of a player
+
+    Attributes:
+        *   plan - table of the darts, one (baseline, timeout_ms) row per dart
+        *   number - index of the dart being waited for, len(plan) once the turn is over
+        *   x, y - locations of the darts of the turn, MISSED for a dart that was not found
+        *   distances - distances of the board after the last dart, the baseline of a STACKED dart
+    """
+
+    def __init__(self, n, plan=PLAN):
+        self.plan = plan
+        self.number = 0
+        self.x = array("d", [MISSED] * len(plan))
+        self.y = array("d", [MISSED] * len(plan))
+        self.distances = array("d", [0.0] * n)
+
+    #   Start a new turn
+    def start(self):
+        self.number = 0
+        for k in range(len(self.plan)):
+            self.x[k] = MISSED
+            self.y[k] = MISSED
+
+    #   True once every dart of the turn was found or missed
+    def over(self):
+        return self.number >= len(self.plan)
+
+    #   True if the next dart is thrown on a clear board
+    def clear(self):
+        return self.over() or self.plan[self.number][0] == CLEAR
+
+    #   Timeout in ms of the dart being waited for
+    def timeout(self):
+        return self.plan[self.number][1]
+
+    #   Baseline of the dart being waited for: the distances of the board with the darts, None for a clear board
+    def baseline(self):
+        if self.plan[self.number][0] == STACKED:
+            return self.distances
+        return None
+
+    #   Record the dart being waited for: its location and the distances of the board after it (None if the dart
+    #   was missed), returns the location of the dart (the center of the board for a bullseye)
+    def record(self, location, distances=None):
+        k = self.number
+        if distances is not None:
+            for i in range(len(self.distances)):
+                self.distances[i] = distances[i]
+            if bullseye(distances):
+                location = (0, 0)
+        if isinstance(location[0], (int, float)):
+            self.x[k] = location[0]
+            self.y[k] = location[1]
+        self.number = k + 1
+        return location
@@ -0,0 +1,192 @@
+"""
+This module contains the interrupt driven echo capture for the ultrasonic sensors.
+The trigger reaches the sensors through the multiplexer, so only one sensor can be triggered at a time,
+but every sensor has its own echo pin. A group of sensors is triggered one after the other (a few us apart)
+and the rising and falling edges of all their echo pins are timestamped at the same time by Pin.irq
+handlers into a preallocated ring buffer. The echoes of the group overlap instead of being read one by one
+with time_pulse_us, so one round of pings over the 10 sensors takes as long as a few echoes.
+
+Adjacent sensors look at the same part of the board and can hear the burst of each other, so the groups
+only contain sensors that are at least `spacing` positions apart on the ring:
+    * spacing 2 - {0, 2, 4, 6, 8} and {1, 3, 5, 7, 9}
+    * spacing 3 - {0, 3, 6}, {1, 4, 7}, {2, 5, 8} and {9}
+"""
+
+# Import the libraries
+from hal import Pin, time
+from array import array
+
+RING_SIZE = 256     #   Number of edges in the ring buffer, power of 2
+HEAD_MASK = 0x3FFFFFFF  #   The count of edges wraps at 30 bits: it stays a small int, a hard irq can not allocate
+
+
+#   Function to split the sensors of a ring in groups of sensors that are not adjacent
+def make_groups(count, spacing=2):
+    groups = []
+    for i in range(count):
+        for group in groups:
+            ok = True
+            for j in group:
+                d = abs(i - j)
+                if min(d, count - d) < spacing:
+                    ok = False
+                    break
+            if ok:
+                group.append(i)
+                break
+        else:
+            groups.append([i])
+    return groups
+
+
+#   Capture class
+class EchoCapture:
+    """
+    This class triggers groups of sensors and captures their echoes with interrupts
+
+    Attributes:
+        *   sensors - list of UltraSensor objects, the index is the mux channel
+        *   multi - multiplexer object
+        *   groups - list of lists of sensor indexes that are triggered together
+        *   window - maximum time in us to wait for the echoes of a group
+    """
+
+    def __init__(self, sensors, multi, spacing=2, window=6000, poll=50):
+        self._sensors = sensors
+        self._multi = multi
+        self._trig = sensors[0]._trig
+        self.groups = make_groups(len(sensors), spacing)
+        self.window = window
+        self._poll = poll
+        #   Ring buffer of edges: timestamp and (index of the sensor << 1 | level of the echo pin)
+        self._times = array("l", [0] * RING_SIZE)
+        self._codes = bytearray(RING_SIZE)
+        self._head = 0
+        self._mask = RING_SIZE - 1
+        #   Rising edge of the current ping of each sensor, -1 if there is none
+        self._start = array("l", [-1] * len(sensors))
+        self._active = bytearray(len(sensors))
+        self._done = bytearray(len(sensors))
+        self._handlers = []
+        self._enabled = False
+
+    #   Create the irq handler of a sensor, the handler only writes to the preallocated buffers
+    def _make_handler(self, index):
+        times = self._times
+        codes = self._codes
+        mask = self._mask
+        code = index << 1
+        def handler(pin):
+            head = self._head
+            times[head & mask] = time.ticks_us()
+            codes[head & mask] = code | pin.value()
+            self._head = (head + 1) & HEAD_MASK
+        return handler
+
+    #   Attach the irq handlers to the echo pins
+    def enable(self):
+        if self._enabled:
+            return
+        if not self._handlers:
+            self._handlers = [self._make_handler(i) for i in range(len(self._sensors))]
+        for i in range(len(self._sensors)):
+            self._sensors[i]._echo.irq(handler=self._handlers[i],
+                                       trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        self._enabled = True
+
+    #   Detach the irq handlers so time_pulse_us can be used again
+    def disable(self):
+        if not self._enabled:
+            return
+        for sensor in self._sensors:
+            sensor._echo.irq(handler=None)
+        self._enabled = False
+
+    #   Trigger every sensor of the group and wait until all the echoes are back or the window is over
+    #   The echo durations are written to the sample store of each sensor
+    def ping_group(self, group):
+        trig = self._trig
+        start = self._head
+        for i in group:
+            self._multi.set_channel(i)
+            trig.value(1)
+            time.sleep_us(10)
+            trig.value(0)
+        expected = 2 * len(group)
+        t0 = time.ticks_us()
+        while ((self._head - start) & HEAD_MASK) < expected and time.ticks_diff(time.ticks_us(), t0) < self.window:
+            time.sleep_us(self._poll)
+        count = (self._head - start) & HEAD_MASK
+        #   Decode the edges, late edges of sensors that are not in the group are ignored
+        times = self._times
+        codes = self._codes
+        mask = self._mask
+        begin = self._start
+        active = self._active
+        for i in group:
+            begin[i] = -1
+            active[i] = 1
+        for n in range(count):
+            k = start + n
+            code = codes[k & mask]
+            i = code >> 1
+            if not active[i]:
+                continue
+            if code & 1:
+                begin[i] = times[k & mask]
+            elif begin[i] >= 0:
+                sensor = self._sensors[i]
+                if sensor._count < len(sensor._samples):
+                    sensor._samples[sensor._count] = time.ticks_diff(times[k & mask], begin[i])
+                    sensor._count += 1
+                begin[i] = -1
+        for i in group:
+            active[i] = 0
+
+    #   Read iterations pings of every sensor into the sample store of each sensor
+    #   If the sensors have a tolerance, a sensor stops being triggered once its readings agree (see
+    #   UltraSensor.check_stats) and its store is emptied if too many of its pings failed
+    def scan(self, iterations):
+        sensors = self._sensors
+        adaptive = sensors[0]._tolerance > 0
+        done = self._done
+        for i in range(len(sensors)):
+            done[i] = 0
+            sensors[i]._store()
+            sensors[i].pings = 0
+            sensors[i]._stats.reset()
+        self.enable()
+        try:
+            for _ in range(iterations):
+                for group in self.groups:
+                    if adaptive:
+                        group = [i for i in group if not done[i]]
+                        if not group:
+                            continue
+                    self.ping_group(group)
+                    for i in group:
+                        sensors[i].pings += 1
+                if adaptive and self._check(done):
+                    break
+        finally:
+            self.disable()
+
+    #   Update the running statistics of the sensors that are still sampling, returns True when all are done
+    def _check(self, done):
+        finished = True
+        for i in range(len(self._sensors)):
+            if done[i]:
+                continue
+            sensor = self._sensors[i]
+            stats = sensor._stats
+            values = sensor._samples
+            for k in range(stats.n, sensor._count):
+                stats.add(values[k])
+            state = sensor.check_stats(sensor.pings)
+            if state == 2:
+                sensor._count = 0
+            if state:
+                done[i] = state
+            else:
+                finished = False
+        return finished
@@ -0,0 +1,183 @@
+"""
+This module contains the estimators that reduce the echo durations of one reading to a single value.
+All of them work on the echo durations in us (a list, or the first n values of a preallocated array)
+and return a value in us:
+    * trim - the original loop that removes the lowest and highest values until 50 are left (O(n^2))
+    * trimmed - same trimmed mean, the cut values are found with quickselect in linear time
+    * median - median found with quickselect in linear time
+    * histogram - median of a fixed point histogram of the durations, updated one ping at a time
+
+The selection functions reorder the list in place and do not allocate, so they can run on the ESP32
+for every sensor of every scan.
+"""
+
+# Import the libraries
+from array import array
+from kernels import sum_range
+
+ESTIMATORS = ("trim", "trimmed", "median", "histogram")
+KEEP = 50   #   Number of values kept by the trimmed mean
+
+
+#   Original estimator: remove the lowest and highest values until keep values are left and average them
+def trim_mean(values, keep=KEEP, n=None):
+    if n is not None:
+        values = list(values[:n])
+    while len(values) > keep:
+        values.remove(min(values))
+        values.remove(max(values))
+    return sum(values) / len(values)
+
+
+#   Put the k-th smallest value of values[lo:hi] at index k, smaller values before it and bigger after it
+def select(values, k, lo=0, hi=None):
+    if hi is None:
+        hi = len(values)
+    hi -= 1
+    while hi > lo:
+        #   Median of three pivot
+        mid = (lo + hi) >> 1
+        a = values[lo]
+        b = values[mid]
+        c = values[hi]
+        if a < b:
+            if b < c:
+                pivot = b
+            elif a < c:
+                pivot = c
+            else:
+                pivot = a
+        elif a < c:
+            pivot = a
+        elif b < c:
+            pivot = c
+        else:
+            pivot = b
+        #   Hoare partition
+        i = lo
+        j = hi
+        while i <= j:
+            while values[i] < pivot:
+                i += 1
+            while values[j] > pivot:
+                j -= 1
+            if i <= j:
+                values[i], values[j] = values[j], values[i]
+                i += 1
+                j -= 1
+        if k <= j:
+            hi = j
+        elif k >= i:
+            lo = i
+        else:
+            break
+    return values[k]
+
+
+#   Same result as trim_mean in linear time: the values removed by the loop are found with quickselect
+def trimmed_mean(values, keep=KEEP, n=None):
+    if n is None:
+        n = len(values)
+    if n <= keep:
+        total = 0
+        for i in range(n):
+            total += values[i]
+        return total / n
+    #   The loop removes one value from each side until keep values are left
+    cut = (n - keep + 1) >> 1
+    select(values, cut, 0, n)
+    select(values, n - cut - 1, cut, n)
+    if isinstance(values, array):
+        #   Viper kernel on the sample store (see kernels.py)
+        total = sum_range(values, cut, n - cut)
+    else:
+        total = 0
+        for i in range(cut, n - cut):
+            total += values[i]
+    return total / (n - 2 * cut)
+
+
+#   Median in linear time with quickselect
+def median(values, n=None):
+    if n is None:
+        n = len(values)
+    half = n >> 1
+    upper = select(values, half, 0, n)
+    if n & 1:
+        return upper
+    #   The lower middle value is the biggest value before the upper middle value
+    lower = values[0]
+    for i in range(1, half):
+        if values[i] > lower:
+            lower = values[i]
+    return (lower + upper) / 2
+
+
+#   Histogram of the echo durations with buckets of 2**shift us
+class Histogram:
+    """
+    This class keeps a fixed point histogram of the echo durations of one reading
+
+    Attributes:
+        *   shift - the bucket width is 2**shift us (8 us = 0.14 cm for shift 3)
+        *   size - number of buckets, longer durations go to the last bucket
+        *   n - number of values added
+    """
+
+    def __init__(self, shift=3, size=512):
+        self.shift = shift
+        self.size = size
+        self._counts = array("H", [0] * size)
+        self.n = 0
+        #   Range of buckets used, only these are scanned and cleared
+        self._lo = size
+        self._hi = -1
+
+    def reset(self):
+        counts = self._counts
+        for i in range(self._lo, self._hi + 1):
+            counts[i] = 0
+        self.n = 0
+        self._lo = self.size
+        self._hi = -1
+
+    def add(self, value):
+        bucket = int(value) >> self.shift
+        if bucket >= self.size:
+            bucket = self.size - 1
+        self._counts[bucket] += 1
+        self.n += 1
+        if bucket < self._lo:
+            self._lo = bucket
+        if bucket > self._hi:
+            self._hi = bucket
+
+    #   Median of the values, interpolated inside the bucket of the median
+    def median(self):
+        counts = self._counts
+        half = self.n / 2
+        seen = 0
+        for i in range(self._lo, self._hi + 1):
+            count = counts[i]
+            if count and seen + count >= half:
+                return ((i + (half - seen) / count) * (1 << self.shift))
+            seen += count
+        return 0
+
+
+#   Function to estimate the echo duration in us from a list of durations with the given estimator
+def estimate(name, values, histogram=None, n=None):
+    if name == "trimmed":
+        return trimmed_mean(values, KEEP, n)
+    if name == "median":
+        return median(values, n)
+    if name == "histogram":
+        if histogram is None:
+            histogram = Histogram()
+        if n is None:
+            n = len(values)
+        histogram.reset()
+        for i in range(n):
+            histogram.add(values[i])
+        return histogram.median()
+    return trim_mean(values, KEEP, n)
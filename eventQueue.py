@@ -0,0 +1,312 @@
+"""
+This module contains the outbound queue of the events sent to the game server (darts and next turns).
+The detection states only append the event to the queue, the events are sent later when the state machine
+is idle, so a slow or unreachable server does not stall the detection and no dart is lost:
+    * Sequence numbers - every event carries a "seq" number that grows with every event of the board and
+      is never reused (it survives a reset through the ack file). The server remembers the numbers it
+      processed and answers a repeated event without processing it again, so an event can be sent again
+      whenever its reply was lost
+    * Acknowledgements - the server answers the seq of the events it processed ("seq" or "acks" in the
+      reply), the queue only forgets an event once it was acknowledged
+    * Write-ahead log - every event is appended as one JSON line to a log file on the flash before it is
+      sent, and the sequence number under which every event was acknowledged is written to an ack file.
+      After a reset the events of the log that were not acknowledged are loaded and sent again.
+      A torn last line (power lost during the write) is skipped.
+    * Pipelining - up to window requests are written on the connection at once (HttpClient.apipeline)
+    * Batching - consecutive darts are sent in one "sendDarts" request of up to batch darts. If the server
+      does not know that action the queue falls back to one "sendDart" request per dart
+    * Wire format - the requests are encoded by a Codec (wire.py): binary frames if the server answers
+      them, JSON otherwise
+    * Backoff - after a failed request the queue waits before trying again, the wait doubles after every
+      failure up to a maximum and is reset by a success. A failed write of the ack file or of the log (a full
+      or worn flash) and an unexpected error of the sender task are counted and backed off the same way, the
+      sender task never ends
+    * Dead letters - a dart the server answered with "success": false is not sent again (it would hold
+      every later event behind it): it is appended with the reply to the dead letter file and counted.
+      The darts of a rejected batch are sent again one by one first, so only the bad dart is set aside
+    * Sender task - run() is a uasyncio task that sleeps until an event is put in the queue or the backoff
+      is over, then sends; the state machine awaits the replies it needs with reply(). The requests do not
+      block the other tasks while they wait for the server (HttpClient.apipeline)
+
+The log is emptied once every event was acknowledged, and rewritten with only the pending events when
+too many acknowledged events are left at its start.
+"""
+
+# Import the libraries
+import os
+from hal import time, ujson, asyncio
+from wire import Codec
+
+COMPACT = 64    #   Acknowledged events at the start of the log that trigger a rewrite
+
+
+#   Queue class
+class EventQueue:
+    """
+    This class stores the events on the flash and sends them to the server in the background
+
+    Attributes:
+        *   client - HttpClient used for the requests
+        *   url - url of the server
+        *   headers - headers of the requests
+        *   path - path of the log file, the ack file is path + ".ack" and the dead letter file path + ".dead"
+        *   batch - maximum number of darts in one request (1 disables batching)
+        *   window - maximum number of requests in flight on the connection
+        *   timeout - timeout in seconds of a request
+        *   codec - Codec of the wire format
+        *   backoff_ms - wait after the first failure, doubled after every failure up to max_backoff_ms
+        *   sent - number of events acknowledged by the server
+        *   duplicates - number of events the server had already processed
+        *   failures - number of failed requests
+        *   rejected - number of darts rejected by the server and set aside in the dead letter file
+        *   flash_errors - number of failed writes of the ack file or of the log after an acknowledgement
+        *   errors - number of unexpected errors of the sender task
+        *   ready - Event set when an event is put in the queue, wakes the sender task
+    """
+
+    def __init__(self, client, url, headers=None, path="outbox.log", batch=5, window=4, timeout=2,
+                 backoff_ms=1000, max_backoff_ms=60000, codec=None):
+        self.client = client
+        self.url = url
+        self.headers = headers
+        self.path = path
+        self.batch = batch
+        self.window = window
+        self.timeout = timeout
+        self.codec = codec if codec is not None else Codec()
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.sent = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.rejected = 0
+        self.flash_errors = 0
+        self.errors = 0
+        self._pending = []          #   Events not acknowledged yet, in order of seq
+        self._replies = {}          #   Replies of the acknowledged events that are not darts, by seq
+        self._acked = 0             #   Every event up to this seq was acknowledged
+        self._seq = 0               #   Sequence number of the last event put in the queue
+        self._dropped = 0           #   Acknowledged events still at the start of the log
+        self._wait = 0              #   Current backoff in ms, 0 when the last request succeeded
+        self._split = 0             #   Darts up to this seq are sent one by one (their batch was rejected)
+        self._next = time.ticks_ms()
+        self.ready = asyncio.Event()
+        self._load()
+        if self._pending:
+            self.ready.set()
+
+    #   Number of events waiting to be sent
+    def __len__(self):
+        return len(self._pending)
+
+    #   Read the ack file and the log, keep the events that were not acknowledged
+    def _load(self):
+        try:
+            with open(self.path + ".ack") as f:
+                self._acked = int(f.read() or 0)
+        except (OSError, ValueError):
+            self._acked = 0
+        self._seq = self._acked
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        event = ujson.loads(line)
+                        seq = event["seq"]
+                    except (ValueError, TypeError, KeyError):
+                        continue
+                    if seq > self._seq:
+                        self._seq = seq
+                    if seq > self._acked:
+                        self._pending.append(event)
+                    else:
+                        self._dropped += 1
+        except OSError:
+            pass
+
+    #   Give the event the next sequence number, append it to the log and to the queue, returns its seq
+    def put(self, event):
+        self._seq += 1
+        event["seq"] = self._seq
+        with open(self.path, "a") as f:
+            f.write(ujson.dumps(event))
+            f.write("\n")
+        self._pending.append(event)
+        self.ready.set()
+        return self._seq
+
+    #   True while the event with this seq was not acknowledged
+    def is_pending(self, seq):
+        for event in self._pending:
+            if event["seq"] == seq:
+                return True
+        return False
+
+    #   Group the oldest pending events in at most window requests: list of (action, list of events)
+    def _requests(self):
+        requests = []
+        for event in self._pending:
+            batch = event.get("action") == "sendDart" and self.batch > 1 and event["seq"] > self._split
+            if batch and requests and requests[-1][0] == "sendDarts" and len(requests[-1][1]) < self.batch:
+                requests[-1][1].append(event)
+                continue
+            if len(requests) == self.window:
+                break
+            requests.append(("sendDarts" if batch else event.get("action"), [event]))
+        return requests
+
+    #   Send the oldest pending events if the backoff is over, returns the number of events acknowledged
+    #   A failed request, a reply that is not one and a failed write of the flash only move the next try further
+    #   away, run() also catches any other error
+    async def pump(self):
+        if not self._pending or time.ticks_diff(time.ticks_ms(), self._next) < 0:
+            return 0
+        requests = self._requests()
+        codec = self.codec
+        bodies = [codec.encode(action, events) for (action, events) in requests]
+        try:
+            responses = await self.client.apipeline("POST", self.url, bodies, codec.headers(self.headers),
+                                                    self.timeout)
+        except Exception:
+            self._fail()
+            return 0
+        acked = []
+        rejected = []
+        ok = len(responses) == len(requests)
+        fallback = False
+        for k in range(len(responses)):
+            action, events = requests[k]
+            try:
+                reply = codec.decode(responses[k])
+            except Exception:
+                #   A body that is not a reply: bad JSON, a binary frame that is too short
+                ok = False
+                continue
+            if reply is None:
+                #   The server does not know the binary format, the codec switched to JSON
+                fallback = True
+                break
+            if not isinstance(reply, dict):
+                #   Valid JSON that is not an object is not a reply of the server
+                ok = False
+                continue
+            if action != "sendDarts" and action != "sendDart":
+                #   Any answer acknowledges a request that is not a dart, the caller waits for the reply
+                if responses[k].status_code != 200:
+                    ok = False
+                    continue
+                self._replies[events[0]["seq"]] = reply
+                acked.append(events[0]["seq"])
+            elif reply.get("success") == True:
+                self.duplicates += reply.get("duplicates", 1 if reply.get("duplicate") else 0)
+                #   A server without sequence numbers acknowledges the whole request
+                acked.extend(reply.get("acks") or [event["seq"] for event in events])
+            elif len(events) > 1 and "success" not in reply:
+                #   The server does not know the batch action, send the darts one by one from now on
+                self.batch = 1
+                fallback = True
+                break
+            elif "success" in reply and responses[k].status_code == 200:
+                #   The server rejected the darts: a batch is sent again one by one, a single dart is set aside
+                if len(events) > 1:
+                    self._split = max(self._split, events[-1]["seq"])
+                    fallback = True
+                    break
+                self._reject(events[0], reply)
+                rejected.append(events[0]["seq"])
+            else:
+                ok = False
+        if ok or fallback:
+            #   A format fallback is sent again right away
+            self._wait = 0
+            self._next = time.ticks_ms()
+        else:
+            self._fail()
+        return self._ack(acked, rejected)
+
+    #   Sender task: send the pending events, sleep through the backoff and wait for new events when the queue
+    #   is empty
+    #   An unexpected error is counted and backed off like a failed request, it does not end the task
+    async def run(self):
+        while True:
+            try:
+                if not self._pending:
+                    self.ready.clear()
+                    await self.ready.wait()
+                wait = time.ticks_diff(self._next, time.ticks_ms())
+                if wait > 0:
+                    await asyncio.sleep_ms(wait)
+                await self.pump()
+            except Exception:
+                self.errors += 1
+                self._backoff()
+            await asyncio.sleep_ms(0)
+
+    #   Wait until the event with this seq is acknowledged by the sender task or the deadline (ticks_ms) passed
+    #   Returns the reply of the server, or None if the event is still pending
+    async def reply(self, seq, deadline):
+        while self.is_pending(seq) and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            await asyncio.sleep_ms(20)
+        if self.is_pending(seq):
+            return None
+        return self._replies.pop(seq, {})
+
+    #   Count a failed request and double the wait before the next try
+    def _fail(self):
+        self.failures += 1
+        self._backoff()
+
+    #   Double the wait before the next try
+    def _backoff(self):
+        if self._wait:
+            self._wait = min(self._wait * 2, self.max_backoff_ms)
+        else:
+            self._wait = self.backoff_ms
+        self._next = time.ticks_add(time.ticks_ms(), self._wait)
+
+    #   Append a rejected dart and the reply of the server to the dead letter file
+    def _reject(self, event, reply):
+        self.rejected += 1
+        try:
+            with open(self.path + ".dead", "a") as f:
+                f.write(ujson.dumps({"event": event, "reply": reply}))
+                f.write("\n")
+        except OSError:
+            pass
+
+    #   Forget the acknowledged and the rejected events, write the ack file and compact the log, returns the
+    #   number of events acknowledged. A failed write is counted and backed off: the events are already
+    #   forgotten, after a reset the server gets them again and answers them as duplicates
+    def _ack(self, seqs, rejected=()):
+        if not seqs and not rejected:
+            return 0
+        count = len(self._pending)
+        self._pending = [event for event in self._pending if event["seq"] not in seqs and
+                         event["seq"] not in rejected]
+        count -= len(self._pending)
+        self._dropped += count
+        count -= len(rejected)
+        self.sent += count
+        #   The ack file holds the seq under which every event was acknowledged
+        acked = self._pending[0]["seq"] - 1 if self._pending else self._seq
+        try:
+            if acked != self._acked:
+                with open(self.path + ".ack", "w") as f:
+                    f.write(str(acked))
+                self._acked = acked
+            if not self._pending:
+                #   Everything was acknowledged: empty the log
+                open(self.path, "w").close()
+                self._dropped = 0
+            elif self._dropped >= COMPACT:
+                #   Rewrite the log with the pending events, on littlefs the rename replaces it in one step
+                with open(self.path + ".tmp", "w") as f:
+                    for event in self._pending:
+                        f.write(ujson.dumps(event))
+                        f.write("\n")
+                os.rename(self.path + ".tmp", self.path)
+                self._dropped = 0
+        except OSError:
+            self.flash_errors += 1
+            self._backoff()
+        return count
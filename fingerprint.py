@@ -0,0 +1,134 @@
+"""
+This module contains the fingerprint index of the board: a grid over the board with the distance that every
+sensor is expected to read for a dart at each point of the grid. A scan is matched against the grid to get
+a location in bounded time, which the least squares solver then only has to polish.
+
+The index is built on a host by tools/make_fingerprints.py and stored in a compact binary file:
+    * header (struct HEADER): magic "PDFP", version, number of sensors, units per cm, range in cm,
+      x0 and y0 of the first point in mm, step in mm, number of points in x and y
+    * one byte per sensor and grid point, row by row (y outer, x inner): the expected distance in
+      1/units cm, saturated at the range (the sensor does not see the dart)
+
+The lookup is coarse to fine: every `coarse`-th point of the grid first, then every point around the best one.
+A scan that less than two sensors read under the range, or whose best score is shared by two grid points that
+are not neighbours, does not tell where the dart is: the lookup returns None and the solver starts on its own.
+"""
+
+# Import the libraries
+import struct
+import kernels
+
+MAGIC = b"PDFP"
+VERSION = 1
+HEADER = "<4sBBBBhhHHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+
+#   Function to write an index file, vectors is a list of lists of distances in cm (row by row)
+def write(path, x0, y0, step, nx, ny, vectors, units=4, range_cm=30):
+    sensors = len(vectors[0])
+    data = bytearray(nx * ny * sensors)
+    limit = range_cm * units
+    k = 0
+    for vector in vectors:
+        for d in vector:
+            data[k] = min(int(d * units + 0.5), limit)
+            k += 1
+    with open(path, "wb") as f:
+        f.write(struct.pack(HEADER, MAGIC, VERSION, sensors, units, range_cm,
+                            int(round(x0 * 10)), int(round(y0 * 10)), int(round(step * 10)), nx, ny))
+        f.write(data)
+    return HEADER_SIZE + len(data)
+
+
+#   Index class
+class FingerprintIndex:
+    """
+    This class keeps the fingerprint grid in memory and finds the grid point closest to a scan
+
+    Attributes:
+        *   x0, y0 - location in cm of the first grid point
+        *   step - distance in cm between grid points
+        *   nx, ny - number of grid points in x and y
+        *   coarse - stride of the coarse search in grid points
+    """
+
+    def __init__(self, blob):
+        (magic, version, self.sensors, self.units, self.range, x0, y0, step,
+         self.nx, self.ny) = struct.unpack(HEADER, blob[:HEADER_SIZE])
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a fingerprint index")
+        self.x0 = x0 / 10
+        self.y0 = y0 / 10
+        self.step = step / 10
+        self._data = memoryview(blob)[HEADER_SIZE:]
+        if len(self._data) != self.nx * self.ny * self.sensors:
+            raise ValueError("truncated fingerprint index")
+        #   About 4 cm between the points of the coarse search
+        self.coarse = max(1, int(4 / self.step + 0.5))
+        self._query = bytearray(self.sensors)
+        self._mask = None
+
+    #   Function to load an index file, returns None if the file does not exist
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "rb") as f:
+                return cls(f.read())
+        except OSError:
+            return None
+
+    def _score(self, ix, iy):
+        if self._mask is not None:
+            return kernels.ssd8_mask(self._data, (iy * self.nx + ix) * self.sensors, self._query, self._mask,
+                                     self.sensors)
+        return kernels.ssd8(self._data, (iy * self.nx + ix) * self.sensors, self._query, self.sensors)
+
+    #   Function to find the grid point that best matches the distances, returns (x, y, score), or None if the
+    #   match is ambiguous (less than two sensors under the range, or a tie between two points that are not
+    #   neighbours)
+    #   mask has a 0 for every sensor left out of the match (a quarantined sensor), None to use them all
+    def lookup(self, distances, mask=None):
+        self._mask = mask
+        units = self.units
+        limit = self.range * units
+        query = self._query
+        seen = 0
+        for i in range(self.sensors):
+            d = int(distances[i] * units + 0.5)
+            query[i] = limit if d > limit else (d if d > 0 else 0)
+            if d < limit and (mask is None or mask[i]):
+                seen += 1
+        if seen < 2:
+            return None
+        #   Coarse search
+        coarse = self.coarse
+        best = -1
+        bx = by = 0
+        tied = False
+        for iy in range(0, self.ny, coarse):
+            for ix in range(0, self.nx, coarse):
+                score = self._score(ix, iy)
+                if best < 0 or score < best:
+                    best = score
+                    bx = ix
+                    by = iy
+                    tied = False
+                elif score == best:
+                    tied = True
+        #   Fine search around the best coarse point
+        cx = bx
+        cy = by
+        for iy in range(max(cy - coarse, 0), min(cy + coarse + 1, self.ny)):
+            for ix in range(max(cx - coarse, 0), min(cx + coarse + 1, self.nx)):
+                score = self._score(ix, iy)
+                if score < best:
+                    best = score
+                    bx = ix
+                    by = iy
+                    tied = False
+                elif score == best and (abs(ix - bx) > 1 or abs(iy - by) > 1):
+                    tied = True
+        if tied:
+            return None
+        return (self.x0 + bx * self.step, self.y0 + by * self.step, best)
@@ -0,0 +1,83 @@
+"""
+This module contains the garbage collector policy of the sensor scans.
+MicroPython runs the collector whenever an allocation does not fit in the heap, which can happen in the
+middle of a ping burst and delay the measurement of the echoes. The policy turns the collector off while
+a scan runs and collects between scans instead:
+    * auto - the collector is left alone
+    * scan - collect after every scan
+    * threshold - collect before a scan only when less than threshold bytes are free
+
+The counters of the last scan (allocated bytes, time spent collecting) and the totals are kept so they
+can be reported. gc.disable() applies to the whole process: when the scans run on their own thread while
+another thread allocates, the mode has to be auto (acquisition.py does it), an allocation with the collector
+off fails with MemoryError instead of collecting. On CPython the allocated bytes are only counted while tracemalloc is running.
+"""
+
+# Import the libraries
+from hal import gc, time
+import metrics
+
+MODES = ("auto", "scan", "threshold")
+
+
+#   Policy class
+class GcPolicy:
+    """
+    This class decides when the garbage collector runs around the sensor scans
+
+    Attributes:
+        *   mode - one of MODES
+        *   threshold - free bytes under which the threshold mode collects before a scan
+        *   allocated - bytes allocated by the last scan
+        *   gc_us - time in us spent collecting for the last scan
+        *   scans, collections, total_allocated, total_gc_us - totals since the policy was created
+    """
+
+    def __init__(self, mode="threshold", threshold=16384):
+        if mode not in MODES:
+            raise ValueError(mode)
+        self.mode = mode
+        self.threshold = threshold
+        self.allocated = 0
+        self.gc_us = 0
+        self.scans = 0
+        self.collections = 0
+        self.total_allocated = 0
+        self.total_gc_us = 0
+        self._alloc = 0
+        self._depth = 0
+
+    #   Called before a scan, scans inside a scan are part of the outer one
+    def begin_scan(self):
+        self._depth += 1
+        if self._depth > 1:
+            return
+        self.gc_us = 0
+        if self.mode == "threshold" and gc.mem_free() < self.threshold:
+            self._collect()
+        if self.mode != "auto":
+            gc.disable()
+        self._alloc = gc.mem_alloc()
+
+    #   Called after a scan
+    def end_scan(self):
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        #   The collector can run during the scan in auto mode and free more than was allocated
+        self.allocated = max(gc.mem_alloc() - self._alloc, 0)
+        self.total_allocated += self.allocated
+        self.scans += 1
+        if self.mode != "auto":
+            gc.enable()
+            if self.mode == "scan":
+                self._collect()
+
+    def _collect(self):
+        t0 = time.ticks_us()
+        gc.collect()
+        elapsed = time.ticks_diff(time.ticks_us(), t0)
+        self.gc_us += elapsed
+        self.total_gc_us += elapsed
+        self.collections += 1
+        metrics.registry.add(metrics.GC, elapsed)
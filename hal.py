@@ -0,0 +1,53 @@
+"""
+Hardware abstraction layer of the Point Detector.
+On the ESP32 this module re-exports the MicroPython modules, on CPython the same names are provided
+by the simulated dartboard in simboard.py. Every other module imports the hardware from here:
+    * Pin, time_pulse_us - GPIO pins and the echo pulse measurement
+    * time - sleep, sleep_ms, sleep_us, ticks_ms, ticks_us, ticks_diff
+    * network - WiFi station interface
+    * requests - urequests HTTP client
+    * socket, ssl - sockets and TLS for the persistent HTTP client (httpClient.py)
+    * ujson - JSON encoder and decoder
+    * NeoPixel - LED ring driver
+    * gc - garbage collector (collect, enable, disable, mem_alloc, mem_free)
+    * micropython - code emitter decorators (native, viper) and const
+    * asyncio - uasyncio, the cooperative scheduler of the state machine (run, create_task, sleep_ms, Event)
+    * _thread - threads of the acquisition (acquisition.py), the MicroPython and the CPython modules have the
+      same start_new_thread, None on a firmware built without threads
+    * BACKEND - "esp32" or "sim"
+    * board - the SimBoard object of the simulation (None on the ESP32)
+"""
+
+try:
+    from machine import Pin, time_pulse_us
+    import time
+    import network
+    import urequests as requests
+    import socket
+    import ssl
+    import ujson
+    from neopixel import NeoPixel
+    import gc
+    import micropython
+    import uasyncio as asyncio
+    BACKEND = "esp32"
+    board = None
+except ImportError:
+    import json as ujson
+    import socket
+    import ssl
+    import simboard
+    from simboard import Pin, NeoPixel, network, requests, gc, micropython, asyncio
+    BACKEND = "sim"
+    board = simboard.SimBoard()
+    Pin.board = board
+    NeoPixel.board = board
+    simboard.SimGc.board = board
+    simboard.SimLoop.board = board
+    time = board.clock
+    time_pulse_us = board.time_pulse_us
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
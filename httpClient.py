@@ -0,0 +1,369 @@
+"""
+This module contains the HTTP/1.1 client used for the calls to the game server.
+urequests opens a new socket (and a new TLS session for https) for every request and the socket is only
+released when the response is closed. This client keeps one connection per server alive and reuses it:
+    * Keep-alive - the requests are sent with "Connection: keep-alive" and the whole body of the response
+      is read (Content-Length or chunked), so the next request can be sent on the same connection
+    * Reconnect - if a reused connection was closed by the server (or the WiFi dropped) before any byte of
+      the response came back, the request is sent again once on a new connection, the caller does not see it.
+      A timeout is never retried: the server may still be handling the request
+    * Timeout - every socket operation of a request times out after the timeout of the request and the
+      connection is dropped, the caller gets an OSError like with urequests
+    * Pipelining - several requests can be written at once and their responses read in order, for
+      requests that the server can safely receive twice (see eventQueue.py)
+    * Non-blocking - the sockets never block: the coroutines (arequest, apipeline) check the socket every
+      slice_ms and sleep in between, so a long-poll held by the server or a slow reply does not stall the
+      other uasyncio tasks. The blocking calls (request, pipeline) run the same code and wait on the socket
+      instead of sleeping. The TLS handshake of a new connection and the DNS lookup still block
+    * One request at a time - a client sends one request (or one pipeline) at a time, the tasks that can
+      send at the same time use their own client
+
+The responses have the same attributes as the urequests ones (status_code, content, text, json(), close())
+and the content type of the body.
+"""
+
+# Import the libraries
+import errno
+import select
+from hal import socket, ssl, ujson, time, asyncio, BACKEND
+import metrics
+
+#   Errors of a non-blocking socket that is not ready yet
+_WOULD_BLOCK = (errno.EAGAIN, errno.EINPROGRESS)
+_SSL_WANT = tuple(getattr(ssl, name) for name in ("SSLWantReadError", "SSLWantWriteError") if hasattr(ssl, name))
+#   Errors of a connection that the server closed (MicroPython has no errno.EPIPE) and the error of a response
+#   cut by the end of the connection
+_RESET = (errno.ECONNRESET, errno.ECONNABORTED, errno.ENOTCONN, getattr(errno, "EPIPE", 32))
+CLOSED = "connection closed"
+
+
+#   Response with the same attributes as the urequests one, the body is already read
+class Response:
+
+    def __init__(self, status_code, content, content_type=None):
+        self.status_code = status_code
+        self.content = content
+        self.content_type = content_type
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return ujson.loads(self.content)
+
+    def close(self):
+        pass
+
+
+#   Function to split a url in (scheme, host, port, path)
+def split_url(url):
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    path = slash + path
+    port = 443 if scheme == "https" else 80
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return (scheme, host, port, path or "/")
+
+
+#   Function to check if an error of a non-blocking socket only means that it is not ready yet
+def would_block(error):
+    return isinstance(error, _SSL_WANT) or (len(error.args) > 0 and error.args[0] in _WOULD_BLOCK)
+
+
+#   Function to check if an error means that the connection was closed (reset, broken pipe or end of the connection)
+def was_closed(error):
+    return len(error.args) > 0 and (error.args[0] in _RESET or error.args[0] == CLOSED)
+
+
+#   Function to parse the response at the start of buf
+#   Returns (bytes used, status, body, server closes the connection, content type), or None if buf does not hold
+#   the whole response yet. eof is True once the server closed the connection, a response that is not complete
+#   then raises OSError
+def parse_response(buf, method, eof=False):
+    end = buf.find(b"\r\n\r\n")
+    if end < 0:
+        if eof:
+            raise OSError(CLOSED)
+        return None
+    lines = bytes(buf[:end]).split(b"\r\n")
+    parts = lines[0].split(None, 2)
+    status = int(parts[1])
+    close = parts[0] == b"HTTP/1.0"
+    length = None
+    chunked = False
+    content_type = None
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        value = value.strip()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding":
+            chunked = value.lower() == b"chunked"
+        elif name == b"connection":
+            close = value.lower() == b"close"
+        elif name == b"content-type":
+            content_type = value.split(b";")[0].strip().decode()
+    start = end + 4
+    if method == "HEAD" or status == 204 or status == 304:
+        return (start, status, b"", close, content_type)
+    if chunked:
+        body = b""
+        pos = start
+        while True:
+            eol = buf.find(b"\r\n", pos)
+            if eol < 0:
+                break
+            size = int(bytes(buf[pos:eol]).split(b";")[0], 16)
+            pos = eol + 2
+            if size == 0:
+                #   Trailers until the empty line
+                while True:
+                    eol = buf.find(b"\r\n", pos)
+                    if eol < 0:
+                        break
+                    if eol == pos:
+                        return (eol + 2, status, body, close, content_type)
+                    pos = eol + 2
+                break
+            if len(buf) < pos + size + 2:
+                break
+            body += buf[pos:pos + size]
+            pos += size + 2
+    elif length is None:
+        #   The body ends when the server closes the connection
+        if eof:
+            return (len(buf), status, bytes(buf[start:]), True, content_type)
+    elif len(buf) >= start + length:
+        return (start + length, status, bytes(buf[start:start + length]), close, content_type)
+    if eof:
+        raise OSError(CLOSED)
+    return None
+
+
+#   Function to run a coroutine that never suspends (the blocking calls of the client), returns its result
+def complete(coro):
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("the coroutine suspended")
+
+
+#   Client class
+class HttpClient:
+    """
+    This class sends HTTP/1.1 requests over persistent connections
+
+    Attributes:
+        *   timeout - timeout in seconds of a request
+        *   keep_alive - keep the connection open after a request (False sends "Connection: close")
+        *   context - ssl context used for https on CPython (None for the default context)
+        *   slice_ms - time between two checks of a socket that is not ready
+        *   connects - number of connections opened (TCP and TLS handshakes)
+        *   requests - number of requests sent
+    """
+
+    def __init__(self, timeout=5, keep_alive=True, context=None, slice_ms=10):
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.context = context
+        self.slice_ms = slice_ms
+        self.connects = 0
+        self.requests = 0
+        #   Open connections: (scheme, host, port) -> [socket, bytes received and not parsed yet]
+        self._connections = {}
+        #   Deadline (ticks_ms) and time left in ms of the request being sent, the time left only counts the
+        #   checks of the socket (the virtual clock of the simulation does not move while the server answers)
+        self._deadline = 0
+        self._left = 0
+
+    #   Wait until the socket is ready for event (select.POLLIN or select.POLLOUT), raises OSError once the
+    #   time of the request is over. Without blocking the task sleeps between two checks and the other tasks run
+    async def _ready(self, sock, event, blocking):
+        poller = select.poll()
+        poller.register(sock, event)
+        #   The simulation also waits on the socket: its clock is virtual but the server answers in real time
+        wait = self.slice_ms if blocking or BACKEND == "sim" else 0
+        while not poller.poll(wait):
+            self._left -= self.slice_ms
+            if self._left <= 0 or time.ticks_diff(self._deadline, time.ticks_ms()) <= 0:
+                raise OSError(errno.ETIMEDOUT)
+            if not blocking:
+                await asyncio.sleep_ms(self.slice_ms)
+
+    #   Open a connection to the server, the TLS handshake is done here for https (it blocks up to the timeout)
+    async def _connect(self, scheme, host, port, blocking):
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        sock.setblocking(False)
+        try:
+            try:
+                sock.connect(address)
+            except OSError as e:
+                if not would_block(e):
+                    raise
+            await self._ready(sock, select.POLLOUT, blocking)
+            if scheme == "https":
+                sock.settimeout(max(self._left, self.slice_ms) / 1000)
+                if hasattr(ssl, "create_default_context"):
+                    context = self.context or ssl.create_default_context()
+                    sock = context.wrap_socket(sock, server_hostname=host)
+                else:
+                    sock = ssl.wrap_socket(sock, server_hostname=host)
+                sock.setblocking(False)
+        except:
+            sock.close()
+            raise
+        self.connects += 1
+        return [sock, b""]
+
+    #   Write all the data on the socket
+    async def _send(self, sock, data, blocking):
+        #   MicroPython TLS sockets only have write()
+        send = getattr(sock, "send", None) or sock.write
+        view = memoryview(data)
+        sent = 0
+        while sent < len(data):
+            try:
+                n = send(view[sent:])
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                n = None
+            if n:
+                sent += n
+            else:
+                await self._ready(sock, select.POLLOUT, blocking)
+
+    #   Read the next response from the connection, returns (status, body, server closes the connection,
+    #   content type)
+    async def _receive(self, connection, method, blocking):
+        sock = connection[0]
+        recv = getattr(sock, "recv", None) or sock.read
+        eof = False
+        while True:
+            result = parse_response(connection[1], method, eof)
+            if result is not None:
+                connection[1] = connection[1][result[0]:]
+                return result[1:]
+            try:
+                data = recv(1024)
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                data = None
+            if data is None:
+                #   Nothing to read yet (a TLS socket can hold data that the poll does not see, so it is read first)
+                await self._ready(sock, select.POLLIN, blocking)
+            elif data:
+                connection[1] += data
+            else:
+                #   The server closed the connection
+                eof = True
+
+    #   Close the connection to a server, or all the connections
+    def close(self, key=None):
+        keys = [key] if key is not None else list(self._connections)
+        for k in keys:
+            connection = self._connections.pop(k, None)
+            if connection is None:
+                continue
+            try:
+                connection[0].close()
+            except OSError:
+                pass
+
+    #   Send a request and return a Response, raises OSError if the server can not be reached in time
+    def request(self, method, url, data=None, json=None, headers=None, timeout=None):
+        if json is not None:
+            data = ujson.dumps(json)
+        return self.pipeline(method, url, [data], headers, timeout)[0]
+
+    #   Coroutine of request, the other tasks run while the request waits for the server
+    async def arequest(self, method, url, data=None, json=None, headers=None, timeout=None):
+        if json is not None:
+            data = ujson.dumps(json)
+        return (await self.apipeline(method, url, [data], headers, timeout))[0]
+
+    #   Send several requests on one connection without waiting for the responses in between
+    #   Returns the responses received in order, fewer than the requests if the connection dropped after
+    #   some of them (the others may or may not have reached the server), raises OSError if there is none
+    def pipeline(self, method, url, bodies, headers=None, timeout=None):
+        return complete(self._timed(method, url, bodies, headers, timeout, True))
+
+    #   Coroutine of pipeline, the other tasks run while the requests wait for the server
+    async def apipeline(self, method, url, bodies, headers=None, timeout=None):
+        return await self._timed(method, url, bodies, headers, timeout, False)
+
+    #   Requests of pipeline, the time of the whole pipeline goes to the HTTP timer of the metrics
+    async def _timed(self, method, url, bodies, headers, timeout, blocking):
+        t0 = time.ticks_us()
+        if timeout is None:
+            timeout = self.timeout
+        self._deadline = time.ticks_add(time.ticks_ms(), int(timeout * 1000))
+        self._left = int(timeout * 1000)
+        try:
+            if not self.keep_alive and len(bodies) > 1:
+                #   One connection per request
+                responses = []
+                for body in bodies:
+                    responses.append((await self._pipeline(method, url, [body], headers, blocking))[0])
+                return responses
+            return await self._pipeline(method, url, bodies, headers, blocking)
+        finally:
+            metrics.registry.since_us(metrics.HTTP, t0)
+
+    async def _pipeline(self, method, url, bodies, headers, blocking):
+        scheme, host, port, path = split_url(url)
+        key = (scheme, host, port)
+        data = b""
+        for body in bodies:
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            head = "%s %s HTTP/1.1\r\nHost: %s\r\nConnection: %s\r\nContent-Length: %d\r\n" % (
+                method, path, host, "keep-alive" if self.keep_alive else "close", len(body) if body else 0)
+            if headers:
+                for name in headers:
+                    head += "%s: %s\r\n" % (name, headers[name])
+            data += (head + "\r\n").encode("utf-8")
+            if body:
+                data += body
+        self.requests += len(bodies)
+        #   A reused connection can have been closed by the server since the last request: retry once, only if the
+        #   connection was found closed before any byte of the response came back (not after a timeout)
+        for attempt in (0, 1):
+            reused = key in self._connections
+            if not reused:
+                self._connections[key] = await self._connect(scheme, host, port, blocking)
+            connection = self._connections[key]
+            responses = []
+            close = False
+            try:
+                await self._send(connection[0], data, blocking)
+                while len(responses) < len(bodies) and not close:
+                    status, content, close, content_type = await self._receive(connection, method, blocking)
+                    responses.append(Response(status, content, content_type))
+            except OSError as e:
+                self.close(key)
+                if responses:
+                    return responses
+                if reused and attempt == 0 and not connection[1] and was_closed(e):
+                    continue
+                raise
+            if close or not self.keep_alive:
+                self.close(key)
+            return responses
+
+    def post(self, url, **kw):
+        return self.request("POST", url, **kw)
+
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
+
+    #   Coroutine of post
+    async def apost(self, url, **kw):
+        return await self.arequest("POST", url, **kw)
@@ -0,0 +1,168 @@
+"""
+This module contains the hottest code of the detector as small kernels compiled to machine code on the ESP32:
+    * ping_burst - trigger / echo pulse / store loop of UltraSensor.read_distance, optionally paced by the echo
+      window (native)
+    * wait_low - wait for the end of the echo pulse of an earlier ping before the next trigger (native)
+    * sum_range - sum of a range of the sample store, used by the trimmed mean (viper)
+    * center_point - location of a dart seen by a single sensor (native)
+    * circle_intersection - intersection points of the circles of two sensors (native)
+    * ssd8 - distance between a fingerprint of the index and the quantized distances of a scan (viper)
+    * ssd8_mask - the same distance over the sensors selected by a mask (viper)
+    * pack_u16 - echo durations of the sample store packed as 16 bit words for the scan trace (viper)
+
+On MicroPython the @micropython.native and @micropython.viper decorators make the compiler emit machine code
+(the compiler only recognises them written exactly like that). On CPython hal.py provides a micropython
+object whose decorators return the function unchanged and the viper pointer casts are defined here, so the
+same code runs as plain Python.
+"""
+
+# Import the libraries
+from hal import time_pulse_us, time, micropython, BACKEND
+import math
+
+if BACKEND == "sim":
+    #   Viper pointer casts, on CPython the array is indexed directly
+    def ptr32(buf):
+        return buf
+    ptr16 = ptr8 = ptr32
+
+sleep_us = time.sleep_us
+ticks_us = time.ticks_us
+ticks_diff = time.ticks_diff
+
+ECHO_HOLD_US = 40000    #   Longest echo pulse of a HC-SR04, it holds the pin high about 38 ms when no echo comes back
+
+
+#   Wait until the echo pin is low, at most ECHO_HOLD_US. A sensor that got no echo (or an echo from further than
+#   the gate) keeps its echo pin high and ignores the trigger meanwhile: time_pulse_us would then time the end of
+#   that pulse as a short echo
+@micropython.native
+def wait_low(echo):
+    if not echo.value():
+        return
+    t0 = ticks_us()
+    while echo.value() and ticks_diff(ticks_us(), t0) < ECHO_HOLD_US:
+        sleep_us(20)
+
+
+#   Fire iterations pings and store the echo durations in us in samples from index start
+#   A ping is only fired once the echo pin is low and period us after the previous one (0 fires right after the
+#   echo)
+#   Returns the index after the last stored duration
+@micropython.native
+def ping_burst(trig, echo, samples, start, iterations, timeout, period=0):
+    count = start
+    size = len(samples)
+    for i in range(iterations):
+        wait_low(echo)
+        fired = ticks_us()
+        trig.value(0)
+        sleep_us(2)
+        trig.value(1)
+        sleep_us(10)
+        trig.value(0)
+        try:
+            duration = time_pulse_us(echo, 1, timeout)
+        except OSError:
+            duration = 0
+        if duration > 0 and count < size:
+            samples[count] = duration
+            count += 1
+        #   Wait until the echo window of this ping is closed, late echoes would be taken by the next ping
+        if period:
+            wait = period - ticks_diff(ticks_us(), fired)
+            if wait > 0:
+                sleep_us(wait)
+    return count
+
+
+#   Sum of buf[lo:hi] for an array of 32 bit integers
+@micropython.viper
+def sum_range(buf, lo: int, hi: int) -> int:
+    p = ptr32(buf)
+    total = 0
+    i = lo
+    while i < hi:
+        total += p[i]
+        i += 1
+    return total
+
+
+#   Location of a dart seen by one sensor at (x1, y1) at r1 cm, on the line from the sensor to the center
+@micropython.native
+def center_point(x1, y1, r1):
+    #   Calculate the distance from the center (0, 0) and the sensor
+    d = math.sqrt(x1 * x1 + y1 * y1)
+    #   Get second radius
+    r2 = d - r1
+    a = (r1 * r1 - r2 * r2 + d * d) / (2 * d)
+    return (x1 - a * x1 / d, y1 - a * y1 / d)
+
+
+#   Intersection points of the circle of radius r1 at (x1, y1) and the circle of radius r2 at (x2, y2)
+#   Returns (rX1, rY1, rX2, rY2), or None if the circles are disjoint or one is inside the other
+@micropython.native
+def circle_intersection(x1, y1, r1, x2, y2, r2):
+    dx = x2 - x1
+    dy = y2 - y1
+    # Calculate the distance between the centers of the two circles
+    d = math.sqrt(dx * dx + dy * dy)
+    # Check if the two circles overlap or are disjoint
+    if d > r1 + r2 or d < abs(r1 - r2):
+        return None
+    a = (r1 * r1 - r2 * r2 + d * d) / (2 * d)
+    #   Tangent circles can give a tiny negative value from rounding
+    h = math.sqrt(max(r1 * r1 - a * a, 0))
+    x3 = x1 + a * dx / d
+    y3 = y1 + a * dy / d
+    return (x3 + h * dy / d, y3 - h * dx / d, x3 - h * dy / d, y3 + h * dx / d)
+
+
+#   Sum of the squared differences between n bytes of buf from offset and the n bytes of query
+@micropython.viper
+def ssd8(buf, offset: int, query, n: int) -> int:
+    p = ptr8(buf)
+    q = ptr8(query)
+    total = 0
+    i = 0
+    while i < n:
+        d = int(p[offset + i]) - int(q[i])
+        total += d * d
+        i += 1
+    return total
+
+
+#   Sum of the squared differences like ssd8, only over the bytes where mask is not 0
+@micropython.viper
+def ssd8_mask(buf, offset: int, query, mask, n: int) -> int:
+    p = ptr8(buf)
+    q = ptr8(query)
+    m = ptr8(mask)
+    total = 0
+    i = 0
+    while i < n:
+        if m[i]:
+            d = int(p[offset + i]) - int(q[i])
+            total += d * d
+        i += 1
+    return total
+
+
+#   Pack count values of samples as little endian 16 bit words into buf from offset, clamped to 0..65535
+#   Returns the offset after the last word
+@micropython.viper
+def pack_u16(buf, offset: int, samples, count: int) -> int:
+    p = ptr8(buf)
+    s = ptr32(samples)
+    i = 0
+    while i < count:
+        v = int(s[i])
+        if v < 0:
+            v = 0
+        if v > 65535:
+            v = 65535
+        p[offset] = v & 0xFF
+        p[offset + 1] = (v >> 8) & 0xFF
+        offset += 2
+        i += 1
+    return offset
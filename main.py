@@ -7,16 +7,17 @@
                             This state will finish when the server sends a new game 
             - ClearBoard:   Check until the reading of all the sensors is more than 35 cm
 
-            - GameDart1:    Gets the location of the first dart, and sends it to the server
-                            After 10 if the dart is not in the board sends false to the server
-            - GameDart2:    Gets the location of the second dart, and sends it to the server
-                            After 10 if the dart is not in the board sends false to the server
-            - GameDart3:    Gets the location of the third dart, and sends it to the server
+            - GameDart:     Gets the location of the next dart of the turn, and sends it to the server
                             After 10 if the dart is not in the board sends false to the server
+                            The table of the turn (dartTurn.PLAN) says for every dart if the board is
+                            cleared before it and how long to wait for it
 
             - NextTurn:     Will ask the server for if a new turn is available, if it is, then it will
                             move to the ClearBoard state, if not, then it will move to the NoGame state
 
+        The states are uasyncio coroutines: they await the frames of the acquisition and the replies of the
+        server until a deadline instead of sleeping, the queued events are sent by their own task meanwhile.
+
 
         The sensors are connected to the Multiplexer as follows:
             - Sensor 0: Channel 0
@@ -52,15 +53,18 @@
 """
 
 # Import the libraries
-from machine import Pin, time_pulse_us
-import time
+from hal import Pin, time, network, NeoPixel, asyncio
 from mux import Mux
 from ultraSensor import *
-import math
-import network
-import urequests as requests
-import ujson
-from neopixel import NeoPixel
+from scoring import Scorer
+from httpClient import HttpClient
+from eventQueue import EventQueue
+from wire import Codec
+from pollScheduler import PollScheduler
+from acquisition import Acquisition, QUICK, DART, FULL
+from dartTurn import Turn
+from scanTrace import ScanTrace
+from metrics import registry, MetricsServer
 
 # Create the Multiplexer object
 mux = Mux(18, 5, 17, 16, 19)
@@ -85,15 +89,27 @@ sensors = [sensor0, sensor1, sensor2, sensor3, sensor4, sensor5, sensor6, sensor
 
 #   Create Sensor Manager
 sensor_manager = UltraManager(sensors, mux)
+#   Starting locations of the solver from the fingerprint index, if it was uploaded (tools/make_fingerprints.py)
+sensor_manager.load_fingerprints()
+
+#   Record the echoes and the results of the scans to the flash to replay a bad throw on a host
+#   (tools/replay_trace.py), off by default to spare the flash
+record_trace = False
+if record_trace:
+    sensor_manager.set_trace(ScanTrace(len(sensors)))
+
+#   Acquisition of the sensors on its own thread, the states read its frames
+acquisition = Acquisition(sensor_manager)
+
+#   Create the scoring engine of the board
+scorer = Scorer()
 
 # Create an enum for the states
 class State:
     NoGame = 0
     ClearBoard = 1
-    GameDart1 = 2
-    GameDart2 = 3
-    GameDart3 = 4
-    NextTurn = 5
+    GameDart = 2
+    NextTurn = 3
 
 # Create the variables for the states
 state = State.NoGame
@@ -104,16 +120,13 @@ game = False
 game_id = 0
 player_id = 0
 player_Turn = 1
+turn_seq = None     #   Sequence number of the nextTurn request waiting for its reply
 game_turn = 1
-dart_number = 1
-dart1_location = (0,0)
-dart2_location = (0,0)
-dart3_location = (0,0)
-# Create list of distances, d1Distances, d2Distances
+#   Darts of the turn of the player
+turn = Turn(len(sensors))
+dart_location = (0,0)
+# Create list of distances
 distances = []
-d1Distances = []
-d2Distances = []
-d3Distances = []
 
 # # Create the variables for the WiFi
 wifi = False
@@ -162,29 +175,42 @@ def NeoPixelPurple():
         np[i] = (64, 0, 64)
     np.write()
 
-############################### Testing ########################################
-#   Connect to the WiFi
-NeoPixelBlue()
-sta_if = network.WLAN(network.STA_IF)
-if not sta_if.isconnected():
-    print('connecting to network...')
-    sta_if.active(True)
-    sta_if.connect(wifi_ssid, wifi_password)
-    while not sta_if.isconnected():
-        pass
-print('network config:', sta_if.ifconfig())
-NeoPixelGreen()
-#   Delay for 1 seconds
-time.sleep(1)
+############################### WiFi ########################################
+#   Function to connect to the WiFi
+async def ConnectWiFi():
+    NeoPixelBlue()
+    sta_if = network.WLAN(network.STA_IF)
+    if not sta_if.isconnected():
+        print('connecting to network...')
+        sta_if.active(True)
+        sta_if.connect(wifi_ssid, wifi_password)
+        #   Check the connection every 100 ms, the other tasks run in between
+        while not sta_if.isconnected():
+            await asyncio.sleep_ms(100)
+    print('network config:', sta_if.ifconfig())
+    NeoPixelGreen()
+
 #   Define the url
 url = "https://thor.cnt.sast.ca/~kevenlou/mobileToEsp/esp.php"
 #   Create header with a cookie with a session id
 headers = {"Cookie": "PHPSESSID=1234567890"}
+#   HTTP client that keeps the connection to the server open between the requests
+client = HttpClient(timeout=5)
+#   HTTP client of the gettingNewGame requests, a long-poll holds its connection while the queue sends the darts
+poll_client = HttpClient(timeout=5)
+#   Wire format of the requests, binary frames with a fallback to json
+codec = Codec()
+#   Queue of the dart events, they are written to the flash and sent when the board is idle
+outbox = EventQueue(client, url, headers, codec=codec)
+#   Scheduler of the requests while there is no game
+poller = PollScheduler()
+#   Counters of the scans, the solver, the requests and the states, served on http://<board>:8080/metrics
+metrics_server = MetricsServer(registry, 8080)
 
 ################################ Game Functions ################################
 
 #   Function to check if there is a game
-def NoGame():
+async def NoGame():
     global game
     global game_id
     global player_id
@@ -192,16 +218,12 @@ def NoGame():
     global url
     global headers
     NeoPixelBlue()
-    #   Request to the server
-    data = {"action": "gettingNewGame"}
-    #   convert the data to json
-    data_json = ujson.dumps(data)
     try:
-        response = requests.post(url, data=data_json, headers=headers)
-        #   Get the response
-        response = response.text
-        #   Convert the response to json
-        response = ujson.loads(response)
+        #   Request to the server, in the binary format if the server knows it, otherwise in json
+        #   A server with long-poll holds the request until there is a game, the other tasks run meanwhile
+        response = await codec.apost(poll_client, url, "gettingNewGame", [poller.request()], headers,
+                                     poller.timeout())
+        delay = poller.update(response)
         #   Check the gameStatus
         game = response["gameStatus"]
         #   If there is a game, then get the game_id, player_id, and game_turn
@@ -214,342 +236,195 @@ def NoGame():
             print("Game Turn: " + str(game_turn))
         else:
             print("No Game")
-        response.close()
     except:
         print("Error")
+        delay = poller.failed()
     
     #   Check if there is a game
     if game == False:
+        #   Wait before the next request (backoff with jitter, none after a long-poll)
+        await asyncio.sleep_ms(delay)
         return State.NoGame
-    #   If there is a game, then move to the ClearBoard state
+    #   If there is a game, then move to the ClearBoard state for the first dart of the turn
+    turn.start()
     return State.ClearBoard
 
 #   Function to clear the board
-def ClearBoard():
+async def ClearBoard():
     global distances
-    global dart1_location
-    global dart2_location
-    global dart3_location
-    global d1Distances
-    global d2Distances
-    global d3Distances
     # Set neopixel to orange
     NeoPixelOrange()
-    distances = sensor_manager.read_distances()
-    # If all the distances are more than 35 cm, then move to the GameDart1 state
-    for distance in distances:
+    #   Quick presence scan first (the next quick frame), the full scan only confirms that the board is clear
+    acquisition.flush()
+    if not await acquisition.frame(QUICK, time.ticks_add(time.ticks_ms(), 1000)):
+        return State.ClearBoard
+    for distance in acquisition.distances:
         if distance < 30:
             return State.ClearBoard
-    #   Reset the game variables
-    dart1_location = (0,0)
-    dart2_location = (0,0)
-    dart3_location = (0,0)
-    d1Distances = []
-    d2Distances = []
-    d3Distances = []
-    return State.GameDart1
-
-#   Function to detect the first dart
-def GameDart1():
-    #   Global variables
-    global distances
-    global dart1_location
-    global dart2_location
-    global dart3_location
-    global d1Distances
-    global d2Distances
-    global d3Distances
-    global dart_number
-    #   Cheack if there is a game
-    if game == False:
-        return State.NoGame
-    #   Set the timer
-    timer = time.ticks_ms()
-    #   Set the NeoPixel to green
-    NeoPixelGreen()
-    #   Read the distances until a dart is detected or 10 seconds have passed
-    while time.ticks_diff(time.ticks_ms(), timer) < 10000:        
-        #   Read the distances
-        distances = sensor_manager.read_distances()
-        bullseye = 0
-        for distance in distances:
-            if distance > 18 and distance < 22:
-                bullseye = bullseye + 1
-            else:
-                bullseye = 0
-        #   If the bullseye is detected, then move to the GameDart2 state
-        if bullseye == 10:
-            #   Set the NeoPixel to red if a dart is detected
-            NeoPixelRed()
-            dart1_location = (0,0)
-            print("Dart 1 Location: " + str(dart1_location))
-            d1Distances = distances
-            #   Send the dart location to the server
-            SendDartLocation(dart1_location)
-            return State.GameDart2
-        #   If a dart is detected, then move to the GameDart2 state
-        for distance in distances:
-            if distance < 30:
-                #   Set the NeoPixel to red if a dart is detected
-                NeoPixelRed()
-                #   Read the distances
-                distances = sensor_manager.read_distances()
-                #   Get the location of the dart
-                if dart_number == 1:
-                    dart1_location = sensor_manager.get_location()
-                    print("Dart 1 Location: " + str(dart1_location))
-                    #   Send the dart location to the server
-                    SendDartLocation(dart1_location)
-                    d1Distances = distances
-                    dart_number = dart_number + 1
-                    return State.ClearBoard
-                elif dart_number == 2:
-                    dart2_location = sensor_manager.get_location()
-                    print("Dart 2 Location: " + str(dart2_location))
-                    #   Send the dart location to the server
-                    SendDartLocation(dart2_location)
-                    d2Distances = distances
-                    dart_number = dart_number + 1
-                    return State.ClearBoard
-                elif dart_number == 3:
-                    dart3_location = sensor_manager.get_location()
-                    print("Dart 3 Location: " + str(dart3_location))
-                    #   Send the dart location to the server
-                    SendDartLocation(dart3_location)
-                    d3Distances = distances
-                    dart_number = 1
-                    return State.NextTurn
-        #   Wait 1 second
-        time.sleep(1)
-    #   If 20 seconds have passed, then move to the GameDart2 state
-    NeoPixelRed()
-    
-    #   Send the dart location to the server depending on the dart number
-    if dart_number == 1:
-        dart1_location = ("None","None")
-        SendDartLocation(dart1_location)
-        print("Dart 1 Location: " + str(dart1_location))
+    acquisition.request_full()
+    if not await acquisition.frame(FULL, time.ticks_add(time.ticks_ms(), 10000)):
         return State.ClearBoard
-    elif dart_number == 2:
-        dart2_location = ("None","None")
-        SendDartLocation(dart2_location)
-        print("Dart 2 Location: " + str(dart2_location))
-        return State.ClearBoard
-    elif dart_number == 3:
-        dart3_location = ("None","None")
-        SendDartLocation(dart3_location)
-        print("Dart 3 Location: " + str(dart3_location))
-        return State.NextTurn
-
-#   Function to detect the second dart
-def GameDart2():
-    #   Global variables
-    global distances
-    global dart1_location
-    global dart2_location
-    global d1Distances
-    global d2Distances
-    #   Cheack if there is a game
-    if game == False:
-        return State.NoGame
-    #   Set the timer
-    timer = time.ticks_ms()
-    #   Set the NeoPixel to green
-    NeoPixelGreen()
-    #   Read the distances until a dart is detected or 20 seconds have passed
-    while time.ticks_diff(time.ticks_ms(), timer) < 20000:
-        distances = sensor_manager.read_distances()
-        #   Check if the distances are the same as the first dart
-        if (sensor_manager.check_same(d1Distances, distances)):
-            continue
-        #   Wait 1 second
-        time.sleep(1)
-        #   Set the NeoPixel to red if a dart is detected
-        NeoPixelRed()
-        #   Read the distances
-        distances = sensor_manager.read_distances()
-        #   Get the location of the second dart
-        dart2_location = sensor_manager.get_dart_location(d1Distances, distances)
-        print("Dart 2 Location: " + str(dart2_location))
-        if dart2_location == (None,None):
-            continue
-        else:            
-            #   Send the dart location to the server
-            SendDartLocation(dart2_location)
-            d2Distances = distances
-            return State.GameDart3
-        
-    #   If 10 seconds have passed, then move to the GameDart3 state
-    NeoPixelRed()
-    dart2_location = ("None","None")
-    print("Dart 2 Location: " + str(dart2_location))
-    #   Send the dart location to the server
-    SendDartLocation(dart2_location)
-    d2Distances = distances
-    return State.GameDart3
+    distances = list(acquisition.distances)
+    # If all the distances are more than 35 cm, then move to the GameDart state
+    for distance in distances:
+        if distance < 30:
+            return State.ClearBoard
+    return State.GameDart
 
-#   Function to detect the third dart
-def GameDart3():
+#   Function to detect the darts of the turn, one dart per call as the table of the turn says
+async def GameDart():
     #   Global variables
     global distances
-    global dart2_location
-    global dart3_location
-    global d2Distances
-
+    global dart_location
     #   Cheack if there is a game
     if game == False:
         return State.NoGame
-    #   Set the timer
-    timer = time.ticks_ms()
+    #   Deadline of the dart
+    deadline = time.ticks_add(time.ticks_ms(), turn.timeout())
     #   Set the NeoPixel to green
     NeoPixelGreen()
-    #   Read the distances until a dart is detected or 20 seconds have passed
-    while time.ticks_diff(time.ticks_ms(), timer) < 20000:
-        distances = sensor_manager.read_distances()
-        #   Check if the distances are the same as the second dart
-        if (sensor_manager.check_same(d2Distances, distances)):
-            continue
-        #   Wait 1 second
-        time.sleep(1)
-        #   Set the NeoPixel to red if a dart is detected
-        NeoPixelRed()
-        #   Read the distances
-        distances = sensor_manager.read_distances()
-        #   Get the location of the third dart
-        dart3_location = sensor_manager.get_dart_location(d2Distances, distances)
-        print("Dart 3 Location: " + str(dart3_location))
-        if dart3_location == (None,None):
-            continue
-        else:
-            #   Send the dart location to the server
-            SendDartLocation(dart3_location)
-            return State.NextTurn
-        
-    #   If 10 seconds have passed, then move to the NextTurn state
+    #   Baseline of the changes: the clear board or the board with the darts before this one
+    acquisition.rebase(turn.baseline())
+    #   The acquisition runs the quick scans and reads the sensor that changed and its neighbours with the
+    #   full precision, it sends a dart frame with the location when the change is a dart
+    #   The queued darts are sent while waiting
+    if await acquisition.frame(DART, deadline):
+        distances = list(acquisition.distances)
+        dart_location = turn.record(acquisition.location, acquisition.distances)
+    else:
+        dart_location = turn.record(("None","None"))
+    #   Set the NeoPixel to red, the dart was found or the time is over
     NeoPixelRed()
-    dart3_location = ("None","None")
-    print("Dart 3 Location: " + str(dart3_location))
+    print("Dart " + str(turn.number) + " Location: " + str(dart_location))
     #   Send the dart location to the server
-    SendDartLocation(dart3_location)
-    return State.NextTurn
+    SendDartLocation(dart_location)
+    if turn.over():
+        turn.start()
+        return State.NextTurn
+    if turn.clear():
+        return State.ClearBoard
+    return State.GameDart
 
 #   Function to send the dart location to the server
 def SendDartLocation( dart_location ):
     #   Global variables
-    global game
-    global url
-    global headers
     global game_id
     global player_id
     global game_turn
+    #   Score the dart on the board
+    segment, multiplier, points = scorer.score_location(dart_location)
+    print("Dart Score: " + str(points) + " (" + str(multiplier) + " x " + str(segment) + ")")
+    #   Queue the dart location and the score, the queue sends them to the server when the board is idle
+    data = {"action": "sendDart", 
+            "game_id": game_id, 
+            "player_id": player_id, 
+            "game_turn": game_turn, 
+            "dart_locationx": dart_location[0],
+            "dart_locationy": dart_location[1],
+            "dart_segment": segment,
+            "dart_multiplier": multiplier,
+            "dart_points": points
+            }
     try:
-        #   Send the dart location to the server
-        data = {"action": "sendDart", 
-                "game_id": game_id, 
-                "player_id": player_id, 
-                "game_turn": game_turn, 
-                "dart_locationx": dart_location[0],
-                "dart_locationy": dart_location[1]
-                }
-        data_json = ujson.dumps(data)
-        response = requests.post(url, data=data_json, headers=headers)
-        response = response.text
-        #   Convert the response to json
-        response = ujson.loads(response)
-        print(response)
-        if response["success"] == True:
-            return True
-        else:
-            return False
-    except:
+        outbox.put(data)
+        return True
+    except OSError:
         print("Error: SendDartLocation")
         return False
 
 #   Function to move to the next turn
-def NextTurn():
+async def NextTurn():
     #   Global variables
-    global game
-    global url
-    global headers
     global game_id
     global player_id
     global game_turn
     global player_Turn
+    global turn_seq
     NeoPixelPurple()
-    #   Delay for 5 seconds
-    time.sleep(5)
-    #   Ask the server if it is the next turn
+    #   Deadline of the reply, after an error the request is waited for again once it passed
+    deadline = time.ticks_add(time.ticks_ms(), 5000)
+    #   Ask the server if it is the next turn, the request goes through the queue after the darts of the turn
+    #   If the last request is still pending it is waited for again instead of asking twice
     #   If it is the next turn, then move to the ClearBoard state
     #   If it is not the next turn, then move to the NoGame state
     try:
-        data = {"action": "nextTurn", 
-                "game_id": game_id, 
-                "player_id": player_id, 
-                "game_turn": game_turn
-                }
-        data_json = ujson.dumps(data)
-        response = requests.post(url, data=data_json, headers=headers)
-        response = response.text
-        #   Convert the response to json
-        response = ujson.loads(response)
-        print(response)
-        if response["turn"] == True:
-            if player_Turn == 1:
-                player_Turn = 2
-                return State.ClearBoard
-            else:
-                player_Turn = 1
-                game_turn += 1
-                print("Game Turn: " + str(game_turn))
-                return State.ClearBoard
-        else:
-            print("End Game")
-            return State.NoGame
-    except:
+        if turn_seq is None:
+            data = {"action": "nextTurn", 
+                    "game_id": game_id, 
+                    "player_id": player_id, 
+                    "game_turn": game_turn
+                    }
+            turn_seq = outbox.put(data)
+        response = await outbox.reply(turn_seq, deadline)
+    except OSError:
+        response = None
+    if response is None:
         print("Error")
-
-    
-    
+        await asyncio.sleep_ms(max(0, time.ticks_diff(deadline, time.ticks_ms())))
+        return State.NextTurn
+    turn_seq = None
+    print(response)
+    if response.get("turn") == True:
+        if player_Turn == 1:
+            player_Turn = 2
+            return State.ClearBoard
+        else:
+            player_Turn = 1
+            game_turn += 1
+            print("Game Turn: " + str(game_turn))
+            return State.ClearBoard
+    else:
+        print("End Game")
+        return State.NoGame
 
 
 
 
 ############################# Main Loop #############################
-while True:
-    # time.sleep(1)
-    if state == State.NoGame:
-        print("Check Game")
-        state = NoGame()
-    elif state == State.ClearBoard:
-        print("Clear Board")
-        state = ClearBoard()
-    elif state == State.GameDart1:
-        print("Dart " + str(dart_number))
-        state = GameDart1()
-        print(distances)
-        print(d1Distances)
-        print(dart1_location)
-    # elif state == State.GameDart2:
-    #     print("Game Dart 2")
-    #     state = GameDart2()
-    #     print(distances)
-    #     print(d2Distances)
-    #     print(dart2_location)
-    # elif state == State.GameDart3:
-    #     print("Game Dart 3")
-    #     state = GameDart3()
-    #     print(distances)
-    #     print(dart3_location)
-    elif state == State.NextTurn:
-        print("Next Turn")
-        state = NextTurn()
-        #   Ask the server if there is a turn
-        #   If there is a turn, then move to the ClearBoard state
-        #   If there is no turn, then move to the NoGame state
-
-    time.sleep(1)
-        
-
-
-
-
+#   Coroutine with the main loop of the state machine, every state returns the next one as soon as it is done
+async def Main():
+    global state
+    await ConnectWiFi()
+    #   Start the acquisition thread
+    acquisition.start()
+    #   Send the queued darts in the background
+    asyncio.create_task(outbox.run())
+    #   Serve the metrics in the background
+    asyncio.create_task(metrics_server.run())
+    while True:
+        #   Time spent in the state
+        previous = state
+        started = time.ticks_ms()
+        if state == State.NoGame:
+            print("Check Game")
+            state = await NoGame()
+        elif state == State.ClearBoard:
+            print("Clear Board")
+            state = await ClearBoard()
+        elif state == State.GameDart:
+            print("Dart " + str(turn.number + 1))
+            state = await GameDart()
+            print(distances)
+            print(dart_location)
+        elif state == State.NextTurn:
+            print("Next Turn")
+            state = await NextTurn()
+            #   Ask the server if there is a turn
+            #   If there is a turn, then move to the ClearBoard state
+            #   If there is no turn, then move to the NoGame state
+        registry.state(previous, time.ticks_diff(time.ticks_ms(), started))
+        #   The trace of the state goes to the flash before the next record
+        if sensor_manager.trace is not None and state != previous:
+            sensor_manager.trace.request_flush()
+        #   Let the other tasks run between two states
+        await asyncio.sleep_ms(0)
+
+
+#   Function to run the state machine on the uasyncio scheduler
+def run():
+    asyncio.run(Main())
+
+
+#   On the ESP32 main.py runs as __main__, on CPython the simulation imports it and calls run()
+if __name__ == "__main__":
+    run()
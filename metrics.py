@@ -0,0 +1,273 @@
+"""
+This module contains the counters of the hot paths of the detector and the endpoint that serves them.
+The code being measured only reads ticks_us around the work and adds the duration to fixed size arrays, the
+numbers are only formatted when they are asked for:
+    * timers - count, total, maximum and a histogram (log2 buckets of us) of: quick, full and subset scans,
+      location solve, HTTP requests and garbage collections
+    * sensors - pings, echoes (the rest timed out), time of the full precision readings and last distance of
+      every sensor
+    * states - time spent in every state of the state machine and number of times it was entered
+
+registry is the Metrics object that every module adds to. MetricsServer serves it as JSON on a local HTTP port
+(GET /metrics, POST /reset), from the REPL registry.dump() prints the same JSON on the serial port.
+"""
+
+# Import the libraries
+import errno
+import select
+from array import array
+from hal import time, socket, ujson, asyncio, BACKEND
+
+QUICK_SCAN = 0
+FULL_SCAN = 1
+SUBSET_SCAN = 2
+SOLVE = 3
+HTTP = 4
+GC = 5
+TIMERS = ("quick_scan", "full_scan", "subset_scan", "solve", "http", "gc")
+BUCKETS = 24    #   Bucket k counts the durations of k bits (2^(k-1) to 2^k - 1 us), the last one everything above
+PERCENTILES = (50, 90, 99)
+
+
+#   Metrics class
+class Metrics:
+    """
+    This class keeps the counters and the histograms in fixed arrays
+
+    Attributes:
+        *   count, total_us, max_us - number, sum and maximum of the durations of every timer
+        *   hist - BUCKETS counts per timer
+        *   pings, echoes - pings fired and echoes received by every sensor
+        *   read_pings, read_us - pings and time of the timed readings of every sensor
+        *   distance - last distance of every sensor in cm
+        *   state_ms, state_entries - time in ms spent in every state and times it was entered
+        *   since - ticks_ms of the last reset
+    """
+
+    def __init__(self, sensors=10, states=4):
+        timers = len(TIMERS)
+        self.count = array("L", [0] * timers)
+        self.total_us = array("d", [0.0] * timers)
+        self.max_us = array("L", [0] * timers)
+        self.hist = array("L", [0] * (timers * BUCKETS))
+        self.pings = array("L", [0] * sensors)
+        self.echoes = array("L", [0] * sensors)
+        self.read_pings = array("L", [0] * sensors)
+        self.read_us = array("d", [0.0] * sensors)
+        self.distance = array("d", [0.0] * sensors)
+        self.state_ms = array("d", [0.0] * states)
+        self.state_entries = array("L", [0] * states)
+        self.since = time.ticks_ms()
+
+    #   Set every counter to 0
+    def reset(self):
+        for values in (self.count, self.max_us, self.hist, self.pings, self.echoes, self.read_pings,
+                       self.state_entries):
+            for i in range(len(values)):
+                values[i] = 0
+        for values in (self.total_us, self.read_us, self.distance, self.state_ms):
+            for i in range(len(values)):
+                values[i] = 0.0
+        self.since = time.ticks_ms()
+
+    #   Add a duration in us to the timer
+    def add(self, timer, us):
+        if us < 0:
+            us = 0
+        self.count[timer] += 1
+        self.total_us[timer] += us
+        if us > self.max_us[timer]:
+            self.max_us[timer] = us
+        k = 0
+        while us and k < BUCKETS - 1:
+            us >>= 1
+            k += 1
+        self.hist[timer * BUCKETS + k] += 1
+
+    #   Add the time since the ticks_us t0 to the timer
+    def since_us(self, timer, t0):
+        self.add(timer, time.ticks_diff(time.ticks_us(), t0))
+
+    #   Add a reading of the sensor i: pings fired, echoes received, time in us (0 if it was not timed), distance
+    def sensor(self, i, pings, echoes, us=0, distance=None):
+        self.pings[i] += pings
+        self.echoes[i] += echoes
+        if us:
+            self.read_pings[i] += pings
+            self.read_us[i] += us
+        if distance is not None:
+            self.distance[i] = distance
+
+    #   Add the time in ms spent in the state
+    def state(self, state, ms):
+        if 0 <= state < len(self.state_ms):
+            self.state_ms[state] += ms
+            self.state_entries[state] += 1
+
+    #   Percentile of the timer from its histogram: the upper bound in us of the bucket it falls in
+    def percentile(self, timer, p):
+        n = self.count[timer]
+        if not n:
+            return 0
+        rank = (n * p + 99) // 100
+        seen = 0
+        for k in range(BUCKETS):
+            seen += self.hist[timer * BUCKETS + k]
+            if seen >= rank:
+                return (1 << k) - 1
+        return self.max_us[timer]
+
+    #   Dictionary of every counter, formatted for the endpoint
+    def snapshot(self):
+        timers = {}
+        for t in range(len(TIMERS)):
+            n = self.count[t]
+            timer = {"n": n, "mean_us": int(self.total_us[t] / n) if n else 0, "max_us": self.max_us[t]}
+            for p in PERCENTILES:
+                timer["p%d_us" % p] = self.percentile(t, p)
+            timer["hist"] = list(self.hist[t * BUCKETS:(t + 1) * BUCKETS])
+            timers[TIMERS[t]] = timer
+        n = len(self.pings)
+        return {
+            "uptime_ms": time.ticks_diff(time.ticks_ms(), self.since),
+            "timers": timers,
+            "sensors": {
+                "pings": list(self.pings),
+                "timeout_rate": [round(1 - self.echoes[i] / self.pings[i], 3) if self.pings[i] else 0
+                                 for i in range(n)],
+                "ping_us": [int(self.read_us[i] / self.read_pings[i]) if self.read_pings[i] else 0
+                            for i in range(n)],
+                "distance": [round(d, 2) for d in self.distance],
+            },
+            "states": {"ms": [int(ms) for ms in self.state_ms], "entries": list(self.state_entries)},
+        }
+
+    #   Print the snapshot as one line of JSON (serial port)
+    def dump(self):
+        print(ujson.dumps(self.snapshot()))
+
+
+#   Metrics shared by every module
+registry = Metrics()
+
+
+#   Server class
+class MetricsServer:
+    """
+    This class serves the metrics on a local HTTP port from a uasyncio task, one request at a time
+    The sockets never block: a client that is slow to send its request only holds the task of the server, and
+    its connection is closed once timeout_ms is over
+
+    Attributes:
+        *   metrics - Metrics served
+        *   port - TCP port, 0 for any free port (the port is set once the server started)
+        *   poll_ms - time between two checks of a socket that is not ready
+        *   timeout_ms - time a connection has to send its request and read the answer
+        *   served - number of requests answered
+        *   dropped - number of connections closed because their time was over
+    """
+
+    def __init__(self, metrics=None, port=8080, poll_ms=100, timeout_ms=2000):
+        self.metrics = metrics if metrics is not None else registry
+        self.port = port
+        self.poll_ms = poll_ms
+        self.timeout_ms = timeout_ms
+        self.served = 0
+        self.dropped = 0
+        self._sock = None
+
+    #   Open the listening socket, it never blocks: the task checks it every poll_ms
+    def start(self):
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(socket.getaddrinfo("0.0.0.0", self.port)[0][-1])
+        sock.listen(2)
+        sock.setblocking(False)
+        self._sock = sock
+        self.port = sock.getsockname()[1] if hasattr(sock, "getsockname") else self.port
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    #   Task of the server
+    async def run(self):
+        if self._sock is None:
+            try:
+                self.start()
+            except OSError:
+                print("Error: metrics port")
+                return
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                await asyncio.sleep_ms(self.poll_ms)
+                continue
+            try:
+                await self.serve(conn)
+            except OSError:
+                pass
+            finally:
+                conn.close()
+
+    #   Wait poll_ms for the connection to be ready for event (select.POLLIN or select.POLLOUT), raises OSError
+    #   once the deadline (ticks_ms) passed
+    async def _wait(self, conn, event, deadline):
+        if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+            self.dropped += 1
+            raise OSError(errno.ETIMEDOUT)
+        if BACKEND == "sim":
+            #   The clock of the simulation is virtual but the client sends in real time
+            poller = select.poll()
+            poller.register(conn, event)
+            poller.poll(self.poll_ms)
+        await asyncio.sleep_ms(self.poll_ms)
+
+    #   Answer the request of a connection, GET /metrics reads the metrics and POST /reset clears them
+    async def serve(self, conn):
+        conn.setblocking(False)
+        deadline = time.ticks_add(time.ticks_ms(), self.timeout_ms)
+        request = b""
+        while b"\r\n\r\n" not in request and len(request) < 1024:
+            try:
+                data = conn.recv(256)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                await self._wait(conn, select.POLLIN, deadline)
+                continue
+            if not data:
+                break
+            request += data
+        parts = request.split(b" ")
+        method = parts[0]
+        path = parts[1] if len(parts) > 1 else b""
+        if path == b"/metrics" and method == b"GET":
+            status, body = "200 OK", ujson.dumps(self.metrics.snapshot())
+        elif path == b"/reset" and method == b"POST":
+            self.metrics.reset()
+            status, body = "200 OK", "{}"
+        elif path == b"/metrics" or path == b"/reset":
+            status, body = "405 Method Not Allowed", "{}"
+        else:
+            status, body = "404 Not Found", "{}"
+        body = body.encode("utf-8")
+        head = "HTTP/1.0 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (
+            status, len(body))
+        data = memoryview(head.encode("utf-8") + body)
+        send = getattr(conn, "send", None) or conn.write
+        sent = 0
+        while sent < len(data):
+            try:
+                n = send(data[sent:])
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                n = None
+            if n:
+                sent += n
+            else:
+                await self._wait(conn, select.POLLOUT, deadline)
+        self.served += 1
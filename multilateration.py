@@ -0,0 +1,190 @@
+"""
+This module contains the least squares multilateration solver for the location of a dart.
+Instead of intersecting the circles of the two closest sensors it uses every sensor that sees the dart:
+
+    * Linear solve - the circle of sensor i, (x - xi)^2 + (y - yi)^2 = ri^2, is linear in (x, y, R) with
+      R = x^2 + y^2:  -2 xi x - 2 yi y + R = ri^2 - ki  with ki = xi^2 + yi^2.
+      The normal matrix of each sensor only depends on its location, so it is built once when the solver
+      is created and the system of a throw is the sum of the rows of the sensors used (3x3 solve).
+    * Refinement - weighted Gauss-Newton on the distance residuals |p - si| - ri, starting from the linear
+      solution (or from the two circles when only two sensors see the dart).
+
+A starting location from the fingerprint index (fingerprint.py) replaces the linear solve when it is given.
+With only two sensors it picks which of the two points of the circles is the dart: Gauss-Newton from a start
+next to the line between two sensors whose circles do not meet would diverge.
+The solver returns the location and the weighted RMS residual in cm, which tells how well the sensors agree.
+Sensors whose residual is far from the others (they see something else) are dropped and the location is
+solved again.
+"""
+
+# Import the libraries
+import math
+import kernels
+
+
+#   Solver class
+class Multilaterator:
+    """
+    This class solves the location of a dart from the distances of several sensors
+
+    Attributes:
+        *   locations - list of (x, y) locations of the sensors
+        *   iterations - maximum number of Gauss-Newton iterations
+        *   gate - residual in cm over which a sensor is dropped (when 4 or more sensors are used)
+    """
+
+    def __init__(self, locations, iterations=6, gate=2.0):
+        self._x = [float(x) for (x, y) in locations]
+        self._y = [float(y) for (x, y) in locations]
+        self._k = [x * x + y * y for (x, y) in locations]
+        #   Rows of the normal matrix of each sensor for the unknowns (x, y, R), upper triangle
+        self._rows = [(4 * x * x, 4 * x * y, -2 * x, 4 * y * y, -2 * y) for (x, y) in locations]
+        self.iterations = iterations
+        self.gate = gate
+
+    #   Weight of a sensor: the beam is wider far from the sensor so near sensors are trusted more
+    def weight(self, distance):
+        return 1.0 / (1.0 + distance)
+
+    #   Linear least squares location from 3 or more sensors, None if the geometry is degenerate
+    def linear(self, indices, distances):
+        m00 = m01 = m02 = m11 = m12 = m22 = 0.0
+        b0 = b1 = b2 = 0.0
+        for i in indices:
+            w = self.weight(distances[i])
+            r = self._rows[i]
+            m00 += w * r[0]
+            m01 += w * r[1]
+            m02 += w * r[2]
+            m11 += w * r[3]
+            m12 += w * r[4]
+            m22 += w
+            c = w * (distances[i] * distances[i] - self._k[i])
+            b0 += -2 * self._x[i] * c
+            b1 += -2 * self._y[i] * c
+            b2 += c
+        #   Solve the symmetric 3x3 system with Cramer's rule
+        c00 = m11 * m22 - m12 * m12
+        c01 = m02 * m12 - m01 * m22
+        c02 = m01 * m12 - m02 * m11
+        det = m00 * c00 + m01 * c01 + m02 * c02
+        if abs(det) < 1e-9:
+            return None
+        c11 = m00 * m22 - m02 * m02
+        c12 = m01 * m02 - m00 * m12
+        x = (c00 * b0 + c01 * b1 + c02 * b2) / det
+        y = (c01 * b0 + c11 * b1 + c12 * b2) / det
+        return (x, y)
+
+    #   Weighted Gauss-Newton refinement, returns the location and the weighted RMS residual
+    def refine(self, x, y, indices, distances):
+        for _ in range(self.iterations):
+            a00 = a01 = a11 = g0 = g1 = 0.0
+            for i in indices:
+                dx = x - self._x[i]
+                dy = y - self._y[i]
+                d = math.sqrt(dx * dx + dy * dy)
+                if d < 1e-6:
+                    continue
+                w = self.weight(distances[i])
+                jx = dx / d
+                jy = dy / d
+                f = d - distances[i]
+                a00 += w * jx * jx
+                a01 += w * jx * jy
+                a11 += w * jy * jy
+                g0 += w * jx * f
+                g1 += w * jy * f
+            det = a00 * a11 - a01 * a01
+            if abs(det) < 1e-12:
+                break
+            sx = (a11 * g0 - a01 * g1) / det
+            sy = (a00 * g1 - a01 * g0) / det
+            x -= sx
+            y -= sy
+            if sx * sx + sy * sy < 1e-6:
+                break
+        return (x, y, self.residual(x, y, indices, distances))
+
+    #   Weighted RMS of the distance residuals in cm
+    def residual(self, x, y, indices, distances):
+        total = 0.0
+        weights = 0.0
+        for i in indices:
+            dx = x - self._x[i]
+            dy = y - self._y[i]
+            f = math.sqrt(dx * dx + dy * dy) - distances[i]
+            w = self.weight(distances[i])
+            total += w * f * f
+            weights += w
+        if weights == 0:
+            return 0.0
+        return math.sqrt(total / weights)
+
+    #   Starting point from two sensors: the intersection of the circles, or the closest point between them
+    #   Of the two intersection points the one closest to near is taken if it is given, else the one on the board
+    def _pair_start(self, i, j, distances, inside, near=None):
+        x1 = self._x[i]
+        y1 = self._y[i]
+        x2 = self._x[j]
+        y2 = self._y[j]
+        r1 = distances[i]
+        r2 = distances[j]
+        points = kernels.circle_intersection(x1, y1, r1, x2, y2, r2)
+        if points is not None:
+            if near is not None:
+                first = (points[0] - near[0]) ** 2 + (points[1] - near[1]) ** 2
+                second = (points[2] - near[0]) ** 2 + (points[3] - near[1]) ** 2
+                if first <= second:
+                    return (points[0], points[1])
+                return (points[2], points[3])
+            if inside(points[0], points[1]):
+                return (points[0], points[1])
+            return (points[2], points[3])
+        d = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        t = (r1 + (d - r1 - r2) / 2) / d
+        return (x1 + (x2 - x1) * t, y1 + (y2 - y1) * t)
+
+    #   Location of the dart from the sensors in indices, returns (x, y, residual) or None if no sensor is given
+    #   inside is the function that checks if a point is inside the board (to pick between the 2 circle points)
+    #   start is an optional starting location (from the fingerprint index), the solver only refines it
+    def solve(self, indices, distances, inside, start=None):
+        indices = list(indices)
+        while True:
+            if not indices:
+                return None
+            if start is not None and len(indices) == 2:
+                #   The start only picks the point of the two circles
+                point = self._pair_start(indices[0], indices[1], distances, inside, start)
+                x, y, residual = self.refine(point[0], point[1], indices, distances)
+            elif start is not None:
+                #   With one sensor the refinement can not move the start along the circle and keeps it
+                x, y, residual = self.refine(start[0], start[1], indices, distances)
+                if len(indices) == 1:
+                    return (x, y, residual)
+            elif len(indices) == 1:
+                i = indices[0]
+                x, y = kernels.center_point(self._x[i], self._y[i], distances[i])
+                return (x, y, 0.0)
+            else:
+                point = None
+                if len(indices) >= 3:
+                    point = self.linear(indices, distances)
+                if point is None:
+                    #   Two closest sensors
+                    pair = sorted(indices, key=lambda i: distances[i])[:2]
+                    point = self._pair_start(pair[0], pair[1], distances, inside)
+                x, y, residual = self.refine(point[0], point[1], indices, distances)
+            if len(indices) < 4 or residual <= self.gate / 2:
+                return (x, y, residual)
+            #   Drop the sensor that disagrees the most if it is over the gate
+            worst = None
+            worst_f = self.gate
+            for i in indices:
+                f = abs(math.sqrt((x - self._x[i]) ** 2 + (y - self._y[i]) ** 2) - distances[i])
+                if f > worst_f:
+                    worst = i
+                    worst_f = f
+            if worst is None:
+                return (x, y, residual)
+            indices.remove(worst)
@@ -1,4 +1,4 @@
-from machine import Pin, ADC
+from hal import Pin
 
 class Mux: 
 
@@ -0,0 +1,68 @@
+"""
+This module contains the scheduler of the gettingNewGame requests of the NoGame state.
+Instead of asking the server once a second forever:
+    * Long-poll - the request asks the server to hold it up to `wait` seconds until a game exists. A server
+      that does this says so in its reply ("longPoll"), then the board asks again right away: at idle it
+      sends one request per `wait` seconds and still sees a new game at once
+    * Backoff - a server without long-poll (or a failed request) is asked again after a delay that grows
+      by `factor` after every empty reply up to `max_ms`, with full jitter (a random delay between 0 and
+      the backoff) so boards that started together do not poll in step. A game resets the backoff.
+"""
+
+# Import the libraries
+import random
+
+
+#   Scheduler class
+class PollScheduler:
+    """
+    This class chooses how long the server holds a poll and how long to wait before the next one
+
+    Attributes:
+        *   wait - seconds the server may hold a request (0 disables long-poll)
+        *   base_ms - backoff after the first empty reply
+        *   max_ms - maximum backoff
+        *   factor - growth of the backoff after every empty reply
+        *   long_poll - True once the server said it holds the requests
+    """
+
+    def __init__(self, wait=25, base_ms=1000, max_ms=30000, factor=2):
+        self.wait = wait
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.factor = factor
+        self.long_poll = False
+        self._backoff = 0
+
+    #   Body of the next request
+    def request(self):
+        return {"action": "gettingNewGame", "wait": self.wait}
+
+    #   Timeout in seconds of the next request, longer than the time the server may hold it
+    def timeout(self, margin=5):
+        return self.wait + margin if self.wait else margin
+
+    #   Update with the reply of the server, returns the delay in ms before the next request
+    def update(self, reply):
+        self.long_poll = bool(reply.get("longPoll")) and self.wait > 0
+        if reply.get("gameStatus"):
+            self._backoff = 0
+            return 0
+        if self.long_poll:
+            #   The server held the request: ask again right away
+            self._backoff = 0
+            return 0
+        return self._next()
+
+    #   Update after a failed request, returns the delay in ms before the next request
+    def failed(self):
+        self.long_poll = False
+        return self._next()
+
+    #   Grow the backoff and draw the jittered delay
+    def _next(self):
+        if self._backoff:
+            self._backoff = min(int(self._backoff * self.factor), self.max_ms)
+        else:
+            self._backoff = self.base_ms
+        return (self._backoff * random.getrandbits(16)) >> 16
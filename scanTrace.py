@@ -0,0 +1,144 @@
+"""
+This module contains the recorder of the scan traces: what the sensors heard during the scans, written to a
+compact binary file on the flash so that a bad throw can be replayed on a host (tools/replay_trace.py).
+
+A trace file starts with a header (struct "<4sBBH": MAGIC, VERSION, number of sensors, 0) followed by
+records, every record starts with the same header (struct "<BBHHI"):
+    * PINGS - one reading of a sensor: (PINGS, sensor, pings fired, echoes, ticks_us) then the echo durations
+      in us as 16 bit words, in the order of the sample store (the estimators may have reordered them)
+    * SCAN - the result of a scan: (SCAN, kind, number of sensors, changed sensor + 1, ticks_us) then the
+      distances in 1/100 cm as 16 bit words. kind is QUICK_SCAN, FULL_SCAN or SUBSET_SCAN
+Every value is little endian.
+
+The records are packed into a preallocated buffer that is written to the file in one write when it is full,
+so a quick scan only costs the packing of its echoes. The buffer is also written after every full or subset
+scan (the confirmation of a change, a dart is always confirmed) and before the next record once the state
+machine asked for it with request_flush (it changed state), so the last throw before a reset or a crash is
+on the flash. The buffer is only written by the thread that records the scans. The files rotate: once the file is over size bytes it is
+renamed path.1 (path.1 becomes path.2, ...) and a new file is started, at most files files are kept.
+"""
+
+# Import the libraries
+import os
+import struct
+from hal import time
+import kernels
+
+MAGIC = b"PDTR"
+VERSION = 1
+FILE_HEADER = "<4sBBH"
+RECORD = "<BBHHI"
+RECORD_SIZE = struct.calcsize(RECORD)
+PINGS = 1
+SCAN = 2
+QUICK_SCAN = 1
+FULL_SCAN = 2
+SUBSET_SCAN = 3
+
+
+#   Recorder class
+class ScanTrace:
+    """
+    This class records the echoes and the results of the scans to rotating trace files
+
+    Attributes:
+        *   path - path of the current trace file, the older ones are path.1, path.2, ...
+        *   n - number of sensors
+        *   size - size in bytes after which the file rotates
+        *   files - number of trace files kept
+        *   records - number of records written
+        *   written - number of bytes written
+    """
+
+    def __init__(self, n, path="trace.bin", size=131072, files=4, buffer=2048):
+        self.path = path
+        self.n = n
+        self.size = size
+        self.files = files
+        self.records = 0
+        self.written = 0
+        self._buffer = bytearray(buffer)
+        self._used = 0
+        self._size = 0
+        self._due = False
+        #   Every session starts a new file, the trace of the last session is kept as path.1
+        try:
+            if os.stat(path)[6]:
+                self._rotate()
+        except OSError:
+            pass
+
+    #   Name of the k-th trace file, 0 is the current one
+    def _name(self, k):
+        return self.path if k == 0 else self.path + "." + str(k)
+
+    #   Ask for the buffer to be written before the next record, from any thread
+    def request_flush(self):
+        self._due = True
+
+    #   Make room for nbytes in the buffer, the buffer is written to the file if it is too full or if it was asked
+    def _reserve(self, nbytes):
+        if self._due or self._used + nbytes > len(self._buffer):
+            self._due = False
+            self.flush()
+        return nbytes <= len(self._buffer)
+
+    #   Record one reading of the sensor i: pings fired and the count echo durations of samples
+    def pings(self, i, pings, samples, count):
+        if not self._reserve(RECORD_SIZE + 2 * count):
+            return
+        buf = self._buffer
+        struct.pack_into(RECORD, buf, self._used, PINGS, i, pings, count, time.ticks_us() & 0xFFFFFFFF)
+        self._used = kernels.pack_u16(buf, self._used + RECORD_SIZE, samples, count)
+        self.records += 1
+
+    #   Record the result of a scan: its kind, the sensor that changed (-1 if none) and the distances
+    def scan(self, kind, distances, changed=-1):
+        n = len(distances)
+        if not self._reserve(RECORD_SIZE + 2 * n):
+            return
+        buf = self._buffer
+        used = self._used
+        struct.pack_into(RECORD, buf, used, SCAN, kind, n, changed + 1, time.ticks_us() & 0xFFFFFFFF)
+        used += RECORD_SIZE
+        for i in range(n):
+            struct.pack_into("<H", buf, used, min(int(distances[i] * 100 + 0.5), 65535))
+            used += 2
+        self._used = used
+        self.records += 1
+        if kind != QUICK_SCAN:
+            self.flush()
+
+    #   Write the buffer to the file, a new file gets its header first
+    def flush(self):
+        if not self._used:
+            return
+        try:
+            with open(self.path, "ab") as f:
+                if not self._size:
+                    header = struct.pack(FILE_HEADER, MAGIC, VERSION, self.n, 0)
+                    f.write(header)
+                    self._size += len(header)
+                f.write(memoryview(self._buffer)[:self._used])
+        except OSError:
+            #   A full flash loses the buffer, the detection goes on
+            self._used = 0
+            return
+        self._size += self._used
+        self.written += self._used
+        self._used = 0
+        if self._size >= self.size:
+            self._rotate()
+
+    #   Rename the trace files one place up and start a new file
+    def _rotate(self):
+        try:
+            os.remove(self._name(self.files - 1))
+        except OSError:
+            pass
+        for k in range(self.files - 1, 0, -1):
+            try:
+                os.rename(self._name(k - 1), self._name(k))
+            except OSError:
+                pass
+        self._size = 0
@@ -0,0 +1,154 @@
+"""
+This module contains the scoring engine that turns the location of a dart in cm into the score of the throw:
+the segment number (1-20, or 25 for the bull), the multiplier (0 for a miss, 1, 2 or 3) and the points.
+
+The location is not converted to polar coordinates with atan2 and sqrt for every throw:
+    * Ring - the squared radius indexes a table of radius buckets that gives the ring, the buckets that
+      contain the border of two rings are flagged and compared with the squared radius of the border
+    * Segment - the angle is replaced by the "diamond angle" of the location, a value in [0, 4) that grows
+      with the angle like it but only needs one division. It indexes a table of angle buckets that gives
+      the segment directly. Buckets that contain the border between two segments are flagged and the
+      diamond angle is compared with the border, so the result is exact.
+
+The tables and the score tuples are built once when the Scorer is created, the rotation of the board
+(where the 20 points) is part of the tables so it costs nothing when scoring.
+"""
+
+# Import the libraries
+import math
+
+#   Numbers of the segments clockwise from the top
+SEGMENTS = (20, 1, 18, 4, 13, 6, 10, 15, 2, 17, 3, 19, 7, 16, 8, 11, 14, 9, 12, 5)
+#   Outer radius in cm of the rings of a standard board and (segment, multiplier) inside them
+#   segment None is the segment of the angle of the dart
+RINGS = (
+    (0.635, 25, 2),     #   Inner bull
+    (1.59, 25, 1),      #   Outer bull
+    (9.9, None, 1),     #   Inner single
+    (10.7, None, 3),    #   Triple
+    (16.2, None, 1),    #   Outer single
+    (17.0, None, 2),    #   Double
+)
+BUCKETS = 1024          #   Number of angle buckets over the diamond angle [0, 4)
+RADIUS_BUCKETS = 512    #   Number of radius buckets over the squared radius of the scoring area
+BORDER = 0x80           #   Flag of the buckets that contain the border of two segments or rings
+MISS = (0, 0, 0)
+
+
+#   Diamond angle of (x, y) clockwise from the top: 0 at +y, 1 at +x, 2 at -y, 3 at -x
+def diamond(x, y):
+    ax = abs(x)
+    ay = abs(y)
+    s = ax + ay
+    if s == 0:
+        return 0.0
+    if x >= 0:
+        if y >= 0:
+            return ax / s
+        return 1 + ay / s
+    if y < 0:
+        return 2 + ax / s
+    return 3 + ay / s
+
+
+#   Scoring class
+class Scorer:
+    """
+    This class scores the location of a dart on the board
+
+    Attributes:
+        *   rotation - angle in degrees clockwise from +y of the center of the 20 segment
+        *   x0, y0 - location in cm of the center of the board
+        *   rings - list of (outer radius in cm, segment, multiplier) from the center out
+    """
+
+    def __init__(self, rotation=0.0, x0=0.0, y0=0.0, rings=RINGS):
+        self.rotation = rotation
+        self.x0 = x0
+        self.y0 = y0
+        #   Radius threshold table
+        self._radii = [r * r for (r, segment, multiplier) in rings]
+        self._rings = [(segment, multiplier) for (r, segment, multiplier) in rings]
+        #   Diamond angle of the end border of each segment
+        self._borders = []
+        for k in range(len(SEGMENTS)):
+            angle = math.radians(rotation + 9 + 18 * k)
+            self._borders.append(diamond(math.sin(angle), math.cos(angle)))
+        #   Angle bucket table: segment index at the start of the bucket, flagged if a border is inside
+        self._table = bytearray(BUCKETS)
+        for b in range(BUCKETS):
+            start = self._segment_at(4.0 * b / BUCKETS)
+            end = self._segment_at(4.0 * (b + 1) / BUCKETS - 1e-12)
+            self._table[b] = start | (BORDER if end != start else 0)
+        #   Radius threshold table over the squared radius, flagged like the angle buckets
+        self._outer = self._radii[-1]
+        self._scale = RADIUS_BUCKETS / self._outer
+        self._ring_table = bytearray(RADIUS_BUCKETS)
+        for b in range(RADIUS_BUCKETS):
+            start = self._ring_at(b / self._scale)
+            end = self._ring_at((b + 1) / self._scale - 1e-12)
+            self._ring_table[b] = start | (BORDER if end != start else 0)
+        #   Scores of every ring and segment, built once so scoring does not allocate
+        self._scores = []
+        for segment, multiplier in self._rings:
+            for k in range(len(SEGMENTS)):
+                number = SEGMENTS[k] if segment is None else segment
+                self._scores.append((number, multiplier, number * multiplier))
+
+    #   Ring index of a squared radius (only used to build the table)
+    def _ring_at(self, r2):
+        for i in range(len(self._radii)):
+            if r2 < self._radii[i]:
+                return i
+        return len(self._radii) - 1
+
+    #   Segment index of a diamond angle from the borders (only used to build the table)
+    def _segment_at(self, d):
+        count = len(SEGMENTS)
+        for k in range(count):
+            lo = self._borders[k - 1]
+            hi = self._borders[k]
+            if lo <= hi:
+                if lo <= d < hi:
+                    return k
+            elif d >= lo or d < hi:
+                return k
+        return 0
+
+    #   Score of a dart at (x, y) in cm, returns (segment, multiplier, points)
+    def score(self, x, y):
+        x -= self.x0
+        y -= self.y0
+        r2 = x * x + y * y
+        if r2 >= self._outer:
+            return MISS
+        ring = self._ring_table[int(r2 * self._scale)]
+        if ring & BORDER:
+            ring &= ~BORDER
+            if r2 >= self._radii[ring]:
+                ring += 1
+        #   Diamond angle (inlined) and angle bucket
+        ax = x if x >= 0 else -x
+        ay = y if y >= 0 else -y
+        s = ax + ay
+        if s == 0:
+            d = 0.0
+        elif x >= 0:
+            d = ax / s if y >= 0 else 1 + ay / s
+        else:
+            d = 2 + ax / s if y < 0 else 3 + ay / s
+        k = self._table[int(d * (BUCKETS / 4)) & (BUCKETS - 1)]
+        if k & BORDER:
+            k &= ~BORDER
+            if d >= self._borders[k]:
+                k += 1
+                if k == 20:
+                    k = 0
+        return self._scores[ring * 20 + k]
+
+    #   Score of a location from UltraManager.get_location, a missing location scores (0, 0, 0)
+    def score_location(self, location):
+        x, y = location
+        if not isinstance(x, (int, float)) or not isinstance(y, (int, float)):
+            return MISS
+        return self.score(x, y)
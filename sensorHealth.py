@@ -0,0 +1,112 @@
+"""
+This module contains the health tracking of the sensors. Every full reading of a sensor updates its
+statistics, kept across the scans in fixed arrays:
+    * failure - running mean (EWMA) of the fraction of pings without an echo (a healthy sensor always hears
+      the opposite side of the board)
+    * spread - running mean of the standard deviation of the echoes of a reading in cm
+    * stuck - number of readings in a row with the same distance and no spread at all (a sensor that repeats
+      one value whatever is on the board)
+
+A sensor past one of the limits is quarantined: the scans skip it and the location solvers work without it.
+Every probe_every scans a quarantined sensor is probed with a few pings and comes back if the probe is healthy.
+"""
+
+# Import the libraries
+from array import array
+import math
+
+
+#   Standard deviation of the first n values
+def spread(values, n):
+    if n < 2:
+        return 0.0
+    total = 0
+    for i in range(n):
+        total += values[i]
+    mean = total / n
+    squares = 0.0
+    for i in range(n):
+        d = values[i] - mean
+        squares += d * d
+    return math.sqrt(squares / (n - 1))
+
+
+#   Health class
+class SensorHealth:
+    """
+    This class keeps the health statistics of the sensors and decides which ones are quarantined
+
+    Attributes:
+        *   failure, spread, stuck - statistics of every sensor (see the module docstring)
+        *   mask - 1 for every sensor in use, 0 for the quarantined sensors
+        *   max_failure - failure rate over which a sensor is quarantined
+        *   max_spread - spread in cm over which a sensor is quarantined
+        *   max_stuck - readings in a row with the same value after which a sensor is quarantined
+        *   probe_every - scans between two probes of a quarantined sensor
+        *   probe_pings - pings of a probe
+        *   quarantines, releases - number of times a sensor was quarantined and brought back
+    """
+
+    def __init__(self, n, max_failure=0.8, max_spread=5.0, max_stuck=50, probe_every=20, probe_pings=10,
+                 alpha=0.3):
+        self.max_failure = max_failure
+        self.max_spread = max_spread
+        self.max_stuck = max_stuck
+        self.probe_every = probe_every
+        self.probe_pings = probe_pings
+        self.alpha = alpha
+        self.failure = array("d", [0.0] * n)
+        self.spread = array("d", [0.0] * n)
+        self.stuck = array("H", [0] * n)
+        self.mask = bytearray(b"\x01" * n)
+        self.quarantines = 0
+        self.releases = 0
+        self._last = array("d", [0.0] * n)
+        self._since = array("H", [0] * n)
+
+    #   True if the sensor is quarantined
+    def quarantined(self, i):
+        return not self.mask[i]
+
+    #   True if any sensor is quarantined
+    def degraded(self):
+        for used in self.mask:
+            if not used:
+                return True
+        return False
+
+    #   Called for a quarantined sensor on every scan, True when it is time to probe it
+    def probe_due(self, i):
+        self._since[i] += 1
+        if self._since[i] >= self.probe_every:
+            self._since[i] = 0
+            return True
+        return False
+
+    #   Update the statistics of the sensor i with a reading: pings fired, echoes received, distance in cm and
+    #   spread of the echoes in cm. A reading of a quarantined sensor is a probe. Returns True if the sensor is used
+    def update(self, i, pings, echoes, distance, spread_cm):
+        failed = (pings - echoes) / pings if pings else 1.0
+        if spread_cm == 0 and echoes > 1 and distance == self._last[i]:
+            if self.stuck[i] < 65535:
+                self.stuck[i] += 1
+        else:
+            self.stuck[i] = 0
+        self._last[i] = distance
+        if not self.mask[i]:
+            #   Probe: the statistics start again from the probe if it is healthy
+            if failed <= self.max_failure and spread_cm <= self.max_spread and self.stuck[i] == 0:
+                self.failure[i] = failed
+                self.spread[i] = spread_cm
+                self.mask[i] = 1
+                self.releases += 1
+            return bool(self.mask[i])
+        alpha = self.alpha
+        self.failure[i] += alpha * (failed - self.failure[i])
+        self.spread[i] += alpha * (spread_cm - self.spread[i])
+        if (self.failure[i] > self.max_failure or self.spread[i] > self.max_spread or
+                self.stuck[i] >= self.max_stuck):
+            self.mask[i] = 0
+            self._since[i] = 0
+            self.quarantines += 1
+        return bool(self.mask[i])
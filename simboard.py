@@ -0,0 +1,718 @@
+"""
+This module contains a simulated dartboard that stands in for the ESP32 when the code runs on CPython.
+It is only imported by hal.py when the MicroPython modules (machine, network, urequests, neopixel) are
+not available, so the sensor classes and the state machine run unmodified on a Linux host.
+
+The simulation has the following parts:
+    * SimClock  - virtual clock with the MicroPython time API (sleep_us, ticks_ms, ticks_diff, ...)
+                  Sleeping only advances the virtual time, so the simulation runs faster than real time
+    * Pin       - GPIO pin, every write is forwarded to the board
+    * SimBoard  - the physics of the board:
+                    - 10 HC-SR04 sensors on the rim, wired to the multiplexer as in main.py
+                    - darts at configurable (x, y) positions in cm from the center of the board
+                    - time of flight of the echo, gaussian noise, dropouts (the echo pin held high for 38 ms)
+                      and the mux switching delay
+                    - rising and falling edges of the echo pins with Pin.irq handlers
+                    - crosstalk between adjacent sensors fired at the same time
+                    - scheduled events (throw a dart, clear the board, stop the simulation)
+                    - replay of the echoes of a recorded scan trace instead of the physics
+    * NeoPixel  - LED ring that keeps the last colour written and reports it to board.on_neopixel
+    * network   - WLAN station that connects instantly
+    * requests  - urequests compatible HTTP client built on http.client
+    * gc        - MicroPython gc module, collect() advances the virtual clock by the host time it took
+    * micropython - native and viper decorators that return the function unchanged, const
+    * asyncio   - the part of uasyncio used by main.py (run, create_task, sleep, sleep_ms, Event, Task)
+                  on the virtual clock: when every task waits the clock jumps to the next task that is due
+"""
+
+# Import the libraries
+import gc as host_gc
+import math
+import heapq
+import random
+import types
+import tracemalloc
+import time as host_time
+import http.client
+from urllib.parse import urlsplit
+
+#   Wiring of the board: (echo pin, x, y) for the sensor on each mux channel, same as main.py
+DEFAULT_SENSORS = [
+    (13, 0.5, 19.5),
+    (12, 11.6, 15.2),
+    (14, 18.8, 5.7),
+    (27, 18.6, -6.2),
+    (26, 11, -16.2),
+    (25, 0, -19.7),
+    (33, -11.7, -15.9),
+    (32, -18.6, -5.6),
+    (35, -18.4, 6.6),
+    (34, -11.4, 16.2),
+]
+DEFAULT_MUX = (18, 5, 17, 16, 19)   #   S0, S1, S2, S3, E
+DEFAULT_TRIG = 4
+
+ECHO_DELAY_US = 450     #   Time between the trigger and the rising edge of the echo (8 cycles burst at 40 kHz)
+MIN_TRIG_US = 10        #   Minimum width of the trigger pulse
+XTALK_WINDOW_US = 30000 #   Time a burst keeps bouncing around the board and can reach another sensor
+NO_ECHO_US = 38000      #   Width of the echo pulse of a HC-SR04 that got no echo back
+
+
+#   Exception raised by the board to end a simulation run
+class SimStop(Exception):
+    pass
+
+
+#   Virtual clock with the same API as the MicroPython time module
+class SimClock:
+
+    def __init__(self, board):
+        self._board = board
+        self._now = 0   #   Virtual time in us
+
+    #   Advance the virtual time and run the events that are due
+    def advance(self, us):
+        if us > 0:
+            self._now += int(us)
+        self._board._run_events()
+
+    def sleep(self, s):
+        self.advance(s * 1000000)
+
+    def sleep_ms(self, ms):
+        self.advance(ms * 1000)
+
+    def sleep_us(self, us):
+        self.advance(us)
+
+    def ticks_us(self):
+        return self._now
+
+    def ticks_ms(self):
+        return self._now // 1000
+
+    def ticks_cpu(self):
+        return self._now
+
+    def ticks_diff(self, new, old):
+        return new - old
+
+    def ticks_add(self, ticks, delta):
+        return ticks + delta
+
+    def time(self):
+        return self._now // 1000000
+
+    def time_ns(self):
+        return self._now * 1000
+
+
+#   GPIO pin of the simulated board, the level is kept by the board so all the objects of the same pin share it
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    board = None    #   Set by hal.py
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._mode = mode
+        self._board = Pin.board
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return self._board._levels.get(self.id, 0)
+        self._board._write(self.id, 1 if v else 0)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def irq(self, handler=None, trigger=IRQ_RISING | IRQ_FALLING, hard=False):
+        if handler is None:
+            self._board._irqs.pop(self.id, None)
+        else:
+            self._board._irqs[self.id] = (handler, trigger, self)
+
+    def __repr__(self):
+        return "Pin(%d)" % self.id
+
+
+#   Simulated dartboard
+class SimBoard:
+    """
+    This class simulates the sensors, the multiplexer and the darts of the board
+
+    Attributes:
+        *   sensors - list of (echo pin, x, y) tuples, the index is the mux channel
+        *   darts - list of (x, y) locations of the darts on the board
+        *   noise_cm - standard deviation of the gaussian noise of each ping in cm
+        *   dropout - probability that a ping gets no echo
+        *   no_echo_us - width of the echo pulse of a ping without an echo, the sensor ignores the trigger
+            until it is over (None for a pin that stays low)
+        *   outliers - probability that a ping gets a spurious echo at a random distance (multipath)
+        *   mux_settle_us - time after a channel change before the trigger reaches the sensor
+        *   sound_speed - speed of sound in cm/s
+        *   offset_cm - distance between the transducer and the front of the sensor
+        *   beam_deg - half angle of the sensor beam in degrees
+        *   dart_radius - radius of the dart barrel in cm
+        *   background_cm - distance of the echo when no dart is in the beam (None = opposite rim)
+        *   crosstalk - if the burst of a sensor can end the echo of an adjacent sensor fired after it
+        *   dead - set of sensor indexes that never get an echo (disconnected sensors)
+        *   replay - source of the echoes instead of the physics, its echo(index) returns the duration of the
+            next ping of the sensor (None if the ping is lost), see tools/replay_trace.py
+    """
+
+    def __init__(self, sensors=DEFAULT_SENSORS, mux=DEFAULT_MUX, trig=DEFAULT_TRIG, seed=1):
+        self.clock = SimClock(self)
+        self._levels = {}
+        self._irqs = {}
+        self._events = []
+        self._seq = 0
+        self._echoes = {}
+        self._recent = []
+        self._trig_rise = 0
+        self._mux_change = 0
+        self.random = random.Random(seed)
+        self.sensors = list(sensors)
+        self.mux = mux
+        self.trig = trig
+        self.darts = []
+        self.noise_cm = 0.3
+        self.dropout = 0.02
+        self.no_echo_us = NO_ECHO_US
+        self.outliers = 0.01
+        self.mux_settle_us = 1
+        self.sound_speed = 34000.0
+        self.offset_cm = 1.5
+        self.beam_deg = 30.0
+        self.dart_radius = 0.3
+        self.background_cm = None
+        self.crosstalk = True
+        self.dead = set()
+        self.replay = None
+        self.pings = 0
+        self.neopixel_writes = 0
+        self.neopixel_color = None
+        self.on_neopixel = None     #   Function called with the colour every time the ring is written
+
+    #   Change any of the attributes of the board
+    def configure(self, **kwargs):
+        for key in kwargs:
+            if not hasattr(self, key):
+                raise AttributeError(key)
+            setattr(self, key, kwargs[key])
+        return self
+
+    #   Reset the darts, the events and the counters, keep the configuration
+    def reset(self, seed=None):
+        self.darts = []
+        self._events = []
+        self._echoes = {}
+        self._recent = []
+        self.pings = 0
+        if seed is not None:
+            self.random.seed(seed)
+
+    ################################ Events ################################
+
+    #   Run the function fn when the virtual time reaches t_ms
+    def at(self, t_ms, fn, *args):
+        self.at_us(int(t_ms * 1000), fn, *args)
+
+    #   Run the function fn when the virtual time reaches t_us
+    def at_us(self, t_us, fn, *args):
+        self._seq += 1
+        heapq.heappush(self._events, (t_us, self._seq, fn, args))
+
+    #   Add a dart to the board now or at the time t_ms
+    def throw(self, x, y, at_ms=None):
+        if at_ms is None:
+            self.darts.append((x, y))
+        else:
+            self.at(at_ms, self.throw, x, y)
+
+    #   Remove all the darts from the board now or at the time t_ms
+    def clear(self, at_ms=None):
+        if at_ms is None:
+            self.darts = []
+        else:
+            self.at(at_ms, self.clear)
+
+    #   Stop the simulation at the time t_ms by raising SimStop
+    def stop(self, at_ms):
+        self.at(at_ms, self._stop)
+
+    def _stop(self):
+        raise SimStop(self.clock.ticks_ms())
+
+    def _run_events(self):
+        now = self.clock._now
+        while self._events and self._events[0][0] <= now:
+            _, _, fn, args = heapq.heappop(self._events)
+            fn(*args)
+
+    ################################ Physics ################################
+
+    #   Distance in cm from the front of the sensor to the closest object in its beam
+    def true_distance(self, index):
+        _, sx, sy = self.sensors[index]
+        r0 = math.sqrt(sx * sx + sy * sy)
+        #   The sensors point to the center of the board
+        ax = -sx / r0
+        ay = -sy / r0
+        if self.background_cm is None:
+            best = 2 * r0
+        else:
+            best = self.background_cm
+        cos_beam = math.cos(math.radians(self.beam_deg))
+        for (dx, dy) in self.darts:
+            vx = dx - sx
+            vy = dy - sy
+            r = math.sqrt(vx * vx + vy * vy)
+            if r == 0:
+                continue
+            if (vx * ax + vy * ay) / r < cos_beam:
+                continue
+            d = r - self.dart_radius
+            if d < best:
+                best = d
+        return best
+
+    #   Duration of the echo pulse in us for one ping of the sensor, None if the ping is lost
+    def echo_duration(self, index):
+        if self.replay is not None:
+            return self.replay.echo(index)
+        if index in self.dead or self.random.random() < self.dropout:
+            return None
+        if self.random.random() < self.outliers:
+            d = self.random.uniform(2, 2 * self.true_distance(index))
+        else:
+            d = self.true_distance(index) + self.random.gauss(0, self.noise_cm)
+        d = max(d - self.offset_cm, 0.5)
+        return int(d * 2 / self.sound_speed * 1000000)
+
+    ################################ Hardware ################################
+
+    #   Mux channel selected by the select pins, None if the mux is disabled
+    def channel(self):
+        levels = self._levels
+        if levels.get(self.mux[4], 0):
+            return None
+        return (levels.get(self.mux[0], 0) | levels.get(self.mux[1], 0) << 1 |
+                levels.get(self.mux[2], 0) << 2 | levels.get(self.mux[3], 0) << 3)
+
+    def _write(self, pin_id, value):
+        old = self._levels.get(pin_id, 0)
+        self._levels[pin_id] = value
+        if old == value:
+            return
+        if pin_id in self.mux:
+            self._mux_change = self.clock._now
+        elif pin_id == self.trig:
+            if value:
+                self._trig_rise = self.clock._now
+            else:
+                self._fire()
+
+    #   Falling edge of the trigger, start a ping on the sensor selected by the mux
+    def _fire(self):
+        now = self.clock._now
+        if now - self._trig_rise < MIN_TRIG_US:
+            return
+        if now - self._mux_change < self.mux_settle_us:
+            return
+        channel = self.channel()
+        if channel is None or channel >= len(self.sensors):
+            return
+        pin_id = self.sensors[channel][0]
+        #   The sensor ignores the trigger while its echo pin is high
+        if self._levels.get(pin_id, 0):
+            return
+        self.pings += 1
+        duration = self.echo_duration(channel)
+        if self.crosstalk:
+            duration = self._crosstalk(now, channel, duration)
+        if duration is None and (self.no_echo_us is None or channel in self.dead):
+            self._echoes.pop(pin_id, None)
+            return
+        if duration is None:
+            #   The sensor holds its echo pin high until it gives up waiting for the echo
+            duration = self.no_echo_us
+        rise = now + ECHO_DELAY_US
+        self._echoes[pin_id] = (rise, rise + duration)
+        self.at_us(rise, self._edge, pin_id, 1)
+        self.at_us(rise + duration, self._edge, pin_id, 0)
+
+    #   The burst of an adjacent sensor fired shortly before can reach the receiver before its own echo
+    def _crosstalk(self, now, channel, duration):
+        n = len(self.sensors)
+        recent = [r for r in self._recent if now - r[0] < XTALK_WINDOW_US]
+        for (t, other, other_duration) in recent:
+            if other_duration is None or (other - channel) % n not in (1, n - 1):
+                continue
+            own = duration
+            if own is None:
+                own = other_duration
+            #   Path other sensor -> object -> this sensor, measured from the trigger of this sensor
+            ghost = (other_duration + own) // 2 - (now - t)
+            if ghost > 0 and (duration is None or ghost < duration):
+                duration = ghost
+        recent.append((now, channel, duration))
+        self._recent = recent
+        return duration
+
+    #   Edge of an echo pin, call the irq handler of the pin
+    def _edge(self, pin_id, level):
+        self._levels[pin_id] = level
+        irq = self._irqs.get(pin_id)
+        if irq is not None:
+            handler, trigger, pin = irq
+            if trigger & (Pin.IRQ_RISING if level else Pin.IRQ_FALLING):
+                handler(pin)
+
+    #   Same as machine.time_pulse_us, the virtual time advances by the time the call would block
+    #   Like on the hardware a pin that is already high is timed from the call: the end of the pulse of an earlier
+    #   ping is returned as a short echo
+    def time_pulse_us(self, pin, pulse_level=1, timeout_us=1000000):
+        now = self.clock._now
+        echo = self._echoes.get(pin.id)
+        if echo is not None and echo[1] <= now:
+            del self._echoes[pin.id]
+            echo = None
+        if echo is None or echo[0] - now > timeout_us:
+            self.clock.advance(timeout_us)
+            return -2
+        rise, fall = echo
+        start = max(rise, now)
+        if fall - start > timeout_us:
+            self.clock.advance(start - now + timeout_us)
+            return -1
+        self.clock.advance(fall - now)
+        return fall - start
+
+
+#   NeoPixel ring, keeps the pixels in a list
+class NeoPixel:
+
+    board = None    #   Set by hal.py
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.buf = [(0, 0, 0)] * n
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, i, color):
+        self.buf[i] = color
+
+    def __getitem__(self, i):
+        return self.buf[i]
+
+    def fill(self, color):
+        self.buf = [color] * self.n
+
+    def write(self):
+        board = NeoPixel.board
+        board.neopixel_writes += 1
+        board.neopixel_color = self.buf[0]
+        if board.on_neopixel is not None:
+            board.on_neopixel(self.buf[0])
+
+
+#   WLAN station that is always in range
+class WLAN:
+
+    def __init__(self, interface=0):
+        self._active = False
+        self._connected = False
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+
+    def connect(self, ssid=None, password=None):
+        self._connected = self._active
+
+    def disconnect(self):
+        self._connected = False
+
+    def isconnected(self):
+        return self._connected
+
+    def ifconfig(self):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+
+network = types.SimpleNamespace(STA_IF=0, AP_IF=1, WLAN=WLAN)
+
+
+################################ urequests ################################
+
+#   Response with the same attributes as the urequests one
+class Response:
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+#   Send a request and return a Response, raises OSError if the server can not be reached
+def request(method, url, data=None, json=None, headers=None, timeout=None):
+    parts = urlsplit(url)
+    if parts.scheme == "https":
+        conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    if json is not None:
+        import json as _json
+        data = _json.dumps(json)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    try:
+        conn.request(method, path, body=data, headers=headers or {})
+        resp = conn.getresponse()
+        return Response(resp.status, resp.read())
+    finally:
+        conn.close()
+
+
+def post(url, **kw):
+    return request("POST", url, **kw)
+
+
+def get(url, **kw):
+    return request("GET", url, **kw)
+
+
+requests = types.SimpleNamespace(request=request, post=post, get=get, Response=Response)
+
+
+################################ gc ################################
+
+#   MicroPython gc module on top of the CPython one
+class SimGc:
+
+    board = None    #   Set by hal.py
+
+    def collect(self):
+        t0 = host_time.perf_counter()
+        host_gc.collect()
+        SimGc.board.clock.advance((host_time.perf_counter() - t0) * 1000000)
+
+    def enable(self):
+        host_gc.enable()
+
+    def disable(self):
+        host_gc.disable()
+
+    def isenabled(self):
+        return host_gc.isenabled()
+
+    #   Bytes allocated, CPython frees most objects right away so this is only counted by tracemalloc
+    def mem_alloc(self):
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+        return 0
+
+    def mem_free(self):
+        return 1 << 30
+
+
+gc = SimGc()
+
+
+################################ micropython ################################
+
+def _unchanged(f):
+    return f
+
+
+micropython = types.SimpleNamespace(native=_unchanged, viper=_unchanged, const=_unchanged)
+
+
+################################ uasyncio ################################
+
+#   Awaitable of asyncio.sleep: the task is scheduled again after us of virtual time
+class _Sleep:
+
+    def __init__(self, us):
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+
+#   Awaitable of Event.wait: the task waits until the event is set
+class _Wait:
+
+    def __init__(self, event):
+        self.event = event
+
+    def __await__(self):
+        if not self.event.state:
+            yield self
+
+
+#   Task of the scheduler, awaiting it waits until the coroutine is done and returns its result
+class Task:
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.waiters = []
+
+    def done(self):
+        return self.finished
+
+    def __await__(self):
+        if not self.finished:
+            yield self
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+#   Event with the uasyncio API
+class Event:
+
+    def __init__(self):
+        self.state = False
+        self.waiters = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        for task in self.waiters:
+            SimLoop.wake(task)
+        self.waiters = []
+
+    def clear(self):
+        self.state = False
+
+    def wait(self):
+        return _Wait(self)
+
+
+#   Scheduler of the tasks on the virtual clock: the task due first runs until its next await, the clock
+#   jumps to the time of the next task when every task is waiting
+class SimLoop:
+
+    board = None    #   Set by hal.py
+    _queue = []     #   (time in us, seq, task)
+    _seq = 0
+
+    @classmethod
+    def schedule(cls, task, us=0):
+        cls._seq += 1
+        heapq.heappush(cls._queue, (cls.board.clock._now + int(us), cls._seq, task))
+
+    #   Schedule a waiting task now
+    @classmethod
+    def wake(cls, task):
+        cls.schedule(task)
+
+    @classmethod
+    def step(cls, task):
+        if task.finished:
+            return
+        try:
+            cmd = task.coro.send(None)
+        except StopIteration as e:
+            cls.finish(task, e.value, None)
+            return
+        except SimStop:
+            raise
+        except Exception as e:
+            cls.finish(task, None, e)
+            return
+        if isinstance(cmd, _Sleep):
+            cls.schedule(task, cmd.us)
+        elif isinstance(cmd, _Wait):
+            cmd.event.waiters.append(task)
+        elif isinstance(cmd, Task):
+            cmd.waiters.append(task)
+        else:
+            cls.schedule(task)
+
+    @classmethod
+    def finish(cls, task, result, error):
+        task.finished = True
+        task.result = result
+        task.error = error
+        if error is not None and not task.waiters:
+            print("Task exception wasn't retrieved:", repr(error))
+        for waiter in task.waiters:
+            cls.wake(waiter)
+        task.waiters = []
+
+    @classmethod
+    def run(cls, coro):
+        cls._queue = []
+        main = create_task(coro)
+        clock = cls.board.clock
+        while not main.finished:
+            if not cls._queue:
+                raise RuntimeError("every task is waiting")
+            t, _, task = heapq.heappop(cls._queue)
+            if t > clock._now:
+                clock.advance(t - clock._now)
+            cls.step(task)
+        if main.error is not None:
+            raise main.error
+        return main.result
+
+
+def sleep(s):
+    return _Sleep(s * 1000000)
+
+
+def sleep_ms(ms):
+    return _Sleep(ms * 1000)
+
+
+def create_task(coro):
+    task = Task(coro)
+    SimLoop.schedule(task)
+    return task
+
+
+def run(coro):
+    return SimLoop.run(coro)
+
+
+asyncio = types.SimpleNamespace(sleep=sleep, sleep_ms=sleep_ms, create_task=create_task, run=run, Event=Event,
+                                Task=Task)
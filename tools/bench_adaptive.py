@@ -0,0 +1,72 @@
+"""
+Benchmark of the adaptive early terminating sampling on the simulated board.
+
+Usage:
+    python tools/bench_adaptive.py [scans]
+
+For every tolerance it reports the mean number of pings per sensor, the virtual time of a full scan
+and the mean absolute error against the noise free distances, for the serial scan and the echo capture.
+The last rows have sensor 3 disconnected to show the early abort on the failure ratio.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+TOLERANCES = [0, 0.5, 0.3, 0.1]
+
+
+def build_manager():
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    return UltraManager(sensors, Mux(*DEFAULT_MUX))
+
+
+def measure(manager, scans, dead=()):
+    board = hal.board
+    board.reset(seed=3)
+    board.dead = set(dead)
+    board.throw(4.0, -6.0)
+    truth = [board.true_distance(i) for i in range(len(board.sensors))]
+    live = [i for i in range(len(truth)) if i not in board.dead]
+    t0 = board.clock.ticks_us()
+    error = 0.0
+    pings = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(scans):
+            distances = manager.read_distances()
+            error += sum(abs(distances[i] - truth[i]) for i in live) / len(live)
+            pings += sum(manager._pings) / len(manager._pings)
+    board.dead = set()
+    return pings / scans, (board.clock.ticks_us() - t0) / scans / 1000, error / scans
+
+
+def main(argv):
+    scans = int(argv[1]) if len(argv) > 1 else 5
+    manager = build_manager()
+    print("%-10s %-10s %8s %10s %10s" % ("mode", "tolerance", "pings", "scan ms", "error cm"))
+    for spacing, mode in ((0, "serial"), (2, "capture")):
+        manager.set_capture(spacing)
+        for tolerance in TOLERANCES:
+            manager.set_adaptive(tolerance)
+            pings, scan_ms, error = measure(manager, scans)
+            print("%-10s %-10s %8.1f %10.1f %10.2f" % (mode, tolerance, pings, scan_ms, error))
+    print("sensor 3 disconnected:")
+    manager.set_capture(0)
+    for tolerance in (0, 0.3):
+        manager.set_adaptive(tolerance)
+        pings, scan_ms, error = measure(manager, scans, dead=(3,))
+        print("%-10s %-10s %8.1f %10.1f %10.2f" % ("serial", tolerance, pings, scan_ms, error))
+    manager.set_adaptive(0)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
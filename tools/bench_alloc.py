@@ -0,0 +1,100 @@
+"""
+Benchmark of the memory allocated by a full scan on the simulated board.
+
+Usage:
+    python tools/bench_alloc.py [scans]
+
+The original scan (a new list of durations per sensor, the min/max trimming loop and a new list of
+distances per scan) is compared with the preallocated sample stores and distances array. tracemalloc
+reports the peak of memory allocated on top of what was in use before the scan and the bytes still
+allocated after it (the printed lines are kept in a buffer, so printing shows up as kept bytes).
+The counters of the garbage collector policy are printed for the new scan.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+
+#   Sensor with the original read_distance
+class LegacySensor(UltraSensor):
+
+    def read_distance(self):
+        distances = []
+        for i in range(self._iterations):
+            ultrason_duration = self.ping()
+            if ultrason_duration > 0:
+                distances.append(ultrason_duration)
+        while len(distances) > 50:
+            distances.remove(min(distances))
+            distances.remove(max(distances))
+        cm = sum(distances) / len(distances)
+        cm = (cm * 340 / 20000) + 1.5
+        return round(cm, 2)
+
+
+#   Manager with the original read_distances
+class LegacyManager(UltraManager):
+
+    def read_distances(self):
+        distances = []
+        for i in range(len(self._sensors)):
+            self._multi.set_channel(i)
+            distance = self._sensors[i].read_distance()
+            distances.append(distance)
+            print("Sensor: ", i, " Distance: ", distance)
+            self._distances = distances
+        return distances
+
+
+def measure(manager, scans):
+    board = hal.board
+    board.reset(seed=3)
+    board.throw(4.0, -6.0)
+    peak = 0
+    kept = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.read_distances()
+        tracemalloc.start()
+        for _ in range(scans):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            manager.read_distances()
+            current, top = tracemalloc.get_traced_memory()
+            peak += top - before
+            kept += current - before
+        tracemalloc.stop()
+    return peak / scans, kept / scans
+
+
+def main(argv):
+    scans = int(argv[1]) if len(argv) > 1 else 5
+    legacy = LegacyManager([LegacySensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS],
+                           Mux(*DEFAULT_MUX))
+    manager = UltraManager([UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS],
+                           Mux(*DEFAULT_MUX))
+    print("%-28s %14s %14s" % ("scan", "peak bytes", "kept bytes"))
+    peak, kept = measure(legacy, scans)
+    print("%-28s %14.0f %14.0f" % ("original lists", peak, kept))
+    peak, kept = measure(manager, scans)
+    print("%-28s %14.0f %14.0f" % ("preallocated", peak, kept))
+    manager._verbose = False
+    peak, kept = measure(manager, scans)
+    print("%-28s %14.0f %14.0f" % ("preallocated, no print", peak, kept))
+    policy = manager.gc
+    print("gc policy %s: %d scans, %d collections, %d us collecting" % (
+        policy.mode, policy.scans, policy.collections, policy.total_gc_us))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,64 @@
+"""
+Benchmark of the interrupt driven echo capture against the serial time_pulse_us scan on the simulated board.
+
+Usage:
+    python tools/bench_capture.py [scans]
+
+For every mode it reports the virtual time of one full scan (10 sensors x 100 pings) and the mean
+absolute error of the distances against the noise free distances of the board, with a dart on the board
+and crosstalk between adjacent sensors turned on.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+MODES = [("serial", 0), ("capture spacing 1", 1), ("capture spacing 2", 2), ("capture spacing 3", 3)]
+
+
+def build_manager():
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    return UltraManager(sensors, Mux(*DEFAULT_MUX))
+
+
+def run(scans):
+    board = hal.board
+    manager = build_manager()
+    rows = []
+    for name, spacing in MODES:
+        board.reset(seed=3)
+        board.throw(4.0, -6.0)
+        truth = [board.true_distance(i) for i in range(len(board.sensors))]
+        manager.set_capture(spacing)
+        t0 = board.clock.ticks_us()
+        error = 0.0
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(scans):
+                distances = manager.read_distances()
+                error += sum(abs(d - t) for d, t in zip(distances, truth)) / len(truth)
+        scan_ms = (board.clock.ticks_us() - t0) / scans / 1000
+        rows.append((name, scan_ms, error / scans))
+    manager.set_capture(0)
+    return rows
+
+
+def main(argv):
+    scans = int(argv[1]) if len(argv) > 1 else 5
+    rows = run(scans)
+    base = rows[0][1]
+    print("%-20s %12s %10s %12s" % ("mode", "scan ms", "speedup", "error cm"))
+    for name, scan_ms, error in rows:
+        print("%-20s %12.1f %9.1fx %12.2f" % (name, scan_ms, base / scan_ms, error))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of the estimators of estimators.py against the original trimming loop.
+
+Usage:
+    python tools/bench_estimators.py [readings] [samples.json]
+
+The readings are recorded from the simulated board (100 pings of a random sensor with a dart on the
+board, noise, dropouts and spurious echoes) or loaded from a JSON file with a list of lists of echo
+durations in us. For every estimator it reports the time per reading and the mean and maximum
+difference in cm against the original trimming.
+"""
+
+# Import the libraries
+import os
+import sys
+import json
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+import estimators
+from ultraSensor import UltraSensor, CM_PER_US
+from simboard import DEFAULT_SENSORS
+
+REPEAT = 5
+
+
+#   Record readings of 100 pings from the simulated board
+def record(count, seed=5):
+    board = hal.board
+    board.reset(seed=seed)
+    board.throw(3.0, 7.0)
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    readings = []
+    for k in range(count):
+        i = k % len(sensors)
+        board._levels[board.mux[0]] = i & 1
+        board._levels[board.mux[1]] = i >> 1 & 1
+        board._levels[board.mux[2]] = i >> 2 & 1
+        board._levels[board.mux[3]] = i >> 3 & 1
+        values = []
+        for _ in range(100):
+            d = sensors[i].ping()
+            if d > 0:
+                values.append(d)
+        readings.append(values)
+    return readings
+
+
+#   Time of one estimator over all the readings, in us per reading, and the estimates
+def run(name, readings):
+    histogram = estimators.Histogram()
+    best = None
+    for _ in range(REPEAT):
+        copies = [list(values) for values in readings]
+        t0 = host_time.perf_counter()
+        results = [estimators.estimate(name, values, histogram) for values in copies]
+        elapsed = host_time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(readings) * 1000000, results
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 2000
+    if len(argv) > 2:
+        with open(argv[2]) as f:
+            readings = json.load(f)
+    else:
+        readings = record(count)
+    base_us, base = run("trim", readings)
+    print("%d readings, %.1f pings per reading" % (len(readings), sum(map(len, readings)) / len(readings)))
+    print("%-10s %12s %9s %14s %13s" % ("estimator", "us/reading", "speedup", "mean diff cm", "max diff cm"))
+    for name in estimators.ESTIMATORS:
+        if name == "trim":
+            us, results = base_us, base
+        else:
+            us, results = run(name, readings)
+        diffs = [abs(a - b) * CM_PER_US for a, b in zip(results, base)]
+        print("%-10s %12.1f %8.1fx %14.3f %13.3f" % (name, us, base_us / us,
+                                                      sum(diffs) / len(diffs), max(diffs)))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
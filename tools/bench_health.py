@@ -0,0 +1,130 @@
+"""
+Benchmark of the sensor health tracking and quarantine (sensorHealth.py) on the simulated board.
+
+Usage:
+    python tools/bench_health.py [scans] [darts]
+
+Sensor 3 is disconnected. For the board without health tracking (a quarantine limit that is never reached) and
+with it, it reports the virtual time of the scans (first scans and the rest), the location error over darts
+thrown at random locations, and the number of scans until sensor 3 is back once it is connected again.
+
+The two runs do not see the same noise (the skipped sensor changes the timing of the pings), so the location
+errors of the two runs are not compared with each other. The effect of the quarantine on the location is
+measured on the same scans of the run with tracking: every dart is located with the fingerprint lookup that
+leaves the quarantined sensor out (masked, what get_location does) and with the lookup over every sensor
+(unmasked). A disconnected sensor reads NO_ECHO either way, so the least squares solver never uses it: only
+the start of the solver differs.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import math
+import random
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+DEAD = 3
+
+
+def build_manager(tracking):
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    manager = UltraManager(sensors, Mux(*DEFAULT_MUX))
+    manager.load_fingerprints(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           "fingerprints.bin"))
+    if not tracking:
+        manager.health.max_failure = 2.0
+    return manager
+
+
+#   Location of the scan with the fingerprint lookup masked or not, returns (start, location)
+def locate(manager, masked):
+    mask = manager.health.mask
+    if not masked:
+        manager.health.mask = bytearray(b"\x01" * len(mask))
+    start = manager._fingerprints.lookup(manager._distances, mask if masked and manager.health.degraded() else None)
+    location = manager.get_location()
+    manager.health.mask = mask
+    return start, location
+
+
+#   Distance in cm between the location and the dart, inf if there is no location
+def error(location, x, y):
+    if location is None or not isinstance(location[0], (int, float)):
+        return float("inf")
+    return math.hypot(location[0] - x, location[1] - y)
+
+
+def percentiles(errors):
+    errors = sorted(errors)
+    return errors[len(errors) // 2], errors[int(len(errors) * 0.95)]
+
+
+def run(tracking, scans, darts):
+    board = hal.board
+    board.reset(seed=3)
+    board.dead = {DEAD}
+    manager = build_manager(tracking)
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(scans):
+            t0 = board.clock.ticks_us()
+            manager.read_distances()
+            times.append(board.clock.ticks_diff(board.clock.ticks_us(), t0) / 1000)
+        rnd = random.Random(5)
+        errors = {True: [], False: []}
+        starts = {True: [], False: []}
+        for _ in range(darts):
+            angle = rnd.uniform(0, 2 * math.pi)
+            radius = 14 * math.sqrt(rnd.random())
+            x, y = radius * math.cos(angle), radius * math.sin(angle)
+            board.darts = [(x, y)]
+            manager.read_distances()
+            for masked in (True, False):
+                start, location = locate(manager, masked)
+                errors[masked].append(error(location, x, y))
+                starts[masked].append(error(start, x, y))
+        board.darts = []
+        board.dead = set()
+        back = None
+        for k in range(1, 4 * manager.health.probe_every + 1 if manager.health.quarantines else 0):
+            manager.read_distances()
+            if not manager.health.quarantined(DEAD):
+                back = k
+                break
+    first = sum(times[:5]) / 5
+    rest = sum(times[5:]) / max(len(times) - 5, 1)
+    return first, rest, errors, starts, back, manager.health
+
+
+def main(argv):
+    scans = int(argv[1]) if len(argv) > 1 else 30
+    darts = int(argv[2]) if len(argv) > 2 else 200
+    print("sensor %d disconnected, %d scans, %d darts" % (DEAD, scans, darts))
+    print("%-10s %14s %14s %12s %12s %10s %12s" % ("health", "first 5 ms", "then ms", "p50 cm", "p95 cm",
+                                                 "back after", "quarantines"))
+    for tracking in (False, True):
+        first, rest, errors, starts, back, health = run(tracking, scans, darts)
+        p50, p95 = percentiles(errors[True])
+        print("%-10s %14.1f %14.1f %12.2f %12.2f %10s %12d" % ("on" if tracking else "off", first, rest, p50,
+                                                               p95, back if back is not None else "-",
+                                                               health.quarantines))
+    print("same scans with sensor %d quarantined:" % DEAD)
+    print("%-10s %14s %14s %12s %12s %10s" % ("lookup", "start p50 cm", "start p95 cm", "p50 cm", "p95 cm",
+                                              "no start"))
+    for masked in (True, False):
+        start50, start95 = percentiles([e for e in starts[masked] if e != float("inf")])
+        p50, p95 = percentiles(errors[masked])
+        print("%-10s %14.2f %14.2f %12.2f %12.2f %10d" % ("masked" if masked else "unmasked", start50, start95,
+                                                         p50, p95, starts[masked].count(float("inf"))))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,86 @@
+"""
+Benchmark of the latency of the calls to the game server with and without connection reuse.
+
+Usage:
+    python tools/bench_http.py [requests]
+
+The stand-in server (standin_server.py) runs on localhost over http and over https with a self signed
+certificate. The same sendDart request is sent with:
+    * urequests - one connection per request (the simulated urequests of simboard.py)
+    * close     - HttpClient with keep_alive=False, one connection per request
+    * reuse     - HttpClient with keep-alive, one connection for all the requests
+    * stale     - HttpClient with keep-alive against a server that drops idle connections: every
+                  request finds the connection closed and is sent again on a new one
+
+For every client it reports the mean, median and 95th percentile latency and the connections opened.
+On localhost there is no network round trip, so on the ESP32 over WiFi the difference is larger.
+"""
+
+# Import the libraries
+import os
+import sys
+import ssl
+import json
+import tempfile
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from httpClient import HttpClient
+from standin_server import GameServer, make_cert
+
+HEADERS = {"Cookie": "PHPSESSID=1234567890"}
+BODY = json.dumps({"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": 1,
+                   "dart_locationx": 1.25, "dart_locationy": -3.5})
+
+
+def run(post, url, count, pause=0):
+    times = []
+    for _ in range(count):
+        if pause:
+            host_time.sleep(pause)
+        t0 = host_time.perf_counter()
+        response = post(url, data=BODY, headers=HEADERS)
+        ok = response.json()["success"]
+        response.close()
+        times.append((host_time.perf_counter() - t0) * 1000)
+        assert ok
+    times.sort()
+    return sum(times) / count, times[count // 2], times[int(count * 0.95)]
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 200
+    tmp = tempfile.TemporaryDirectory()
+    certfile, keyfile = make_cert(tmp.name)
+    context = ssl.create_default_context(cafile=certfile)
+    print("%d requests per client" % count)
+    print("%-6s %-10s %10s %10s %10s %12s" % ("scheme", "client", "mean ms", "p50 ms", "p95 ms", "connections"))
+    for tls in (False, True):
+        for name in ("urequests", "close", "reuse", "stale"):
+            server = GameServer(certfile=certfile if tls else None, keyfile=keyfile,
+                                idle=0.02 if name == "stale" else None).start()
+            n = count
+            pause = 0
+            if name == "urequests":
+                if tls:
+                    #   The simulated urequests verifies with the default context of http.client
+                    ssl._create_default_https_context = lambda: context
+                post = hal.requests.post
+            else:
+                client = HttpClient(keep_alive=(name != "close"), context=context)
+                post = client.post
+                if name == "stale":
+                    n = max(count // 10, 5)
+                    pause = 0.05
+            mean, p50, p95 = run(post, server.url, n, pause)
+            server.stop()
+            print("%-6s %-10s %10.2f %10.2f %10.2f %12d" % ("https" if tls else "http", name, mean, p50, p95,
+                                                          server.connections))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
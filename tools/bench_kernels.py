@@ -0,0 +1,121 @@
+"""
+Benchmark of the kernels of kernels.py against the same code run by the bytecode interpreter.
+
+Usage:
+    python tools/bench_kernels.py           (CPython, simulated board)
+    mpremote run tools/bench_kernels.py     (ESP32, with hal.py and kernels.py on the board)
+
+On the ESP32 the kernels are native / viper machine code and the references below are bytecode, so
+the speedup is the gain of the code emitters. On CPython both are plain Python and the speedup is ~1x;
+the time of the ping loop there is the cost of the simulation, not of the sensors.
+"""
+
+# Import the libraries
+try:
+    import os
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except (ImportError, AttributeError, NameError):
+    pass
+
+from array import array
+import math
+import time as host_time
+from hal import Pin, time, time_pulse_us
+import kernels
+
+#   Timer in us of the host: ticks_us on MicroPython, perf_counter on CPython
+if hasattr(host_time, "ticks_us"):
+    def now_us():
+        return host_time.ticks_us()
+    def elapsed_us(t0):
+        return host_time.ticks_diff(host_time.ticks_us(), t0)
+else:
+    def now_us():
+        return host_time.perf_counter()
+    def elapsed_us(t0):
+        return (host_time.perf_counter() - t0) * 1000000
+
+
+################################ Bytecode references ################################
+
+def ping_burst_ref(trig, echo, samples, start, iterations, timeout):
+    count = start
+    size = len(samples)
+    for i in range(iterations):
+        trig.value(0)
+        time.sleep_us(2)
+        trig.value(1)
+        time.sleep_us(10)
+        trig.value(0)
+        try:
+            duration = time_pulse_us(echo, 1, timeout)
+        except OSError:
+            duration = 0
+        if duration > 0 and count < size:
+            samples[count] = duration
+            count += 1
+    return count
+
+
+def sum_range_ref(buf, lo, hi):
+    total = 0
+    for i in range(lo, hi):
+        total += buf[i]
+    return total
+
+
+def center_point_ref(x1, y1, r1):
+    d = math.sqrt(x1**2 + y1**2)
+    r2 = d - r1
+    a = (r1**2 - r2**2 + d**2) / (2*d)
+    return (x1 + a*(0 - x1)/d, y1 + a*(0 - y1)/d)
+
+
+def circle_intersection_ref(x1, y1, r1, x2, y2, r2):
+    d = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+    if d > r1 + r2 or d < abs(r1 - r2):
+        return None
+    a = (r1**2 - r2**2 + d**2) / (2*d)
+    h = math.sqrt(r1**2 - a**2)
+    x3 = x1 + a*(x2 - x1)/d
+    y3 = y1 + a*(y2 - y1)/d
+    return (x3 + h*(y2 - y1)/d, y3 - h*(x2 - x1)/d, x3 - h*(y2 - y1)/d, y3 + h*(x2 - x1)/d)
+
+
+################################ Benchmark ################################
+
+#   Best time in us of calling fn(*args) count times
+def timeit(fn, args, count, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = now_us()
+        for _ in range(count):
+            fn(*args)
+        t = elapsed_us(t0)
+        if best is None or t < best:
+            best = t
+    return best / count
+
+
+def main():
+    trig = Pin(4, Pin.OUT)
+    echo = Pin(13, Pin.IN)
+    samples = array("l", [0] * 100)
+    for i in range(100):
+        samples[i] = 2000 + (i * 37) % 200
+    cases = [
+        ("ping_burst x10", kernels.ping_burst, ping_burst_ref, (trig, echo, samples, 0, 10, 3000), 20),
+        ("sum_range 50", kernels.sum_range, sum_range_ref, (samples, 25, 75), 2000),
+        ("center_point", kernels.center_point, center_point_ref, (11.6, 15.2, 9.5), 5000),
+        ("circle_intersection", kernels.circle_intersection, circle_intersection_ref,
+         (11.6, 15.2, 9.5, 18.8, 5.7, 12.1), 5000),
+    ]
+    print("%-22s %12s %12s %9s" % ("kernel", "bytecode us", "kernel us", "speedup"))
+    for name, kernel, ref, args, count in cases:
+        t_ref = timeit(ref, args, count)
+        t_kernel = timeit(kernel, args, count)
+        print("%-22s %12.2f %12.2f %8.2fx" % (name, t_ref, t_kernel, t_ref / t_kernel))
+
+
+main()
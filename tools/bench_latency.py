@@ -0,0 +1,203 @@
+"""
+End to end benchmark of the latency from the throw of a dart to its report to the server, on the simulated
+board against the local stand-in server.
+
+Usage:
+    python tools/bench_latency.py [throws] [output.json] [noise_cm ...]
+
+The detection of main.py (its sensor manager, with the fingerprint index, and its SendDartLocation) handles
+throws darts at random locations and random times for every noise level. Every throw is split in stages:
+    * detect - from the dart hitting the board to the end of the quick scan that sees the change (virtual ms)
+    * confirm - region of interest scan and confirmation quick scan of the change (virtual ms)
+    * solve - location of the dart, get_location (host ms, the solver only runs compute)
+    * report - SendDartLocation and the send of the queued event until the server acknowledged it (host ms)
+    * total virtual - detect + confirm, the time on the board (virtual ms)
+    * total host - solve + report, the time of the compute and the network (host ms)
+and the calls that the stages are made of are timed once per throw on the board with the dart:
+read_distance of the sensor that changed and read_distances (virtual ms).
+
+It prints the percentiles of every stage and writes them with the location error to the output file (JSON,
+bench_latency.json in the temporary directory by default), one entry per noise level, so the numbers of two
+runs can be compared.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import json
+import math
+import random
+import tempfile
+import contextlib
+import time as host_time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from ultraSensor import QUICK, DART
+from standin_server import GameServer
+
+NOISES = [0.1, 0.3, 0.6, 1.0]
+STAGES = ["detect", "confirm", "solve", "report", "total_virtual", "total_host", "read_distance", "read_distances"]
+TIMEOUT_MS = 5000   #   A dart not confirmed after this time is missed
+PERCENTILES = (50, 90, 95, 99)
+
+
+#   Percentiles (nearest rank), mean and maximum of the values
+def stats(values):
+    if not values:
+        return {"n": 0}
+    values = sorted(values)
+    result = {"n": len(values), "mean": round(sum(values) / len(values), 3), "max": round(values[-1], 3)}
+    for p in PERCENTILES:
+        k = max(0, min(len(values) - 1, int(math.ceil(p / 100 * len(values))) - 1))
+        result["p%d" % p] = round(values[k], 3)
+    return result
+
+
+#   Send the queued events until the queue is empty or TIMEOUT_MS is over (virtual ms)
+async def drain(outbox):
+    deadline = hal.time.ticks_add(hal.time.ticks_ms(), TIMEOUT_MS)
+    while len(outbox) and hal.time.ticks_diff(deadline, hal.time.ticks_ms()) > 0:
+        if not await outbox.pump():
+            await hal.asyncio.sleep_ms(10)
+
+
+#   One throw: the dart lands at a random time during the detection, returns the times of the stages and the
+#   location error, None if the dart was not confirmed
+def throw(game, stream, rnd):
+    board = hal.board
+    clock = board.clock
+    manager = game.sensor_manager
+    board.darts = []
+    manager.set_baseline()
+    angle = rnd.uniform(0, 2 * math.pi)
+    radius = 15 * math.sqrt(rnd.random())
+    x, y = radius * math.cos(angle), radius * math.sin(angle)
+    land = clock.ticks_us() + int(rnd.uniform(0, 50000))
+    board.at_us(land, board.throw, x, y)
+    detect = None
+    while True:
+        kind, index, distances = next(stream)
+        now = clock.ticks_us()
+        if now - land > TIMEOUT_MS * 1000:
+            board.darts = []
+            return None
+        if kind == QUICK and index >= 0 and detect is None and now >= land:
+            detect = now
+        if kind == DART and now >= land:
+            break
+    if detect is None:
+        detect = now
+    confirm = now
+    t0 = host_time.perf_counter()
+    location = manager.get_location()
+    solve = host_time.perf_counter() - t0
+    manager.set_baseline(distances)
+    t0 = host_time.perf_counter()
+    game.SendDartLocation(location)
+    hal.asyncio.run(drain(game.outbox))
+    report = host_time.perf_counter() - t0
+    if isinstance(location[0], (int, float)):
+        error = math.hypot(location[0] - x, location[1] - y)
+    else:
+        error = float("inf")
+    #   The calls of the stages on the board with the dart
+    t = clock.ticks_us()
+    manager._read_sensor(index)
+    read_distance = clock.ticks_us() - t
+    t = clock.ticks_us()
+    manager.read_distances()
+    read_distances = clock.ticks_us() - t
+    times = {
+        "detect": (detect - land) / 1000,
+        "confirm": (confirm - detect) / 1000,
+        "solve": solve * 1000,
+        "report": report * 1000,
+        "read_distance": read_distance / 1000,
+        "read_distances": read_distances / 1000,
+    }
+    #   The virtual clock of the board and the clock of the host do not add up
+    times["total_virtual"] = times["detect"] + times["confirm"]
+    times["total_host"] = times["solve"] + times["report"]
+    return times, error
+
+
+def run(game, noise, throws, seed):
+    board = hal.board
+    board.reset(seed=seed)
+    board.noise_cm = noise
+    rnd = random.Random(seed)
+    stream = game.sensor_manager.scan_stream()
+    samples = {stage: [] for stage in STAGES}
+    errors = []
+    missed = 0
+    for _ in range(throws):
+        result = throw(game, stream, rnd)
+        if result is None:
+            missed += 1
+            continue
+        times, error = result
+        for stage in STAGES:
+            samples[stage].append(times[stage])
+        if error != float("inf"):
+            errors.append(error)
+    board.noise_cm = 0.3
+    return {
+        "noise_cm": noise,
+        "throws": throws,
+        "missed": missed,
+        "unlocated": throws - missed - len(errors),
+        "stages_ms": {stage: stats(samples[stage]) for stage in STAGES},
+        "error_cm": stats(errors),
+    }
+
+
+def main(argv):
+    throws = int(argv[1]) if len(argv) > 1 else 1000
+    output = argv[2] if len(argv) > 2 else os.path.join(tempfile.gettempdir(), "bench_latency.json")
+    noises = [float(a) for a in argv[3:]] or NOISES
+    server = GameServer(turns=1).start()
+    tmp = tempfile.TemporaryDirectory()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as game
+    game.sensor_manager._verbose = False
+    game.sensor_manager.load_fingerprints(os.path.join(ROOT, "fingerprints.bin"))
+    game.outbox = game.EventQueue(game.client, server.url, game.headers, path=os.path.join(tmp.name, "outbox.log"),
+                                  codec=game.codec)
+    results = []
+    start = host_time.time()
+    for noise in noises:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(game, noise, throws, seed=11)
+        results.append(result)
+        print("noise %.2f cm: %d throws, %d missed, %d without a location, error p50 %s p95 %s cm" % (
+            noise, throws, result["missed"], result["unlocated"], result["error_cm"].get("p50"),
+            result["error_cm"].get("p95")))
+        print("  %-16s %10s %10s %10s %10s %10s" % ("stage ms", "p50", "p90", "p99", "max", "mean"))
+        for stage in STAGES:
+            s = result["stages_ms"][stage]
+            if s["n"]:
+                print("  %-16s %10.2f %10.2f %10.2f %10.2f %10.2f" % (stage, s["p50"], s["p90"], s["p99"], s["max"],
+                                                                     s["mean"]))
+    server.stop()
+    tmp.cleanup()
+    report = {
+        "benchmark": "throw_to_report_latency",
+        "backend": hal.BACKEND,
+        "units": {"detect": "virtual ms", "confirm": "virtual ms", "solve": "host ms", "report": "host ms",
+                  "total_virtual": "virtual ms", "total_host": "host ms", "read_distance": "virtual ms",
+                  "read_distances": "virtual ms"},
+        "wall_s": round(host_time.time() - start, 1),
+        "levels": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("written to %s" % output)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
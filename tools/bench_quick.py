@@ -0,0 +1,159 @@
+"""
+Benchmark of the two tier change detection (quick presence scan, full scan only on a change) on the
+simulated board.
+
+Usage:
+    python tools/bench_quick.py [darts] [idle_scans]
+
+It reports:
+    * the virtual time and rate of a quick scan and of a full scan
+    * the detection latency (from the time the dart hits the board until its location is known) and
+      the location error of the original GameDart1 loop (full scan, 1 second sleep, second full scan on a
+      detection), of the two tier loop and of the two tier loop that only reads the changed sensor and its
+      neighbours again (read_subset), over darts thrown at random times and locations
+    * the false escalations (full scans started on an empty board) of the two tier loop over idle_scans
+      quick scans, for several noise levels
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import math
+import random
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+NOISES = [0.3, 1.0, 2.0]
+
+
+def build_manager():
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    manager = UltraManager(sensors, Mux(*DEFAULT_MUX))
+    manager.load_fingerprints(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           "fingerprints.bin"))
+    return manager
+
+
+def detected(distances):
+    for distance in distances:
+        if distance < 30:
+            return True
+    return False
+
+
+#   Original loop: full scan every second, a second full scan for the location
+def legacy(manager, time):
+    while True:
+        distances = manager.read_distances()
+        if detected(distances):
+            manager.read_distances()
+            return manager.get_location()
+        time.sleep(1)
+
+
+#   Two tier loop: quick scans until a change, a full scan for the location checked by a quick scan
+def two_tier(manager, time):
+    manager.set_baseline()
+    while True:
+        if manager.quick_changed() < 0:
+            continue
+        distances = manager.read_distances()
+        if not manager.quick_matches(distances):
+            continue
+        if detected(distances):
+            return manager.get_location()
+        manager.set_baseline()
+
+
+#   Two tier loop with the region of interest: only the changed sensor and its neighbours are read again
+def subset(manager, time):
+    manager.set_baseline()
+    while True:
+        index = manager.quick_changed()
+        if index < 0:
+            continue
+        distances = manager.read_subset(manager.get_subset(index))
+        if not manager.quick_matches(distances):
+            continue
+        if detected(distances):
+            return manager.get_location()
+        manager.set_baseline()
+
+
+def latency(manager, loop, darts):
+    board = hal.board
+    board.reset(seed=5)
+    rnd = random.Random(11)
+    latencies = []
+    errors = []
+    for _ in range(darts):
+        board.darts = []
+        angle = rnd.uniform(0, 2 * math.pi)
+        radius = 14 * math.sqrt(rnd.random())
+        x, y = radius * math.cos(angle), radius * math.sin(angle)
+        thrown = board.clock.ticks_ms() + rnd.randint(500, 5000)
+        board.throw(x, y, at_ms=thrown)
+        location = loop(manager, board.clock)
+        latencies.append(board.clock.ticks_ms() - thrown)
+        if isinstance(location[0], (int, float)):
+            errors.append(math.hypot(location[0] - x, location[1] - y))
+    latencies.sort()
+    errors.sort()
+    return latencies, errors
+
+
+def main(argv):
+    darts = int(argv[1]) if len(argv) > 1 else 40
+    idle_scans = int(argv[2]) if len(argv) > 2 else 2000
+    board = hal.board
+    manager = build_manager()
+    with contextlib.redirect_stdout(io.StringIO()):
+        board.reset(seed=3)
+        t0 = board.clock.ticks_us()
+        for _ in range(50):
+            manager.quick_scan()
+        quick_ms = (board.clock.ticks_us() - t0) / 50 / 1000
+        t0 = board.clock.ticks_us()
+        for _ in range(3):
+            manager.read_distances()
+        full_ms = (board.clock.ticks_us() - t0) / 3 / 1000
+    print("%-10s %10s %10s" % ("scan", "ms", "scans/s"))
+    print("%-10s %10.1f %10.1f" % ("quick", quick_ms, 1000 / quick_ms))
+    print("%-10s %10.1f %10.2f" % ("full", full_ms, 1000 / full_ms))
+
+    print("%-10s %10s %10s %10s %10s %10s" % ("loop", "mean ms", "p50 ms", "p95 ms", "max ms", "error cm"))
+    for name, loop in (("legacy", legacy), ("two tier", two_tier), ("subset", subset)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, errors = latency(manager, loop, darts)
+        print("%-10s %10.0f %10.0f %10.0f %10.0f %10.2f" % (
+            name, sum(latencies) / len(latencies), latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.95)], latencies[-1],
+            errors[int(len(errors) * 0.95)] if errors else float("nan")))
+
+    print("%-10s %10s %12s %12s" % ("noise cm", "quick", "escalations", "per hour"))
+    for noise in NOISES:
+        board.reset(seed=7)
+        board.noise_cm = noise
+        escalations = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.set_baseline()
+            t0 = board.clock.ticks_us()
+            for _ in range(idle_scans):
+                if manager.quick_changed() >= 0:
+                    escalations += 1
+                    manager.read_distances()
+                    manager.set_baseline()
+            hours = (board.clock.ticks_us() - t0) / 3600e6
+        print("%-10s %10d %12d %12.1f" % (noise, idle_scans, escalations, escalations / hours))
+    board.noise_cm = 0.3
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,94 @@
+"""
+Benchmark of the range gated acquisition (UltraManager.set_range) on the simulated board.
+
+Usage:
+    python tools/bench_range.py [scans]
+
+Three configurations of the full scan are compared:
+    * legacy - 50 ms echo timeout, the next ping is fired right after the echo
+    * gated - echo timeout of the furthest point of the board each sensor can see, next ping as soon as the echo
+      pin is low (the default of UltraManager)
+    * paced - the same gate, the next ping waits until the echo window and the ring-down are over (pace=True)
+A ping without an echo holds the echo pin high for 38 ms like the HC-SR04 does, the sensor ignores the trigger
+until then (simboard.py no_echo_us). The health of the sensors is not checked, every mode reads all of them.
+
+For a dart close to a sensor, the empty board and the empty board with 20% of the pings lost it reports the
+virtual time of a scan, the pings per second, the ghost echoes (stored echoes more than 2 cm away from the true
+distance, crosstalk and outliers), the usable pings per second (pings without a ghost echo) and the mean
+absolute error of the scan.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager, CM_PER_US
+from sensorHealth import SensorHealth
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+BOARDS = [("dart", [(3.0, 10.0)], 0.02), ("empty", [], 0.02), ("flaky", [], 0.2)]
+
+
+def build_manager():
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    return UltraManager(sensors, Mux(*DEFAULT_MUX))
+
+
+def configure(manager, mode):
+    #   No sensor is quarantined, every mode reads all the sensors
+    manager.health = SensorHealth(len(manager._sensors), max_failure=2.0, max_spread=1.0e9, max_stuck=65535)
+    manager.set_range(pace=mode == "paced")
+    if mode == "legacy":
+        for sensor in manager._sensors:
+            sensor._timeOut = 50000
+
+
+def measure(manager, darts, dropout, scans):
+    board = hal.board
+    board.reset(seed=3)
+    board.darts = list(darts)
+    board.dropout = dropout
+    truth = [board.true_distance(i) for i in range(len(board.sensors))]
+    pings = 0
+    ghosts = 0
+    error = 0.0
+    t0 = board.clock.ticks_us()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(scans):
+            distances = manager.read_distances()
+            for i in range(len(truth)):
+                sensor = manager._sensors[i]
+                pings += sensor.pings
+                for k in range(sensor._count):
+                    if abs(sensor._samples[k] * CM_PER_US + 1.5 - truth[i]) > 2:
+                        ghosts += 1
+                error += abs(distances[i] - truth[i]) / len(truth)
+    seconds = (board.clock.ticks_us() - t0) / 1000000
+    board.dropout = 0.02
+    return seconds / scans * 1000, pings / seconds, ghosts / pings, (pings - ghosts) / seconds, error / scans
+
+
+def main(argv):
+    scans = int(argv[1]) if len(argv) > 1 else 5
+    manager = build_manager()
+    print("timeout us: %s" % [sensor._timeOut for sensor in manager._sensors])
+    print("period us:  %s" % [sensor._period for sensor in manager._sensors])
+    print("%-7s %-7s %10s %10s %10s %12s %10s" % ("board", "mode", "scan ms", "pings/s", "ghosts %",
+                                                 "usable/s", "error cm"))
+    for name, darts, dropout in BOARDS:
+        for mode in ("legacy", "gated", "paced"):
+            configure(manager, mode)
+            scan_ms, rate, ghosts, usable, error = measure(manager, darts, dropout, scans)
+            print("%-7s %-7s %10.1f %10.1f %10.2f %12.1f %10.2f" % (name, mode, scan_ms, rate, ghosts * 100,
+                                                                    usable, error))
+    configure(manager, "gated")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
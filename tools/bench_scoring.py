@@ -0,0 +1,68 @@
+"""
+Bulk benchmark of the scoring engine (scoring.py) against scoring with atan2 and sqrt.
+
+Usage:
+    python tools/bench_scoring.py [points] [rotation_deg]
+
+The points are uniform over the 40 x 40 cm board (about 45 % of them hit the scoring area). The reference
+converts every point to polar coordinates with atan2 and sqrt and walks the rings. The benchmark reports
+the throughput of both and the number of points where they disagree (there should be none).
+"""
+
+# Import the libraries
+import os
+import sys
+import math
+import random
+import time as host_time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import Scorer, SEGMENTS, RINGS
+
+
+#   Scoring with polar coordinates
+def reference(x, y, rotation):
+    r = math.sqrt(x * x + y * y)
+    for radius, segment, multiplier in RINGS:
+        if r < radius:
+            break
+    else:
+        return (0, 0, 0)
+    if segment is None:
+        angle = (math.degrees(math.atan2(x, y)) - rotation + 9) % 360
+        segment = SEGMENTS[int(angle // 18) % 20]
+    return (segment, multiplier, segment * multiplier)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 2000000
+    rotation = float(argv[2]) if len(argv) > 2 else 0.0
+    rnd = random.Random(9)
+    xs = array("d", (rnd.uniform(-20, 20) for _ in range(count)))
+    ys = array("d", (rnd.uniform(-20, 20) for _ in range(count)))
+
+    t0 = host_time.perf_counter()
+    scorer = Scorer(rotation)
+    build_ms = (host_time.perf_counter() - t0) * 1000
+    score = scorer.score
+    t0 = host_time.perf_counter()
+    table = [score(xs[i], ys[i]) for i in range(count)]
+    table_s = host_time.perf_counter() - t0
+
+    t0 = host_time.perf_counter()
+    polar = [reference(xs[i], ys[i], rotation) for i in range(count)]
+    polar_s = host_time.perf_counter() - t0
+
+    mismatch = sum(1 for a, b in zip(table, polar) if a != b)
+    points = sum(s[2] for s in table)
+    print("%d points, rotation %.1f deg, tables built in %.1f ms" % (count, rotation, build_ms))
+    print("%-8s %10s %12s" % ("scorer", "s", "Mpoints/s"))
+    print("%-8s %10.2f %12.2f" % ("polar", polar_s, count / polar_s / 1e6))
+    print("%-8s %10.2f %12.2f" % ("table", table_s, count / table_s / 1e6))
+    print("speedup %.2fx, mismatches %d, mean points %.2f" % (polar_s / table_s, mismatch, points / count))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,80 @@
+"""
+Benchmark of the location solvers on simulated throws.
+
+Usage:
+    python tools/bench_solver.py [throws] [noise_cm]
+
+Every throw puts one dart at a random location of the board. The distances of the sensors are the
+noise free distances of the simulated board plus gaussian noise (sensors that do not see the dart read
+the opposite rim). For the two circle solver ("pair") and the least squares solver ("lsq") it reports
+the failed solves (no location), the mean and 95th percentile of the location error and the solve time.
+"""
+
+# Import the libraries
+import os
+import sys
+import math
+import random
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+
+
+#   Distances of the sensors for a list of throws
+def make_throws(count, noise, seed=11):
+    board = hal.board
+    rnd = random.Random(seed)
+    throws = []
+    for _ in range(count):
+        radius = 15 * math.sqrt(rnd.random())
+        angle = rnd.uniform(0, 2 * math.pi)
+        x = radius * math.cos(angle)
+        y = radius * math.sin(angle)
+        board.darts = [(x, y)]
+        distances = [board.true_distance(i) + board.dart_radius + rnd.gauss(0, noise)
+                     for i in range(len(board.sensors))]
+        throws.append((x, y, distances))
+    board.darts = []
+    return throws
+
+
+def run(manager, mode, throws):
+    manager.set_solver(mode)
+    failed = 0
+    errors = []
+    t0 = host_time.perf_counter()
+    for x, y, distances in throws:
+        manager._distances = distances
+        location = manager.get_location()
+        if location[0] == "None":
+            failed += 1
+            continue
+        errors.append(math.sqrt((location[0] - x) ** 2 + (location[1] - y) ** 2))
+    elapsed = (host_time.perf_counter() - t0) / len(throws) * 1000000
+    errors.sort()
+    mean = sum(errors) / len(errors) if errors else 0
+    p95 = errors[int(len(errors) * 0.95)] if errors else 0
+    return failed, mean, p95, elapsed
+
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 5000
+    noise = float(argv[2]) if len(argv) > 2 else 0.3
+    throws = make_throws(count, noise)
+    manager = UltraManager([UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS],
+                           Mux(*DEFAULT_MUX))
+    print("%d throws, noise %.2f cm" % (count, noise))
+    print("%-6s %10s %12s %12s %10s" % ("solver", "failed %", "mean err cm", "p95 err cm", "us/solve"))
+    for mode in ("pair", "lsq"):
+        failed, mean, p95, us = run(manager, mode, throws)
+        print("%-6s %10.1f %12.2f %12.2f %10.1f" % (mode, 100.0 * failed / count, mean, p95, us))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,115 @@
+"""
+Throughput benchmark of the acquisition thread (acquisition.py) on CPython, with threading standing in for
+_thread of MicroPython.
+
+Usage:
+    python tools/bench_threads.py [seconds] [latency_ms ...]
+
+The producer is the two tier detection on the simulated board (quick scans of the empty board). The consumer
+reads every frame and sends one request to the local stand-in server for every EVERY frames (a sendDarts
+request, the reply delayed by latency_ms like a WiFi round trip). Both run for the given wall time:
+    * serial - one loop: one step of the producer, then the request if one is due (the original main loop)
+    * threaded - the producer on its own thread writes the frame ring, the consumer reads it and sends
+
+It reports the scans (frames produced) and the requests per second of wall time, the frames read by the
+consumer and the frames dropped on a full ring. On CPython the producer is pure Python and only overlaps with
+the network waits of the consumer (the switch interval of the interpreter is lowered so the two threads take
+turns often), like on the ESP32 where the two threads share one core under the global interpreter lock.
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import contextlib
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+from acquisition import Acquisition
+from httpClient import HttpClient
+from wire import Codec
+from standin_server import GameServer
+
+EVERY = 10  #   Frames per request
+EVENT = {"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": 1, "dart_locationx": 0.0,
+         "dart_locationy": 0.0}
+
+
+def build_manager():
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS]
+    manager = UltraManager(sensors, Mux(*DEFAULT_MUX))
+    manager._verbose = False
+    return manager
+
+
+#   Request of one frame
+def send(client, codec, url, acquisition, seq):
+    event = dict(EVENT, seq=seq, dart_locationx=acquisition.distances[0])
+    codec.post(client, url, "sendDarts", [event])
+
+
+def serial(url, seconds):
+    hal.board.reset(seed=3)
+    acquisition = Acquisition(build_manager(), threaded=False)
+    client = HttpClient(timeout=5)
+    codec = Codec()
+    frames = 0
+    requests = 0
+    end = host_time.perf_counter() + seconds
+    while host_time.perf_counter() < end:
+        if acquisition.poll():
+            frames += 1
+            if frames % EVERY == 0:
+                requests += 1
+                send(client, codec, url, acquisition, requests)
+    client.close()
+    return acquisition.frames / seconds, requests / seconds, frames, acquisition.ring.dropped
+
+
+def threaded(url, seconds):
+    hal.board.reset(seed=3)
+    acquisition = Acquisition(build_manager(), threaded=True)
+    client = HttpClient(timeout=5)
+    codec = Codec()
+    frames = 0
+    requests = 0
+    acquisition.start()
+    end = host_time.perf_counter() + seconds
+    while host_time.perf_counter() < end:
+        if acquisition.poll():
+            frames += 1
+            if frames % EVERY == 0:
+                requests += 1
+                send(client, codec, url, acquisition, requests)
+        else:
+            host_time.sleep(0.0005)
+    acquisition.stop()
+    while not acquisition.stopped:
+        host_time.sleep(0.001)
+    client.close()
+    return acquisition.frames / seconds, requests / seconds, frames, acquisition.ring.dropped
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 3
+    latencies = [float(a) for a in argv[2:]] or [0, 5, 20]
+    sys.setswitchinterval(0.0005)
+    print("%-10s %-10s %10s %12s %10s %10s" % ("latency", "mode", "scans/s", "requests/s", "read", "dropped"))
+    for latency in latencies:
+        server = GameServer(turns=1, latency=latency / 1000).start()
+        for name, run in (("serial", serial), ("threaded", threaded)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                scans, requests, read, dropped = run(server.url, seconds)
+            print("%-10s %-10s %10.1f %12.1f %10d %10d" % ("%g ms" % latency, name, scans, requests, read,
+                                                            dropped))
+        server.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
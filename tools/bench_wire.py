@@ -0,0 +1,94 @@
+"""
+Size and time comparison of the JSON and binary wire formats (wire.py).
+
+Usage:
+    python tools/bench_wire.py [repeat]
+
+For every action (and batches of darts) it reports the size of the request body and of the reply, the
+encode time of the request and the decode time of the reply on CPython, and the bytes allocated by one
+encode and decode (tracemalloc, a proxy for the heap used on the ESP32).
+"""
+
+# Import the libraries
+import os
+import sys
+import json
+import tracemalloc
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+import wire
+from httpClient import Response
+
+
+def make_dart(seq):
+    return {"action": "sendDart", "game_id": 12, "player_id": 2, "game_turn": 7, "seq": seq,
+            "dart_locationx": 4.304391756416743, "dart_locationy": -12.160163865337864,
+            "dart_segment": 17, "dart_multiplier": 1, "dart_points": 17}
+
+
+CASES = [
+    ("gettingNewGame", "gettingNewGame", [],
+     {"gameStatus": True, "game_id": 12, "player_id": 2, "game_turn": 7}),
+    ("sendDart", "sendDarts", [make_dart(1)], {"success": True, "acks": [1], "duplicates": 0}),
+    ("sendDarts x3", "sendDarts", [make_dart(i) for i in range(1, 4)],
+     {"success": True, "acks": [1, 2, 3], "duplicates": 0}),
+    ("sendDarts x5", "sendDarts", [make_dart(i) for i in range(1, 6)],
+     {"success": True, "acks": [1, 2, 3, 4, 5], "duplicates": 0}),
+    ("nextTurn", "nextTurn", [{"action": "nextTurn", "game_id": 12, "player_id": 2, "game_turn": 7,
+                               "seq": 9}], {"turn": True}),
+]
+
+
+#   Best time in us of fn over repeat calls
+def timeit(fn, repeat):
+    best = None
+    for _ in range(5):
+        t0 = host_time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = (host_time.perf_counter() - t0) / repeat * 1000000
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+#   Bytes allocated by one call of fn
+def allocated(fn):
+    fn()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+
+def main(argv):
+    repeat = int(argv[1]) if len(argv) > 1 else 20000
+    print("%-14s %-6s %9s %9s %11s %11s %11s" % ("action", "format", "req B", "reply B", "encode us",
+                                                  "decode us", "alloc B"))
+    for name, action, events, reply in CASES:
+        for binary in (False, True):
+            codec = wire.Codec(binary)
+            body = codec.encode(action, events)
+            if binary:
+                content = wire.encode_reply(action, reply)
+                response = Response(200, content, wire.CONTENT_TYPE)
+            else:
+                content = json.dumps(reply).encode()
+                response = Response(200, content, "application/json")
+            assert codec.decode(response) is not None
+            encode_us = timeit(lambda: codec.encode(action, events), repeat)
+            decode_us = timeit(lambda: codec.decode(response), repeat)
+            alloc = allocated(lambda: (codec.encode(action, events), codec.decode(response)))
+            print("%-14s %-6s %9d %9d %11.2f %11.2f %11d" % (name, "binary" if binary else "json",
+                                                             len(body), len(content), encode_us, decode_us,
+                                                             alloc))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,79 @@
+"""
+Check of the fingerprint index as the start of the least squares solver (fingerprint.py, UltraManager.locate).
+
+Usage:
+    python tools/check_fingerprints.py [throws] [seed]
+
+The throws of tools/bench_solver.py (a dart at a random location, the distances of the simulated board plus
+gaussian noise) are located with and without the index of fingerprints.bin, at several noise levels. Near the
+rim most sensors read the range and many grid points match the scan equally well.
+With the index every location must be on the board and the worst location error must not be worse than the
+worst error of the solver alone.
+"""
+
+# Import the libraries
+import os
+import sys
+import math
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+from bench_solver import make_throws
+
+NOISES = (0.1, 0.3, 1.0)
+TOLERANCE = 0.5     #   cm the worst error with the index may be over the worst error without it
+
+
+#   Errors of the located throws and the locations that are off the board
+def locate(manager, throws):
+    errors = []
+    off = []
+    for x, y, distances in throws:
+        manager._distances = distances
+        location = manager.get_location()
+        if location[0] == "None":
+            continue
+        if not manager.is_inside_board(location[0], location[1]):
+            off.append(((x, y), location))
+        errors.append(math.sqrt((location[0] - x) ** 2 + (location[1] - y) ** 2))
+    return errors, off
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 1000
+    seed = int(argv[2]) if len(argv) > 2 else 11
+    manager = UltraManager([UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS],
+                           Mux(*DEFAULT_MUX))
+    manager._verbose = False
+    ok = True
+    print("%-9s %-6s %8s %12s %12s %8s" % ("noise cm", "index", "located", "mean err cm", "max err cm", "off"))
+    for noise in NOISES:
+        throws = make_throws(count, noise, seed)
+        manager._fingerprints = None
+        plain, plain_off = locate(manager, throws)
+        if not manager.load_fingerprints(os.path.join(ROOT, "fingerprints.bin")):
+            print("FAIL: fingerprints.bin not loaded")
+            return 1
+        indexed, off = locate(manager, throws)
+        for name, errors, outside in (("none", plain, plain_off), ("fp", indexed, off)):
+            print("%-9.2f %-6s %8d %12.2f %12.2f %8d" % (noise, name, len(errors), sum(errors) / len(errors),
+                                                       max(errors), len(outside)))
+        if off:
+            ok = False
+            for (x, y), location in off[:5]:
+                print("FAIL: throw at (%.1f, %.1f) located off the board at (%.1f, %.1f)" % (
+                    x, y, location[0], location[1]))
+        if max(indexed) > max(plain) + TOLERANCE:
+            ok = False
+            print("FAIL: worst error %.2f cm with the index, %.2f cm without" % (max(indexed), max(plain)))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
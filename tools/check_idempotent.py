@@ -0,0 +1,111 @@
+"""
+Check of the idempotent sends of the event queue (eventQueue.py) against a faulty stand-in server.
+
+Usage:
+    python tools/check_idempotent.py [turns] [fault_probability] [seed]
+
+The stand-in server drops requests before processing them, processes requests twice (replayed packets)
+and drops replies after processing the request, each with the given probability. The board plays the
+given number of turns of 3 darts and a nextTurn through the queue with pipelining and batching, the
+queue is reloaded from its log (a reset of the board) every few turns and already acknowledged darts
+are sent again by hand. At the end every dart must have been received exactly once and in order, and
+the server must have counted exactly one turn per nextTurn.
+"""
+
+# Import the libraries
+import os
+import sys
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from hal import time, asyncio
+from httpClient import HttpClient
+from eventQueue import EventQueue
+from standin_server import GameServer
+
+
+#   Send until the event with this seq is acknowledged or timeout_ms is over, returns the reply or None
+async def wait(queue, seq, timeout_ms):
+    deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+    while queue.is_pending(seq) and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+        if not await queue.pump():
+            await asyncio.sleep_ms(10)
+    return await queue.reply(seq, deadline)
+
+
+def main(argv):
+    turns = int(argv[1]) if len(argv) > 1 else 200
+    p = float(argv[2]) if len(argv) > 2 else 0.15
+    seed = int(argv[3]) if len(argv) > 3 else 3
+    rnd = random.Random(seed)
+    return asyncio.run(check(turns, p, seed, rnd))
+
+
+async def check(turns, p, seed, rnd):
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "outbox.log")
+    server = GameServer(turns=turns + 1, drop_request=p, replay=p, drop_reply=p, seed=seed).start()
+    client = HttpClient(timeout=1)
+
+    def make_queue():
+        return EventQueue(client, server.url, path=path, backoff_ms=10, max_backoff_ms=200)
+
+    queue = make_queue()
+    expected = []
+    failures = 0
+    resets = 0
+    replays = 0
+    for turn in range(turns):
+        for dart in range(3):
+            event = {"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": turn + 1,
+                     "dart_locationx": round(rnd.uniform(-15, 15), 2),
+                     "dart_locationy": round(rnd.uniform(-15, 15), 2)}
+            queue.put(event)
+            expected.append(event["seq"])
+            await queue.pump()
+        if rnd.random() < 0.1:
+            #   Reset of the board: the pending events come back from the log
+            failures += queue.failures
+            queue = make_queue()
+            resets += 1
+        seq = queue.put({"action": "nextTurn", "game_id": 1, "player_id": 1, "game_turn": turn + 1})
+        reply = await wait(queue, seq, 60000)
+        if reply is None or reply.get("turn") != True:
+            print("FAIL: turn %d got %r" % (turn + 1, reply))
+            return 1
+        if rnd.random() < 0.2:
+            #   Send an acknowledged dart again, like a client that lost the reply
+            for _ in range(3):
+                try:
+                    response = client.post(server.url, json={"action": "sendDart", "game_id": 1,
+                                                            "seq": rnd.choice(expected)})
+                    response.close()
+                    replays += 1
+                    break
+                except OSError:
+                    pass
+    failures += queue.failures
+    server.stop()
+
+    received = [dart["seq"] for dart in server.darts]
+    print("%d turns, %d darts, fault probability %.2f" % (turns, len(expected), p))
+    print("Requests: %d  Connections: %d  Failed requests: %d  Resets: %d  Replays: %d" % (
+        server.requests, server.connections, failures, resets, replays))
+    print("Repeated events not processed again: %d" % server.duplicates)
+    ok = received == expected and server._turn == turns
+    if received != expected:
+        print("FAIL: %d darts received, %d unique, expected %d" % (len(received), len(set(received)),
+                                                                 len(expected)))
+    if server._turn != turns:
+        print("FAIL: the server counted %d turns" % server._turn)
+    print("OK" if ok else "FAIL")
+    tmp.cleanup()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,136 @@
+"""
+Check that the metrics endpoint (metrics.py MetricsServer) does not stall the other uasyncio tasks.
+
+Usage:
+    python tools/check_metrics.py [timeout_ms]
+
+The server task runs next to a ticker task that wakes every TICK_MS while a client thread opens, in real time:
+    * silent  - a connection that never sends its request
+    * trickle - a GET /metrics sent one byte every 50 ms
+    * metrics - a GET /metrics
+    * get     - a GET /reset, it must not clear the metrics
+    * reset   - a POST /reset
+The silent and the trickle connections must be closed by the server once timeout_ms is over, the ticker must
+never wait more than MAX_GAP_MS of host time for the server, and only the POST clears the metrics.
+"""
+
+# Import the libraries
+import os
+import sys
+import json
+import socket
+import threading
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from hal import asyncio
+from metrics import Metrics, MetricsServer, SOLVE
+
+TICK_MS = 20
+MAX_GAP_MS = 500
+
+
+#   Send the request, slowly if pause (s) is given, returns (status line, body) or None if the server closed
+#   the connection without an answer
+def call(port, request, pause=0.0):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.settimeout(10)
+    try:
+        if request is None:
+            data = sock.recv(1024)
+            return None if not data else data
+        if pause:
+            for k in range(len(request)):
+                host_time.sleep(pause)
+                sock.sendall(request[k:k + 1])
+        else:
+            sock.sendall(request)
+        answer = b""
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            answer += data
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    if not answer:
+        return None
+    head, _, body = answer.partition(b"\r\n\r\n")
+    return head.split(b"\r\n")[0].decode(), body
+
+
+def client(port, results):
+    results["silent"] = call(port, None)
+    results["trickle"] = call(port, b"GET /metrics HTTP/1.0\r\n\r\n", 0.05)
+    results["metrics"] = call(port, b"GET /metrics HTTP/1.0\r\n\r\n")
+    results["get"] = call(port, b"GET /reset HTTP/1.0\r\n\r\n")
+    results["reset"] = call(port, b"POST /reset HTTP/1.0\r\nContent-Length: 0\r\n\r\n")
+
+
+async def check(server, results):
+    thread = threading.Thread(target=client, args=(server.port, results))
+    gaps = [0.0]
+    done = [False]
+
+    async def ticker():
+        last = host_time.perf_counter()
+        while not done[0]:
+            now = host_time.perf_counter()
+            gaps[0] = max(gaps[0], (now - last) * 1000)
+            last = now
+            await asyncio.sleep_ms(TICK_MS)
+
+    asyncio.create_task(server.run())
+    asyncio.create_task(ticker())
+    await asyncio.sleep_ms(0)
+    thread.start()
+    while thread.is_alive():
+        #   The clock of the simulation is virtual, the client runs in real time
+        host_time.sleep(0.001)
+        await asyncio.sleep_ms(TICK_MS)
+    done[0] = True
+    return gaps[0]
+
+
+def main(argv):
+    timeout = int(argv[1]) if len(argv) > 1 else 2000
+    metrics = Metrics()
+    metrics.add(SOLVE, 100)
+    server = MetricsServer(metrics, 0, timeout_ms=timeout)
+    server.start()
+    results = {}
+    gap = asyncio.run(check(server, results))
+    server.close()
+    for name in ("silent", "trickle", "metrics", "get", "reset"):
+        result = results.get(name)
+        print("%-8s %s" % (name, result[0] if result else "closed without an answer"))
+    print("Served: %d  Dropped: %d  Longest wait of the ticker: %.1f ms" % (server.served, server.dropped, gap))
+    ok = True
+    if results.get("silent") is not None or results.get("trickle") is not None or server.dropped != 2:
+        ok = False
+        print("FAIL: the slow connections were not closed")
+    if gap > MAX_GAP_MS:
+        ok = False
+        print("FAIL: the ticker waited %.1f ms for the server" % gap)
+    answer = results.get("metrics")
+    if answer is None or not answer[0].endswith("200 OK") or "timers" not in json.loads(answer[1]):
+        ok = False
+        print("FAIL: GET /metrics did not answer the metrics")
+    answer = results.get("get")
+    if answer is None or "405" not in answer[0]:
+        ok = False
+        print("FAIL: GET /reset was not refused")
+    answer = results.get("reset")
+    if answer is None or not answer[0].endswith("200 OK") or metrics.count[SOLVE] != 0:
+        ok = False
+        print("FAIL: POST /reset did not clear the metrics")
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
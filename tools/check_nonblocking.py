@@ -0,0 +1,86 @@
+"""
+Check that the calls to the server do not block the other uasyncio tasks (httpClient.py apipeline).
+
+Usage:
+    python tools/check_nonblocking.py [hold_s] [latency_s]
+
+Two network calls run next to a ticker task that wakes every TICK_MS:
+    * long-poll - the gettingNewGame request of the NoGame state (Codec.apost) against a stand-in server with
+      long-poll and no game, the server holds it hold_s seconds
+    * pump - EventQueue.pump of one dart against a stand-in server whose replies take latency_s seconds
+While each call waits the ticker must keep running: it must wake at least half as often as TICK_MS allows.
+"""
+
+# Import the libraries
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from hal import time, asyncio
+from wire import Codec
+from httpClient import HttpClient
+from eventQueue import EventQueue
+from pollScheduler import PollScheduler
+from standin_server import GameServer
+
+TICK_MS = 50
+
+
+#   Run the call next to the ticker, returns (ms the call took, ticks seen meanwhile, result of the call)
+async def measure(call):
+    ticks = [0]
+    done = [False]
+
+    async def ticker():
+        while not done[0]:
+            ticks[0] += 1
+            await asyncio.sleep_ms(TICK_MS)
+
+    asyncio.create_task(ticker())
+    await asyncio.sleep_ms(0)
+    start = time.ticks_ms()
+    result = await call
+    done[0] = True
+    return time.ticks_diff(time.ticks_ms(), start), ticks[0], result
+
+
+def check(name, elapsed, ticks, result):
+    expected = elapsed // TICK_MS
+    ok = ticks >= expected // 2 and expected > 0
+    print("%-10s %10d %8d %10d  %s" % (name, elapsed, ticks, expected, result))
+    return ok
+
+
+def main(argv):
+    hold = int(argv[1]) if len(argv) > 1 else 2
+    latency = float(argv[2]) if len(argv) > 2 else 0.5
+    ok = True
+    print("%-10s %10s %8s %10s  %s" % ("call", "ms", "ticks", "expected", "result"))
+
+    server = GameServer(game=False, long_poll=True).start()
+    poller = PollScheduler(wait=hold)
+    call = Codec().apost(HttpClient(), server.url, "gettingNewGame", [poller.request()],
+                         timeout=poller.timeout())
+    elapsed, ticks, reply = asyncio.run(measure(call))
+    server.stop()
+    ok = check("long-poll", elapsed, ticks, reply) and reply.get("longPoll") and ok
+
+    server = GameServer(latency=latency).start()
+    tmp = tempfile.TemporaryDirectory()
+    queue = EventQueue(HttpClient(), server.url, path=os.path.join(tmp.name, "outbox.log"))
+    queue.put({"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": 1, "dart_locationx": 1.0,
+               "dart_locationy": 2.0})
+    elapsed, ticks, acked = asyncio.run(measure(queue.pump()))
+    server.stop()
+    tmp.cleanup()
+    ok = check("pump", elapsed, ticks, "%d acknowledged" % acked) and acked == 1 and ok
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
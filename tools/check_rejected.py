@@ -0,0 +1,97 @@
+"""
+Check of the darts rejected by the server (eventQueue.py dead letters) against the stand-in server.
+
+Usage:
+    python tools/check_rejected.py [turns] [bad_probability] [seed]
+
+The given share of the darts is bad: the stand-in server answers {"success": false} to every request with
+one of them, without keeping any dart of the request. The board plays the given number of turns of 3 darts and a nextTurn through the
+queue and its sender task. Every nextTurn must get its reply: a rejected dart must not hold the events
+behind it. At the end no event is pending, every dart was either received by the server or set aside in the
+dead letter file (never both), and the darts of a rejected batch that were not bad were sent again one by one.
+"""
+
+# Import the libraries
+import os
+import sys
+import json
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from hal import time, asyncio
+from httpClient import HttpClient
+from eventQueue import EventQueue
+from standin_server import GameServer
+
+
+async def play(queue, turns, rnd):
+    sender = asyncio.create_task(queue.run())
+    expected = []
+    for turn in range(turns):
+        for dart in range(3):
+            event = {"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": turn + 1,
+                     "dart_locationx": round(rnd.uniform(-15, 15), 2),
+                     "dart_locationy": round(rnd.uniform(-15, 15), 2)}
+            expected.append(queue.put(event))
+            if rnd.random() < 0.5:
+                #   Half of the darts are queued together and sent in one batch
+                await asyncio.sleep_ms(rnd.randint(1, 200))
+        seq = queue.put({"action": "nextTurn", "game_id": 1, "player_id": 1, "game_turn": turn + 1})
+        reply = await queue.reply(seq, time.ticks_add(time.ticks_ms(), 60000))
+        if reply is None or "turn" not in reply:
+            print("FAIL: turn %d got %r" % (turn + 1, reply))
+            return None
+    return expected
+
+
+def main(argv):
+    turns = int(argv[1]) if len(argv) > 1 else 50
+    p = float(argv[2]) if len(argv) > 2 else 0.2
+    seed = int(argv[3]) if len(argv) > 3 else 3
+    hal.board.reset(seed=seed)
+    rnd = random.Random(seed)
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "outbox.log")
+    server = GameServer(turns=turns + 1, reject=p, seed=seed).start()
+    queue = EventQueue(HttpClient(timeout=1), server.url, path=path, backoff_ms=10, max_backoff_ms=200)
+    expected = asyncio.run(play(queue, turns, rnd))
+    server.stop()
+    if expected is None:
+        tmp.cleanup()
+        return 1
+    received = [dart["seq"] for dart in server.darts]
+    dead = []
+    if os.path.exists(path + ".dead"):
+        with open(path + ".dead") as f:
+            dead = [json.loads(line)["event"]["seq"] for line in f]
+    tmp.cleanup()
+    print("%d turns, %d darts, bad dart probability %.2f" % (turns, len(expected), p))
+    print("Requests: %d  Rejected requests: %d  Received: %d  Dead letters: %d  Pending: %d" % (
+        server.requests, server.rejected, len(received), len(dead), len(queue)))
+    ok = True
+    if len(queue):
+        ok = False
+        print("FAIL: %d events still pending" % len(queue))
+    if set(received) & set(dead):
+        ok = False
+        print("FAIL: darts both received and dead: %s" % sorted(set(received) & set(dead)))
+    if sorted(received + dead) != expected:
+        ok = False
+        print("FAIL: %d darts received or dead, expected %d" % (len(received) + len(dead), len(expected)))
+    bad = sorted(seq for (game_id, seq), is_bad in server._bad.items() if is_bad)
+    if dead != bad:
+        ok = False
+        print("FAIL: dead letters %s, bad darts %s" % (dead, bad))
+    if queue.rejected != len(dead):
+        ok = False
+        print("FAIL: %d darts counted as rejected, %d dead letters" % (queue.rejected, len(dead)))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,80 @@
+"""
+Check of the retry of a request on a reused connection (httpClient.py Reconnect) against the stand-in server.
+
+Usage:
+    python tools/check_retry.py [timeout_s]
+
+Two cases are sent on a connection that an earlier request left open:
+    * stale - the server closed the idle connection: the request must be sent again on a new connection and
+      succeed, the server gets it once
+    * slow  - the server takes longer than the timeout to answer: the request must fail after one timeout and
+      the server must get it once (a timeout is never sent again, the server may still be handling it)
+"""
+
+# Import the libraries
+import os
+import sys
+import json
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from httpClient import HttpClient
+from standin_server import GameServer
+
+BODY = json.dumps({"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": 1,
+                   "dart_locationx": 1.25, "dart_locationy": -3.5})
+
+
+def main(argv):
+    timeout = float(argv[1]) if len(argv) > 1 else 1.0
+    ok = True
+    print("%-6s %10s %10s %12s  %s" % ("case", "ms", "requests", "connections", "result"))
+
+    server = GameServer(idle=0.05).start()
+    client = HttpClient(timeout=timeout)
+    client.post(server.url, data=BODY)
+    host_time.sleep(0.2)
+    t0 = host_time.perf_counter()
+    try:
+        result = "status %d" % client.post(server.url, data=BODY).status_code
+    except OSError as e:
+        result = "OSError %r" % (e,)
+    elapsed = (host_time.perf_counter() - t0) * 1000
+    server.stop()
+    print("%-6s %10.1f %10d %12d  %s" % ("stale", elapsed, server.requests, server.connections, result))
+    if result != "status 200" or server.requests != 2 or server.connections != 2:
+        ok = False
+        print("FAIL: the request on the closed connection was not sent again once")
+
+    server = GameServer().start()
+    client = HttpClient(timeout=timeout)
+    client.post(server.url, data=BODY)
+    server.latency = 2 * timeout
+    t0 = host_time.perf_counter()
+    try:
+        result = "status %d" % client.post(server.url, data=BODY).status_code
+    except OSError as e:
+        result = "OSError %r" % (e,)
+    elapsed = (host_time.perf_counter() - t0) * 1000
+    requests = server.requests
+    server.latency = 0
+    server.stop()
+    print("%-6s %10.1f %10d %12d  %s" % ("slow", elapsed, requests, server.connections, result))
+    if not result.startswith("OSError"):
+        ok = False
+        print("FAIL: the slow request did not time out")
+    if requests != 2:
+        ok = False
+        print("FAIL: the server got the slow request %d times" % (requests - 1))
+    if elapsed > 1500 * timeout:
+        ok = False
+        print("FAIL: the slow request took %.1f ms, more than one timeout" % elapsed)
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,75 @@
+"""
+Check of the frame ring of the acquisition (acquisition.py) when the consumer stalls.
+
+Usage:
+    python tools/check_ring.py [steps] [seed]
+
+The producer runs the given number of steps on the empty simulated board without the consumer reading a frame
+(a state machine stuck in a network call), so the ring fills with QUICK frames and the next ones are dropped.
+A dart is thrown and the producer runs the same number of steps again, then a full scan is asked and the
+producer runs again. The consumer then reads the ring: the DART frame of the dart and the FULL frame must both
+be there, after the QUICK frames that were already waiting. The dart must be detected only once (the baseline
+of the producer is the board with the dart once its frame is in the ring).
+"""
+
+# Import the libraries
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager, QUICK, DART
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+from acquisition import Acquisition, FULL
+
+NAMES = {QUICK: "QUICK", DART: "DART", FULL: "FULL"}
+
+
+def main(argv):
+    steps = int(argv[1]) if len(argv) > 1 else 30
+    seed = int(argv[2]) if len(argv) > 2 else 5
+    board = hal.board
+    board.reset(seed=seed)
+    manager = UltraManager([UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS],
+                           Mux(*DEFAULT_MUX))
+    manager._verbose = False
+    acquisition = Acquisition(manager, threaded=False)
+    acquisition.rebase()
+    for _ in range(steps):
+        acquisition.step()
+    board.throw(5.0, 3.0)
+    for _ in range(steps):
+        acquisition.step()
+    held = getattr(acquisition, "held", 0)
+    acquisition.request_full()
+    for _ in range(steps):
+        acquisition.step()
+    ring = acquisition.ring
+    print("Ring: %d slots, %d waiting, %d dropped, held: %s" % (ring.slots, len(ring), ring.dropped,
+                                                                  NAMES.get(held, "none")))
+    kinds = []
+    for _ in range(4 * ring.slots):
+        kind = acquisition.poll()
+        if kind:
+            kinds.append(kind)
+            if kind == DART:
+                print("DART at %s" % (acquisition.location,))
+    print("Frames read: " + " ".join(NAMES[kind] for kind in kinds))
+    ok = True
+    if kinds.count(DART) != 1:
+        ok = False
+        print("FAIL: %d DART frames" % kinds.count(DART))
+    if FULL not in kinds or (DART in kinds and kinds.index(FULL) < kinds.index(DART)):
+        ok = False
+        print("FAIL: no FULL frame after the DART frame")
+    if ring.dropped == 0:
+        ok = False
+        print("FAIL: the ring was never full")
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
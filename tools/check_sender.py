@@ -0,0 +1,98 @@
+"""
+Check that the sender task of the queue (eventQueue.py run) survives the errors it can meet on the board.
+
+Usage:
+    python tools/check_sender.py [turns] [garbage_probability] [seed]
+
+The board plays the given number of turns of 3 darts and a nextTurn through the queue and its sender task,
+against a stand-in server that answers the given share of the requests with JSON that is not an object.
+In the middle of the game the ack file can not be written (a directory is in its way, like a full flash)
+for a few turns. Every nextTurn must get its reply, the sender task must still run at the end, nothing is
+pending, every dart reached the server and the failed writes were counted.
+"""
+
+# Import the libraries
+import os
+import sys
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from hal import time, asyncio
+from httpClient import HttpClient
+from eventQueue import EventQueue
+from standin_server import GameServer
+
+
+async def play(queue, turns, rnd, path):
+    sender = asyncio.create_task(queue.run())
+    expected = []
+    for turn in range(turns):
+        if turn == turns // 3:
+            if os.path.exists(path + ".ack"):
+                os.remove(path + ".ack")
+            os.mkdir(path + ".ack")
+        if turn == 2 * turns // 3:
+            os.rmdir(path + ".ack")
+        for dart in range(3):
+            expected.append(queue.put({"action": "sendDart", "game_id": 1, "player_id": 1, "game_turn": turn + 1,
+                                       "dart_locationx": round(rnd.uniform(-15, 15), 2),
+                                       "dart_locationy": round(rnd.uniform(-15, 15), 2)}))
+        seq = queue.put({"action": "nextTurn", "game_id": 1, "player_id": 1, "game_turn": turn + 1})
+        reply = await queue.reply(seq, time.ticks_add(time.ticks_ms(), 60000))
+        if reply is None or "turn" not in reply:
+            print("FAIL: turn %d got %r" % (turn + 1, reply))
+            return None, sender
+    return expected, sender
+
+
+def main(argv):
+    turns = int(argv[1]) if len(argv) > 1 else 30
+    p = float(argv[2]) if len(argv) > 2 else 0.2
+    seed = int(argv[3]) if len(argv) > 3 else 3
+    hal.board.reset(seed=seed)
+    rnd = random.Random(seed)
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "outbox.log")
+    server = GameServer(turns=turns + 1, garbage=p, seed=seed, binary=False).start()
+    queue = EventQueue(HttpClient(timeout=1), server.url, path=path, backoff_ms=10, max_backoff_ms=200)
+    expected, sender = asyncio.run(play(queue, turns, rnd, path))
+    server.stop()
+    if expected is None:
+        tmp.cleanup()
+        return 1
+    with open(path + ".ack") as f:
+        acked = int(f.read())
+    tmp.cleanup()
+    received = sorted(set(dart["seq"] for dart in server.darts))
+    print("%d turns, %d darts, garbage reply probability %.2f" % (turns, len(expected), p))
+    print("Requests: %d  Failed requests: %d  Flash errors: %d  Task errors: %d  Received: %d  Pending: %d" % (
+        server.requests, queue.failures, queue.flash_errors, queue.errors, len(received), len(queue)))
+    ok = True
+    if sender.finished:
+        ok = False
+        print("FAIL: the sender task ended with %r" % (sender.error,))
+    if len(queue):
+        ok = False
+        print("FAIL: %d events still pending" % len(queue))
+    if received != expected:
+        ok = False
+        print("FAIL: %d darts received, expected %d" % (len(received), len(expected)))
+    if p > 0 and queue.failures == 0:
+        ok = False
+        print("FAIL: no reply was counted as a failure")
+    if queue.flash_errors == 0:
+        ok = False
+        print("FAIL: no failed write of the ack file was counted")
+    if acked != queue._seq:
+        ok = False
+        print("FAIL: the ack file holds %d, the last event is %d" % (acked, queue._seq))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,105 @@
+"""
+Check of a turn of stacked darts (dartTurn.py STACKED) through the acquisition on the simulated board.
+
+Usage:
+    python tools/check_stacked.py [hold_ms] [seed]
+
+The darts of the turn stay on the board: every dart is waited for on the baseline of the board with the darts
+before it (Acquisition.rebase with the distances of the turn, located with UltraManager.get_new_location), like
+the GameDart state does. Before the last dart an object crosses the board for hold_ms (a hand, a dart that
+bounced out): the quick scan sees it, it is gone when the region of interest is scanned. Every dart must give
+one DART frame with its location, the object none.
+"""
+
+# Import the libraries
+import os
+import sys
+import math
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from hal import time
+from mux import Mux
+from ultraSensor import UltraSensor, UltraManager, DART
+from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+from acquisition import Acquisition
+from dartTurn import Turn, CLEAR, STACKED
+
+PLAN = ((CLEAR, 10000), (STACKED, 10000), (STACKED, 10000))
+DARTS = ((6.0, 4.0), (-7.0, 5.0), (2.0, -9.0))
+OBJECT = (-10.0, -6.0)
+MAX_ERROR = 3.0     #   cm
+
+
+#   Poll the acquisition until a DART frame or the deadline (ms of virtual time), returns the number of DART
+#   frames and of QUICK frames with a change
+def wait(acquisition, deadline, stop=True):
+    darts = 0
+    changes = 0
+    while time.ticks_diff(deadline, time.ticks_ms()) > 0:
+        kind = acquisition.poll()
+        if kind == DART:
+            darts += 1
+            if stop:
+                break
+        elif kind and acquisition.changed >= 0:
+            changes += 1
+    return darts, changes
+
+
+def main(argv):
+    hold = int(argv[1]) if len(argv) > 1 else 40
+    seed = int(argv[2]) if len(argv) > 2 else 5
+    board = hal.board
+    board.reset(seed=seed)
+    manager = UltraManager([UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS],
+                           Mux(*DEFAULT_MUX))
+    manager._verbose = False
+    acquisition = Acquisition(manager, threaded=False)
+    turn = Turn(len(DEFAULT_SENSORS), PLAN)
+    turn.start()
+    ok = True
+    alarms = 0
+    changes = 0
+    print("%-5s %-8s %16s %16s %8s" % ("dart", "baseline", "thrown", "found", "error"))
+    for k in range(len(PLAN)):
+        acquisition.rebase(turn.baseline())
+        wait(acquisition, time.ticks_add(time.ticks_ms(), 300), stop=False)
+        if k == len(PLAN) - 1:
+            #   The object is on the board for hold_ms from the start of the next quick scan
+            board.throw(*OBJECT)
+            board.at(time.ticks_ms() + hold, board.darts.remove, OBJECT)
+            alarms, changes = wait(acquisition, time.ticks_add(time.ticks_ms(), 3000), stop=False)
+        board.throw(*DARTS[k])
+        found, _ = wait(acquisition, time.ticks_add(time.ticks_ms(), turn.timeout()))
+        location = turn.record(acquisition.location, acquisition.distances) if found else \
+            turn.record(("None", "None"))
+        if isinstance(location[0], (int, float)):
+            error = math.hypot(location[0] - DARTS[k][0], location[1] - DARTS[k][1])
+            shown = "(%6.2f, %6.2f)" % location
+        else:
+            error = None
+            shown = "missed"
+        print("%-5d %-8s %16s %16s %8s" % (k + 1, "STACKED" if PLAN[k][0] == STACKED else "CLEAR",
+                                           "(%6.2f, %6.2f)" % DARTS[k], shown,
+                                           "-" if error is None else "%.2f" % error))
+        if error is None or error > MAX_ERROR:
+            ok = False
+            print("FAIL: dart %d was not located" % (k + 1))
+    print("Object on the board for %d ms: %d changes seen, %d DART frames" % (hold, changes, alarms))
+    if changes == 0:
+        ok = False
+        print("FAIL: the quick scan never saw the object")
+    if alarms:
+        ok = False
+        print("FAIL: the object gave %d DART frames" % alarms)
+    if not turn.over():
+        ok = False
+        print("FAIL: the turn is not over")
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,99 @@
+"""
+Fleet simulator: N virtual boards polling the local stand-in server for a game, to measure the load of
+idle boards on the server and how fast the boards see a new game.
+
+Usage:
+    python tools/fleet_sim.py [boards] [idle_s] [hold_s]
+
+Every board runs the NoGame polling of main.py (Codec, HttpClient, PollScheduler and the 1 second sleep of
+the main loop) in its own thread, in real time. The boards start within one second of each other. After
+idle_s seconds without a game the server opens one and the boards stop as soon as they see it.
+Three fleets are run:
+    * fixed     - the original loop: one request per second, server without long-poll
+    * backoff   - PollScheduler without long-poll: exponential backoff with full jitter
+    * long-poll - PollScheduler against a server that holds the requests up to hold_s seconds
+
+For each fleet it reports the requests per second of the whole fleet over the idle time and over its
+second half (steady state), and the time from the opening of the game until the boards saw it.
+"""
+
+# Import the libraries
+import os
+import sys
+import random
+import threading
+import time as host_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from wire import Codec
+from httpClient import HttpClient
+from pollScheduler import PollScheduler
+from standin_server import GameServer
+
+LOOP_MS = 1000      #   Sleep of the main loop after every state
+
+
+#   One virtual board, seen is the host time at which it saw the game
+def board(url, mode, hold, stop, seen, index):
+    host_time.sleep(random.random())
+    codec = Codec()
+    client = HttpClient(timeout=hold + 5)
+    poller = PollScheduler(wait=hold if mode == "long-poll" else 0)
+    while not stop.is_set():
+        try:
+            reply = codec.post(client, url, "gettingNewGame", [poller.request()], timeout=poller.timeout())
+            delay = poller.update(reply)
+            if reply.get("gameStatus"):
+                seen[index] = host_time.time()
+                break
+        except OSError:
+            delay = poller.failed()
+        if mode == "fixed":
+            delay = 0
+        stop.wait((delay + LOOP_MS) / 1000)
+    client.close()
+
+
+def run(mode, boards, idle, hold):
+    server = GameServer(game=False, long_poll=(mode == "long-poll")).start()
+    stop = threading.Event()
+    seen = [None] * boards
+    threads = [threading.Thread(target=board, args=(server.url, mode, hold, stop, seen, i), daemon=True)
+               for i in range(boards)]
+    for t in threads:
+        t.start()
+    host_time.sleep(idle / 2)
+    half = server.polls
+    host_time.sleep(idle / 2)
+    total = server.polls
+    opened = host_time.time()
+    server.open_game()
+    deadline = opened + 60
+    for t in threads:
+        t.join(max(0, deadline - host_time.time()))
+    stop.set()
+    server.stop()
+    latency = sorted((t - opened) for t in seen if t is not None)
+    return (total / idle, (total - half) / (idle / 2), latency, boards - len(latency))
+
+
+def main(argv):
+    boards = int(argv[1]) if len(argv) > 1 else 50
+    idle = float(argv[2]) if len(argv) > 2 else 40
+    hold = int(argv[3]) if len(argv) > 3 else 20
+    print("%d boards, %.0f s idle, long-poll hold %d s" % (boards, idle, hold))
+    print("%-10s %10s %12s %13s %13s %13s %7s" % ("fleet", "req/s", "steady req/s", "mean seen s",
+                                                  "p95 seen s", "max seen s", "missed"))
+    for mode in ("fixed", "backoff", "long-poll"):
+        rate, steady, latency, missed = run(mode, boards, idle, hold)
+        mean = sum(latency) / len(latency) if latency else 0
+        p95 = latency[int(len(latency) * 0.95)] if latency else 0
+        print("%-10s %10.2f %12.2f %13.2f %13.2f %13.2f %7d" % (mode, rate, steady, mean, p95,
+                                                                latency[-1] if latency else 0, missed))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
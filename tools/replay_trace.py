@@ -0,0 +1,258 @@
+"""
+Reader and replay driver of the scan traces recorded by scanTrace.py, on CPython.
+
+Usage:
+    python tools/replay_trace.py summary trace.bin.3 trace.bin.2 trace.bin.1 trace.bin
+    python tools/replay_trace.py manager trace.bin ...
+    python tools/replay_trace.py main trace.bin ...
+
+The trace files are given oldest first. The files are memory mapped and the records are read in place: the
+echo durations and the distances of a record are a memoryview of the mapping cast to 16 bit words, nothing is
+copied, so large archives are read at the speed of the page cache.
+    * summary - records, scans of every kind, pings, echo rate and mean distance of every sensor
+    * manager - every scan of the trace is run again by UltraManager on the simulated board, the echoes of
+      the pings come from the trace instead of the physics. The distances are compared with the recorded
+      ones (a different estimator, range gate or health limit shows up as mismatches)
+    * main - the state machine of main.py runs on the echoes of the trace against the local stand-in server
+      until the trace is over, the darts received by the server are printed
+"""
+
+# Import the libraries
+import os
+import sys
+import io
+import mmap
+import struct
+import tempfile
+import contextlib
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hal
+from simboard import SimStop
+from scanTrace import (MAGIC, VERSION, FILE_HEADER, RECORD, RECORD_SIZE, PINGS, SCAN, QUICK_SCAN, FULL_SCAN,
+                       SUBSET_SCAN)
+
+KINDS = {QUICK_SCAN: "quick", FULL_SCAN: "full", SUBSET_SCAN: "subset"}
+HEADER_SIZE = struct.calcsize(FILE_HEADER)
+
+
+#   Records of trace files read in place from memory maps
+class TraceReader:
+
+    def __init__(self, paths):
+        if sys.byteorder != "little":
+            raise ValueError("the records are read in place as little endian words")
+        self.paths = list(paths)
+        self.n = None
+
+    #   Records of every file: (type, sensor or kind, pings or n, echoes or changed + 1, ticks_us, words)
+    #   words is a memoryview of the mapping, valid until the next record is read
+    def records(self):
+        for path in self.paths:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+                    continue
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+            try:
+                magic, version, n, _ = struct.unpack_from(FILE_HEADER, view, 0)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError("%s is not a trace file" % path)
+                self.n = n
+                offset = HEADER_SIZE
+                end = len(view)
+                while offset + RECORD_SIZE <= end:
+                    kind, a, b, c, ticks = struct.unpack_from(RECORD, view, offset)
+                    offset += RECORD_SIZE
+                    count = c if kind == PINGS else b
+                    if offset + 2 * count > end:
+                        #   Torn last record (the board was reset during the write)
+                        break
+                    words = view[offset:offset + 2 * count].cast("H")
+                    try:
+                        yield kind, a, b, c, ticks, words
+                    finally:
+                        words.release()
+                    offset += 2 * count
+            finally:
+                view.release()
+                mm.close()
+
+
+#   Echoes of the PINGS records, served sensor by sensor to the simulated board (SimBoard.replay)
+#   A lost ping is replayed after the echoes of its reading (their order in the reading is not recorded)
+class Replay:
+
+    def __init__(self, records, n):
+        self._records = records
+        self._queues = [deque() for _ in range(n)]
+
+    #   Add the pings of a PINGS record to the queue of its sensor
+    def add(self, sensor, pings, words):
+        queue = self._queues[sensor]
+        queue.extend(words)
+        for _ in range(pings - len(words)):
+            queue.append(None)
+
+    def echo(self, index):
+        queue = self._queues[index]
+        while not queue:
+            if self._records is None:
+                return None
+            for record in self._records:
+                if record[0] == PINGS:
+                    self.add(record[1], record[2], record[5])
+                    break
+            else:
+                raise SimStop(hal.board.clock.ticks_ms())
+        return queue.popleft()
+
+    def clear(self):
+        for queue in self._queues:
+            queue.clear()
+
+
+def build_manager(n):
+    from mux import Mux
+    from ultraSensor import UltraSensor, UltraManager
+    from simboard import DEFAULT_SENSORS, DEFAULT_MUX
+    sensors = [UltraSensor(pin, x, y, 0, 0) for (pin, x, y) in DEFAULT_SENSORS[:n]]
+    manager = UltraManager(sensors, Mux(*DEFAULT_MUX))
+    manager._verbose = False
+    return manager
+
+
+def summary(reader):
+    scans = {}
+    pings = None
+    echoes = None
+    total = None
+    full = None
+    records = 0
+    first = last = None
+    for kind, a, b, c, ticks, words in reader.records():
+        if pings is None:
+            n = reader.n
+            pings, echoes, total, full = [0] * n, [0] * n, [0.0] * n, 0
+        records += 1
+        first = ticks if first is None else first
+        last = ticks
+        if kind == PINGS:
+            pings[a] += b
+            echoes[a] += c
+        elif kind == SCAN:
+            scans[a] = scans.get(a, 0) + 1
+            if a == FULL_SCAN:
+                full += 1
+                for i in range(b):
+                    total[i] += words[i] / 100
+    if not records:
+        print("no records")
+        return
+    print("records: %d  span: %.1f s" % (records, ((last - first) & 0xFFFFFFFF) / 1000000))
+    print("scans: " + "  ".join("%s %d" % (KINDS.get(k, k), scans[k]) for k in sorted(scans)))
+    print("%-7s %10s %10s %10s %14s" % ("sensor", "pings", "echoes", "echo %", "full mean cm"))
+    for i in range(len(pings)):
+        rate = 100.0 * echoes[i] / pings[i] if pings[i] else 0.0
+        mean = total[i] / full if full else 0.0
+        print("%-7d %10d %10d %10.1f %14.2f" % (i, pings[i], echoes[i], rate, mean))
+
+
+def replay_manager(reader):
+    board = hal.board
+    board.reset()
+    board.crosstalk = False
+    manager = None
+    replay = None
+    read = {}
+    counts = {}
+    worst = {}
+    mismatches = {}
+    for kind, a, b, c, ticks, words in reader.records():
+        if manager is None:
+            manager = build_manager(reader.n)
+            replay = Replay(None, reader.n)
+            board.replay = replay
+        if kind == PINGS:
+            replay.add(a, b, words)
+            read[a] = b
+            continue
+        if kind != SCAN:
+            continue
+        #   Run the same scan on the echoes of its readings
+        with contextlib.redirect_stdout(io.StringIO()):
+            if a == QUICK_SCAN:
+                if read:
+                    manager._quickPings = max(read.values())
+                distances = manager.quick_scan()
+            elif a == SUBSET_SCAN:
+                for i in range(len(manager._quick)):
+                    manager._quick[i] = words[i] / 100
+                precision = max(read.values()) if read else None
+                distances = manager.read_subset(sorted(read), precision)
+            else:
+                for i in read:
+                    manager._sensors[i]._iterations = read[i]
+                distances = manager.read_distances()
+        diff = 0.0
+        for i in range(b):
+            diff = max(diff, abs(distances[i] - words[i] / 100))
+        counts[a] = counts.get(a, 0) + 1
+        worst[a] = max(worst.get(a, 0.0), diff)
+        if diff > 0.01:
+            mismatches[a] = mismatches.get(a, 0) + 1
+        replay.clear()
+        read = {}
+    board.replay = None
+    board.crosstalk = True
+    print("%-8s %10s %12s %14s" % ("scan", "replayed", "mismatches", "max diff cm"))
+    for k in sorted(counts):
+        print("%-8s %10d %12d %14.2f" % (KINDS.get(k, k), counts[k], mismatches.get(k, 0), worst[k]))
+
+
+def replay_main(reader):
+    from standin_server import GameServer
+    board = hal.board
+    board.reset()
+    board.crosstalk = False
+    records = reader.records()
+    first = next(records, None)
+    if first is None:
+        print("no records")
+        return
+    replay = Replay(records, reader.n)
+    if first[0] == PINGS:
+        replay.add(first[1], first[2], first[5])
+    board.replay = replay
+    server = GameServer(turns=100).start()
+    import main as game
+    game.url = server.url
+    tmp = tempfile.TemporaryDirectory()
+    game.outbox = game.EventQueue(game.client, server.url, game.headers,
+                                  path=os.path.join(tmp.name, "outbox.log"), codec=game.codec)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            game.run()
+    except SimStop:
+        pass
+    server.stop()
+    tmp.cleanup()
+    print("Virtual time: %.1f s  Pings: %d" % (board.clock.ticks_ms() / 1000, board.pings))
+    print("Received:")
+    for dart in server.darts:
+        print("  (%s, %s)" % (dart["dart_locationx"], dart["dart_locationy"]))
+
+
+def main(argv):
+    if len(argv) < 3 or argv[1] not in ("summary", "manager", "main"):
+        print(__doc__)
+        return
+    reader = TraceReader(argv[2:])
+    {"summary": summary, "manager": replay_manager, "main": replay_main}[argv[1]](reader)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,118 @@
+"""
+Run the unmodified state machine of main.py on the simulated dartboard against the local stand-in server.
+
+Usage:
+    python tools/simrun.py [seconds] [noise_cm] [dropout] [trace]
+
+A simulated player watches the NeoPixel ring: it throws a dart at a random location a short time
+after the ring turns green (the board is waiting for a dart) and pulls the darts out a short time
+after the ring turns orange (the board is waiting to be cleared). The run stops after the given
+number of virtual seconds and prints the darts that the server received next to the darts thrown.
+With a trace path the scans are recorded (scanTrace.py) for tools/replay_trace.py.
+"""
+
+# Import the libraries
+import os
+import sys
+import time as host_time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+from simboard import SimStop
+from standin_server import GameServer
+from scanTrace import ScanTrace
+
+GREEN = (0, 64, 0)
+ORANGE = (64, 64, 0)
+
+
+#   Player that throws when the ring is green and pulls the darts out when the ring is orange
+class Player:
+
+    def __init__(self, board, throw_ms=2000, pull_ms=3000, radius=14, seed=7):
+        self.board = board
+        self.throw_ms = throw_ms
+        self.pull_ms = pull_ms
+        self.radius = radius
+        self.random = random.Random(seed)
+        self.thrown = []
+        self._color = None
+        board.on_neopixel = self.on_color
+
+    def on_color(self, color):
+        if color == self._color:
+            return
+        self._color = color
+        now = self.board.clock.ticks_ms()
+        if color == GREEN and not self.board.darts:
+            x = round(self.random.uniform(-self.radius, self.radius), 2)
+            y = round(self.random.uniform(-self.radius, self.radius), 2)
+            self.board.at(now + self.throw_ms, self.land, x, y)
+            self.thrown.append((now + self.throw_ms, x, y))
+        elif color == ORANGE and self.board.darts:
+            self.board.clear(at_ms=now + self.pull_ms)
+
+    #   The dart lands, if the ring already asks for a clear board it is pulled out like the others
+    def land(self, x, y):
+        self.board.throw(x, y)
+        if self._color == ORANGE:
+            self.board.clear(at_ms=self.board.clock.ticks_ms() + self.pull_ms)
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 120
+    board = hal.board
+    if len(argv) > 2:
+        board.noise_cm = float(argv[2])
+    if len(argv) > 3:
+        board.dropout = float(argv[3])
+    server = GameServer(turns=100).start()
+    player = Player(board)
+    board.stop(seconds * 1000)
+
+    import main as game
+    game.url = server.url
+    #   Keep the event log of the run out of the working directory
+    tmp = tempfile.TemporaryDirectory()
+    game.outbox = game.EventQueue(game.client, server.url, game.headers,
+                                  path=os.path.join(tmp.name, "outbox.log"), codec=game.codec)
+    #   Metrics on any free port of the host
+    game.metrics_server.port = 0
+    trace = None
+    if len(argv) > 4:
+        trace = ScanTrace(len(game.sensors), argv[4])
+        game.sensor_manager.set_trace(trace)
+    start = host_time.time()
+    try:
+        game.run()
+    except SimStop:
+        pass
+    wall = host_time.time() - start
+    if trace is not None:
+        trace.flush()
+    server.stop()
+    tmp.cleanup()
+
+    print("Virtual time: %.1f s  Wall time: %.2f s  Speed: %.1fx" % (seconds, wall, seconds / wall))
+    print("Pings: %d  Requests: %d  Connections: %d" % (board.pings, server.requests, server.connections))
+    if trace is not None:
+        print("Trace: %d records  %d bytes  %.1f bytes per ping" % (trace.records, trace.written,
+                                                                   trace.written / max(board.pings, 1)))
+    snapshot = game.registry.snapshot()
+    print("Metrics: " + "  ".join("%s n=%d p50=%dus p99=%dus" % (name, t["n"], t["p50_us"], t["p99_us"])
+                                  for name, t in snapshot["timers"].items() if t["n"]))
+    print("State ms: %s  Timeout rate: %s" % (snapshot["states"]["ms"], snapshot["sensors"]["timeout_rate"]))
+    game.metrics_server.close()
+    print("Thrown:")
+    for t, x, y in player.thrown:
+        print("  %8.1f s  (%6.2f, %6.2f)" % (t / 1000, x, y))
+    print("Received:")
+    for dart in server.darts:
+        print("  (%s, %s)" % (dart["dart_locationx"], dart["dart_locationy"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,276 @@
+"""
+Local stand-in for the game server (esp.php) so the board can be run against it on a Linux host.
+It answers the same JSON actions as the real server:
+    - gettingNewGame:   {"gameStatus": true, "game_id", "player_id", "game_turn"} while a game is open.
+                        With long_poll a request with "wait" is held up to that many seconds until a game
+                        is opened (open_game), and the reply says "longPoll": true
+    - sendDart:         {"success": true, "seq"}, the dart is kept in the darts list
+    - sendDarts:        {"success": true, "acks", "duplicates"}, the darts of the batch are kept in the list
+    - nextTurn:         {"turn": true} until the number of turns of the game has been played
+
+Events with a "seq" number (eventQueue.py) are processed once per (game_id, seq): a repeated event gets
+the reply of the first one (with "duplicate": true for a dart) and does not change the game.
+
+Requests in the binary frames of wire.py (content type wire.CONTENT_TYPE) are answered with binary frames,
+unless the server is created with binary=False to act like a server that only knows JSON.
+
+Faults can be injected to test the clients: a request can be dropped before it is processed, processed
+twice (a replayed packet), processed without a reply or processed and answered with JSON that is not an
+object (a broken proxy). A dropped request or reply closes the connection.
+A dart can also be bad: every sendDart or sendDarts request with it is answered {"success": false} without
+keeping any dart, like a server that does not accept it (a game that is over, a bad turn).
+
+The server speaks HTTP/1.1 with keep-alive, and https when it is given a certificate (see make_cert).
+
+Usage:
+    server = GameServer(turns=3)
+    server.start()
+    ... use server.url ...
+    server.stop()
+"""
+
+# Import the libraries
+import os
+import sys
+import ssl
+import json
+import random
+import socket
+import struct
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire
+
+
+#   Request handler, the game state lives in the GameServer object
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        #   The headers and the body are written separately, without TCP_NODELAY the body of a keep-alive
+        #   reply waits for the delayed ACK of the client
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        #   Idle keep-alive connections are closed without a word, like a real server does
+        if self.server.game.idle is not None:
+            self.connection.settimeout(self.server.game.idle)
+        with self.server.game._lock:
+            self.server.game.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        game = self.server.game
+        drop_request, replay, drop_reply, garbage = game.faults()
+        if drop_request:
+            self.close_connection = True
+            return
+        binary = game.binary and self.headers.get("Content-Type") == wire.CONTENT_TYPE
+        status, reply = game.handle(body, binary)
+        if replay:
+            game.handle(body, binary)
+        if drop_reply:
+            self.close_connection = True
+            return
+        if game.latency:
+            time.sleep(game.latency)
+        if garbage:
+            binary = False
+            reply = b'["not", "a", "reply"]'
+        self.send_response(status)
+        self.send_header("Content-Type", wire.CONTENT_TYPE if binary and status == 200 else "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+#   Game server stand-in
+class GameServer:
+
+    def __init__(self, host="127.0.0.1", port=0, turns=1, game=True, certfile=None, keyfile=None,
+                 idle=None, drop_request=0.0, replay=0.0, drop_reply=0.0, seed=1, binary=True,
+                 long_poll=False, max_wait=60, latency=0.0, reject=0.0, garbage=0.0):
+        self.turns = turns          #   Number of nextTurn answers that are true
+        self.game = game            #   If there is a game waiting for the board
+        self.game_id = 1
+        self.player_id = 1
+        self.darts = []             #   Darts received with sendDart
+        self.requests = 0           #   Number of requests received
+        self.connections = 0        #   Number of connections accepted
+        self.idle = idle            #   Seconds after which an idle connection is closed (None to keep it)
+        self.drop_request = drop_request    #   Probability that a request is dropped before it is processed
+        self.replay = replay                #   Probability that a request is processed twice
+        self.drop_reply = drop_reply        #   Probability that the reply of a processed request is dropped
+        self.reject = reject                #   Probability that a dart is bad and always rejected
+        self.garbage = garbage              #   Probability that the reply is JSON that is not an object
+        self.binary = binary        #   If the server answers the binary frames of wire.py
+        self.long_poll = long_poll  #   If the server holds the gettingNewGame requests
+        self.max_wait = max_wait    #   Maximum seconds a request is held
+        self.latency = latency      #   Seconds every reply is delayed (round trip of the WiFi)
+        self.polls = 0              #   Number of gettingNewGame requests
+        self.duplicates = 0         #   Number of repeated events that were not processed again
+        self.rejected = 0           #   Number of requests rejected because of a bad dart
+        self._random = random.Random(seed)
+        self._seen = {}             #   Reply of every event with a seq, by (game_id, seq)
+        self._bad = {}              #   If the dart is bad, by (game_id, seq)
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._opened = threading.Condition(self._lock)
+        self._stopping = False
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.game = self
+        self._tls = certfile is not None
+        if self._tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return "%s://%s:%d/esp.php" % ("https" if self._tls else "http", host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._opened.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    #   Open a new game, the held polls are answered at once
+    def open_game(self, turns=None):
+        with self._lock:
+            if turns is not None:
+                self.turns = turns
+            self.game = True
+            self.game_id += 1
+            self._turn = 0
+            self._opened.notify_all()
+
+    #   Faults of the next request: (drop the request, replay it, drop the reply, answer garbage)
+    def faults(self):
+        with self._lock:
+            r = self._random
+            return (r.random() < self.drop_request, r.random() < self.replay, r.random() < self.drop_reply,
+                    self.garbage > 0 and r.random() < self.garbage)
+
+    #   Answer one request body (a binary frame or JSON), returns the HTTP status and the reply body
+    def handle(self, body, binary=False):
+        try:
+            data = wire.decode_request(body) if binary else json.loads(body)
+        except (ValueError, KeyError, struct.error):
+            return 400, b'{"error": "bad request"}'
+        with self._lock:
+            self.requests += 1
+            reply = self.action(data)
+        if reply is None:
+            return 400, b'{"error": "unknown action"}'
+        if binary:
+            return 200, wire.encode_reply(data["action"], reply)
+        return 200, json.dumps(reply).encode()
+
+    #   Process one action and return the reply as a dict
+    def action(self, data):
+        action = data.get("action")
+        if action == "gettingNewGame":
+            self.polls += 1
+            wait = min(data.get("wait") or 0, self.max_wait) if self.long_poll else 0
+            if wait and not self.game and not self._stopping:
+                #   Called with the lock held, waiting releases it
+                self._opened.wait(wait)
+            reply = {"gameStatus": False}
+            if self.game:
+                reply = {"gameStatus": True, "game_id": self.game_id,
+                         "player_id": self.player_id, "game_turn": self._turn + 1}
+            if wait:
+                reply["longPoll"] = True
+            return reply
+        if action in ("sendDart", "sendDarts") and self.reject:
+            for dart in data.get("darts", [data]):
+                if self._is_bad(dart):
+                    self.rejected += 1
+                    return {"success": False, "error": "rejected"}
+        if action == "sendDart":
+            if self._dart(data):
+                self.duplicates += 1
+                return {"success": True, "seq": data["seq"], "duplicate": True}
+            if "seq" in data:
+                return {"success": True, "seq": data["seq"]}
+            return {"success": True}
+        if action == "sendDarts":
+            acks = []
+            duplicates = 0
+            for dart in data.get("darts", []):
+                if self._dart(dart):
+                    duplicates += 1
+                acks.append(dart.get("seq"))
+            self.duplicates += duplicates
+            return {"success": True, "acks": acks, "duplicates": duplicates}
+        if action == "nextTurn":
+            key = (data.get("game_id"), data.get("seq"))
+            if key[1] is not None and key in self._seen:
+                self.duplicates += 1
+                return self._seen[key]
+            self._turn += 1
+            if self._turn < self.turns:
+                reply = {"turn": True}
+            else:
+                self.game = False
+                reply = {"turn": False}
+            if key[1] is not None:
+                self._seen[key] = reply
+            return reply
+        return None
+
+    #   If the dart is bad, decided the first time it is seen (a dart that was kept is not bad)
+    def _is_bad(self, data):
+        key = (data.get("game_id"), data.get("seq"))
+        if key in self._seen:
+            return False
+        if key not in self._bad:
+            self._bad[key] = self._random.random() < self.reject
+        return self._bad[key]
+
+    #   Keep a dart unless its seq was already received, returns True for a repeated dart
+    def _dart(self, data):
+        key = (data.get("game_id"), data.get("seq"))
+        if key[1] is not None:
+            if key in self._seen:
+                return True
+            self._seen[key] = True
+        self.darts.append(data)
+        return False
+
+
+#   Create a self signed certificate for localhost with openssl, returns (certfile, keyfile)
+def make_cert(directory):
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost",
+                    "-keyout", keyfile, "-out", certfile],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+if __name__ == "__main__":
+    import sys
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    server = GameServer(port=port, turns=3)
+    print("Stand-in server on", server.url)
+    server._httpd.serve_forever()
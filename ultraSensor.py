@@ -12,13 +12,49 @@ Date: 2023-03-17
 """
 
 # Import the libraries
-from machine import Pin, time_pulse_us
-import time
-import uasyncio as asyncio
+from hal import Pin, time_pulse_us, time
 import math
+from array import array
 from mux import Mux
+from echoCapture import EchoCapture
+from gcPolicy import GcPolicy
+from sensorHealth import SensorHealth, spread
+from scanTrace import QUICK_SCAN, FULL_SCAN, SUBSET_SCAN
+import metrics
+import estimators
+import kernels
+from multilateration import Multilaterator
+from fingerprint import FingerprintIndex
 
 Sound_SPEED = 34300 #cm/s
+CM_PER_US = 340 / 20000 #   cm of distance per us of echo, same conversion as compute_distance
+NO_ECHO = 400.0 #   Distance returned when the sensor did not get enough echoes (out of range of the board)
+BURST_US = 500 #   Time between the trigger and the start of the echo pulse (8 cycles burst at 40 kHz)
+QUICK = 1 #   Frame of scan_stream: a quick scan
+DART = 2 #   Frame of scan_stream: a confirmed change with an object in range
+
+#   Running mean and variance of the echo durations (Welford), updated one ping at a time
+class RunningStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    #   Standard deviation of the values
+    def std(self):
+        if self.n < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.n - 1))
 
 # Create the class
 class UltraSensor:
@@ -35,37 +71,128 @@ class UltraSensor:
         self._Bval = _Bval
         self.distance = 0.0
         self._timeOut = 50000 #   Timeout in us for the echo pulse
+        self._period = 0 #   Time in us from one ping to the next (echo window and ring-down), 0 to fire after the echo
         self._sleep = 0.1 #   Sleep time in s between readings
         self._iterations = 100 #   Number of iterations to get the average distance
         self._perFail = 0.66 #   Percentage of failed readings to consider the sensor as failed
+        self._tolerance = 0 #   Tolerance in cm to stop sampling early, 0 to always use all the iterations
+        self._stopRule = "ci" #   "ci" stops on the 95% confidence interval of the mean, "spread" on the standard deviation
+        self._minPings = 5 #   Minimum number of pings before the sampling can stop
+        self._stats = RunningStats()
+        self.pings = 0 #   Number of pings used by the last reading
+        self._estimator = "trimmed" #   Estimator of the echo duration, one of estimators.ESTIMATORS
+        self._histogram = None
+        #   Preallocated store of the echo durations of the current reading
+        self._samples = array("l", [0] * self._iterations)
+        self._count = 0
+
+
+    #   This function will gate the echoes at range_cm: the timeout is the echo of an object at that distance
+    #   With pace the next ping also waits until the echo window and the ring-down of the previous one are over,
+    #   without it the next ping is fired as soon as the echo pin is low
+    def set_range(self, range_cm, ringdown_us=200, pace=False):
+        self._timeOut = int((range_cm - 1.5) / CM_PER_US) + 1
+        self._period = BURST_US + self._timeOut + ringdown_us if pace else 0
+
+    #   This function will fire one ping and return the duration of the echo in us, 0 if there was no echo
+    def ping(self):
+        #   The trigger is ignored until the echo pulse of the previous ping is over
+        kernels.wait_low(self._echo)
+        fired = time.ticks_us()
+        self._trig.value(0)
+        time.sleep_us(2)
+        self._trig.value(1)
+        time.sleep_us(10)
+        self._trig.value(0)
+        try:
+            #   Get the duration of the echo pulse
+            ultrason_duration = time_pulse_us(self._echo, 1, self._timeOut)
+        except OSError:
+            ultrason_duration = 0
+        #   Wait until the echo window is closed
+        if self._period:
+            wait = self._period - time.ticks_diff(time.ticks_us(), fired)
+            if wait > 0:
+                time.sleep_us(wait)
+        if ultrason_duration > 0:
+            return ultrason_duration
+        return 0
 
+    #   This function will return the sample store emptied, it is only reallocated if _iterations changed
+    def _store(self):
+        if len(self._samples) < self._iterations:
+            self._samples = array("l", [0] * self._iterations)
+        self._count = 0
+        return self._samples
 
     #   This function will read the distance from the sensor and return the distance in cm
     def read_distance(self):
-        distances = []
-        for i in range(self._iterations):
-            self._trig.value(0)
-            time.sleep_us(2)
-            self._trig.value(1)
-            time.sleep_us(10)
-            self._trig.value(0)
-            try:
-                #   Get the duration of the echo pulse
-                ultrason_duration = time_pulse_us(self._echo, 1, self._timeOut)
-            except OSError:
-                ultrason_duration = 0
+        if self._tolerance > 0:
+            distance, self.pings = self.read_distance_adaptive()
+            return distance
+        samples = self._store()
+        #   Fire the pings and store the echo durations in us (native kernel, see kernels.py)
+        self._count = kernels.ping_burst(self._trig, self._echo, samples, 0, self._iterations, self._timeOut,
+                                         self._period)
+        self.pings = self._iterations
+        return self.compute_distance()
+
+    #   This function will read the distance until the readings agree within the tolerance
+    #   It returns the distance in cm and the number of pings used, NO_ECHO if too many pings failed
+    def read_distance_adaptive(self, tolerance=None):
+        if tolerance is None:
+            tolerance = self._tolerance
+        samples = self._store()
+        self._stats.reset()
+        pings = 0
+        while pings < self._iterations:
+            pings += 1
+            ultrason_duration = self.ping()
             if ultrason_duration > 0:
-                #   cm = duration * speed of sound(cm/s) / 2 (round trip) / 10000 (us to s)
-                #distances.append(Sound_SPEED * ultrason_duration /2.0 / 1000000)
-                distances.append(ultrason_duration) #   In us
-            #time.sleep_us(50)
-        #   Remove the outliers
-        while len(distances) > 50:
-            #   Remove the lowest and highest values
-            distances.remove(min(distances))
-            distances.remove(max(distances))
-        # print(distances)
-        cm = sum(distances) / len(distances)
+                samples[self._count] = ultrason_duration
+                self._count += 1
+                self._stats.add(ultrason_duration)
+            state = self.check_stats(pings, tolerance)
+            if state == 1:
+                break
+            if state == 2:
+                self._count = 0
+                return (NO_ECHO, pings)
+        return (self.compute_distance(), pings)
+
+    #   This function will check the running statistics after a number of pings
+    #   It returns 0 to keep sampling, 1 if the readings are within the tolerance, 2 if too many pings failed
+    def check_stats(self, pings, tolerance=None):
+        if tolerance is None:
+            tolerance = self._tolerance
+        if pings < self._minPings:
+            return 0
+        stats = self._stats
+        if (pings - stats.n) / pings > self._perFail:
+            return 2
+        if stats.n < self._minPings:
+            return 0
+        spread = stats.std() * CM_PER_US
+        if self._stopRule == "ci":
+            spread = 1.96 * spread / math.sqrt(stats.n)
+        if spread <= tolerance:
+            return 1
+        return 0
+
+    #   This function will get the echo durations in us and return the distance in cm
+    #   Without a list it uses the durations in the sample store of the sensor
+    def compute_distance(self, distances=None):
+        if distances is None:
+            distances = self._samples
+            count = self._count
+        else:
+            count = len(distances)
+        if count == 0:
+            return NO_ECHO
+        #   Remove the outliers and average the rest (see estimators.py)
+        if self._estimator == "histogram" and self._histogram is None:
+            self._histogram = estimators.Histogram()
+        cm = estimators.estimate(self._estimator, distances, self._histogram, count)
         cm = (cm * 340 / 20000) + 1.5
         #   Return the average distance
         return round(cm, 2)
@@ -97,30 +224,373 @@ class UltraManager:
     def __init__(self, sensors, multi):
         self._sensors = sensors
         self._multi = multi
-        self._distances = []
+        #   Distances of the last scan, written in place by every scan
+        self._buffer = array("d", [0.0] * len(sensors))
+        self._distances = self._buffer
         self._sleep = 0.1
         self._iterations = 30
         self._perFail = 0.66
         self._timeOut = 50000
+        self._capture = None
+        self._pings = [0] * len(sensors) #   Number of pings used by each sensor in the last scan
+        self._verbose = False #   Print the distance of every sensor (the last distances are in metrics.registry)
+        self.gc = GcPolicy() #   Garbage collector policy and counters of the scans
+        self.health = SensorHealth(len(sensors)) #   Health of the sensors, the quarantined sensors are skipped
+        #   Location solver: "lsq" uses every sensor under _range cm, "pair" intersects the 2 closest sensors
+        self._solverMode = "lsq"
+        self._range = 30
+        self._solver = Multilaterator([sensor._location for sensor in sensors])
+        self.residual = 0.0 #   RMS residual in cm of the last location
+        self._fingerprints = None #   Fingerprint index used as starting point of the solver
+        self.set_range()
+        #   Quick presence scan: a few range gated pings per sensor compared with a baseline
+        self._quick = array("d", [NO_ECHO] * len(sensors)) #   Distances of the last quick scan
+        self.quick_scans = 0 #   Number of quick scans
+        self.set_quick()
+        #   Baseline model of every sensor: running mean and variance (EWMA) of the distances clamped to the
+        #   quick range, updated by every scan without a change
+        self._mean = array("d", [self._quickRange] * len(sensors))
+        self._var = array("d", [0.0] * len(sensors))
+        self._level = array("d", [self._quickRange] * len(sensors)) #   Clamped distances of the last tested scan
+        self.changed = -1 #   Sensor that changed the most in the last tested scan, -1 if none changed
+        self.set_model()
+        self.trace = None #   ScanTrace that records the echoes and the results of the scans, None to not record
+
+    #   Function to set the quick presence scan: pings per sensor, range in cm of the gate (echoes from further
+    #   away are not waited for) and change in cm against the baseline that counts as a change
+    def set_quick(self, pings=3, range_cm=30, threshold=2.0):
+        self._quickPings = pings
+        self._quickRange = range_cm
+        self._quickThreshold = threshold
+        self._quickTimeout = int((range_cm - 1.5) / CM_PER_US) + 1
+        self._quickCounts = bytearray(len(self._sensors))
+        #   Adjacent sensors are not pinged one after the other (also from one round to the next) so they do
+        #   not hear each other: the ring is walked with a step that is coprime with the number of sensors
+        n = len(self._sensors)
+        step = 1
+        for candidate in range(2, n - 1):
+            a, b = candidate, n
+            while b:
+                a, b = b, a % b
+            if a == 1:
+                step = candidate
+                break
+        self._quickOrder = [(k * step) % n for k in range(n)]
+
+    #   Function to gate every sensor at the furthest point of the board it can see: the opposite side of the ring
+    #   (the furthest other sensor) plus margin cm, see UltraSensor.set_range
+    #   The pings are not paced by default: the next ping is fired as soon as the echo pin of the previous one is
+    #   low (kernels.wait_low), which gives more usable pings per second than the pacing (tools/bench_range.py)
+    def set_range(self, margin=3.0, ringdown_us=200, pace=False):
+        for sensor in self._sensors:
+            x, y = sensor._location
+            far = 0.0
+            for other in self._sensors:
+                d = math.sqrt((other._location[0] - x) ** 2 + (other._location[1] - y) ** 2)
+                if d > far:
+                    far = d
+            sensor.set_range(far + margin, ringdown_us, pace)
+
+    #   Function to record the echoes and the results of every scan to a ScanTrace (scanTrace.py), None to stop
+    def set_trace(self, trace):
+        if self.trace is not None:
+            self.trace.flush()
+        self.trace = trace
+
+    #   Function to set the baseline model: weight of a new scan in the running mean and variance and number of
+    #   standard deviations a sensor has to move to count as a change (never less than the quick threshold)
+    def set_model(self, alpha=0.1, z=4.0):
+        self._alpha = alpha
+        self._z2 = z * z
 
-    #   Function to read all sensors and return a list of distances
+    #   Function to read the sensors in groups with the interrupt driven echo capture instead of one by one
+    #   spacing is the minimum distance on the ring between two sensors triggered together, 0 to turn it off
+    def set_capture(self, spacing=2, window=6000):
+        if spacing:
+            self._capture = EchoCapture(self._sensors, self._multi, spacing, window)
+        else:
+            self._capture = None
+
+    #   Function to stop the sampling of every sensor once the readings agree within tolerance cm, 0 to turn it off
+    def set_adaptive(self, tolerance, rule="ci", min_pings=5):
+        for sensor in self._sensors:
+            sensor._tolerance = tolerance
+            sensor._stopRule = rule
+            sensor._minPings = min_pings
+
+    #   Function to select the estimator of every sensor: "trim", "trimmed", "median" or "histogram"
+    def set_estimator(self, name):
+        if name not in estimators.ESTIMATORS:
+            raise ValueError(name)
+        for sensor in self._sensors:
+            sensor._estimator = name
+
+    #   Function to read all sensors and return the distances
+    #   The distances are written in place in the same array on every scan, copy it to keep a snapshot
     def read_distances(self):
-        distances = []
-        for i in range(len(self._sensors)):
-            self._multi.set_channel(i)
-            distance = self._sensors[i].read_distance()
-            distances.append(distance)
-            #   Print the distance
-            print("Sensor: ", i, " Distance: ", distance)
-            #   Sleep for the specified time
-            # time.sleep_us(50)
-            self._distances = distances
+        t0 = time.ticks_us()
+        distances = self._buffer
+        self.gc.begin_scan()
+        try:
+            if self._capture is not None:
+                #   All the sensors are sampled at the same time by the echo capture
+                self._capture.scan(self._sensors[0]._iterations)
+            for i in range(len(self._sensors)):
+                sensor = self._sensors[i]
+                #   A quarantined sensor is skipped, or read with a few pings when it is time to probe it
+                precision = None
+                if self.health.quarantined(i):
+                    if not self.health.probe_due(i):
+                        distances[i] = NO_ECHO
+                        self._pings[i] = 0
+                        continue
+                    precision = self.health.probe_pings
+                if self._capture is not None:
+                    distance = sensor.compute_distance()
+                    metrics.registry.sensor(i, sensor.pings, sensor._count, 0, distance)
+                else:
+                    distance = self._read_sensor(i, precision)
+                distances[i] = self._check_health(i, distance)
+                self._pings[i] = sensor.pings
+                if self.trace is not None:
+                    self.trace.pings(i, sensor.pings, sensor._samples, sensor._count)
+                #   Print the distance
+                if self._verbose:
+                    print("Sensor: ", i, " Distance: ", distance)
+                #   Sleep for the specified time
+                # time.sleep_us(50)
+        finally:
+            self.gc.end_scan()
+        self._distances = distances
+        #   Update the baseline model if nothing changed
+        if self.test_baseline(distances) < 0:
+            self.update_baseline()
+        if self.trace is not None:
+            self.trace.scan(FULL_SCAN, distances, self.changed)
+        metrics.registry.since_us(metrics.FULL_SCAN, t0)
         return distances
     
+    #   Function to read only the sensors in indices with precision pings each (the iterations of the sensor if None)
+    #   The other sensors keep the distances of the last quick scan, the distances are returned like read_distances
+    def read_subset(self, indices, precision=None):
+        t0 = time.ticks_us()
+        distances = self._buffer
+        quick = self._quick
+        for i in range(len(distances)):
+            distances[i] = quick[i]
+            self._pings[i] = 0
+        self.gc.begin_scan()
+        try:
+            for i in indices:
+                if self.health.quarantined(i):
+                    continue
+                sensor = self._sensors[i]
+                distance = self._check_health(i, self._read_sensor(i, precision))
+                distances[i] = distance
+                self._pings[i] = sensor.pings
+                if self.trace is not None:
+                    self.trace.pings(i, sensor.pings, sensor._samples, sensor._count)
+                if self._verbose:
+                    print("Sensor: ", i, " Distance: ", distance)
+        finally:
+            self.gc.end_scan()
+        self._distances = distances
+        if self.test_baseline(distances) < 0:
+            self.update_baseline()
+        if self.trace is not None:
+            self.trace.scan(SUBSET_SCAN, distances, self.changed)
+        metrics.registry.since_us(metrics.SUBSET_SCAN, t0)
+        return distances
+
+    #   Function to read the sensor i with precision pings (the iterations of the sensor if None)
+    def _read_sensor(self, i, precision=None):
+        sensor = self._sensors[i]
+        iterations = sensor._iterations
+        if precision is not None:
+            sensor._iterations = precision
+        t0 = time.ticks_us()
+        try:
+            self._multi.set_channel(i)
+            distance = sensor.read_distance()
+        finally:
+            sensor._iterations = iterations
+        metrics.registry.sensor(i, sensor.pings, sensor._count, time.ticks_diff(time.ticks_us(), t0), distance)
+        return distance
+
+    #   Function to update the health of the sensor i with its last reading, NO_ECHO if the sensor is quarantined
+    def _check_health(self, i, distance):
+        sensor = self._sensors[i]
+        spread_cm = spread(sensor._samples, sensor._count) * CM_PER_US
+        if self.health.update(i, sensor.pings, sensor._count, distance, spread_cm):
+            return distance
+        return NO_ECHO
+
+    #   Function to get the sensors to read again after a change on the sensor index: the sensor itself and its
+    #   neighbours on the ring that see something in range in the last quick scan
+    def get_subset(self, index):
+        n = len(self._sensors)
+        subset = [index]
+        for i in ((index - 1) % n, (index + 1) % n):
+            if i != index and self._quick[i] < self._quickRange:
+                subset.append(i)
+        return subset
+
+    #   Function to run a quick presence scan: a few range gated pings of every sensor, the median of each sensor
+    #   in cm (NO_ECHO if nothing is in range) is written to the quick distances, which are returned
+    def quick_scan(self):
+        t0 = time.ticks_us()
+        quick = self._quick
+        counts = self._quickCounts
+        timeout = self._quickTimeout
+        sensors = self._sensors
+        for i in range(len(sensors)):
+            counts[i] = 0
+        #   One ping of every sensor per round, so the echo of a sensor out of range has time to end
+        #   The echo durations go to the sample store of each sensor
+        mask = self.health.mask
+        for k in range(self._quickPings):
+            for i in self._quickOrder:
+                if not mask[i]:
+                    continue
+                sensor = sensors[i]
+                self._multi.set_channel(i)
+                counts[i] = kernels.ping_burst(sensor._trig, sensor._echo, sensor._samples, counts[i], 1, timeout)
+        #   Median of all the pings, the pings without an echo count as out of range: a single crosstalk
+        #   ghost among pings without an echo is not taken as an object
+        half = self._quickPings // 2
+        trace = self.trace
+        registry = metrics.registry
+        for i in range(len(sensors)):
+            if counts[i] <= half:
+                quick[i] = NO_ECHO
+            else:
+                quick[i] = estimators.median(sensors[i]._samples, counts[i]) * CM_PER_US + 1.5
+            if mask[i]:
+                registry.sensor(i, self._quickPings, counts[i])
+                if trace is not None:
+                    trace.pings(i, self._quickPings, sensors[i]._samples, counts[i])
+        if trace is not None:
+            trace.scan(QUICK_SCAN, quick)
+        self.quick_scans += 1
+        registry.since_us(metrics.QUICK_SCAN, t0)
+        return quick
+
+    #   Function to restart the baseline model from the given distances, or from a quick scan if none are given
+    def set_baseline(self, distances=None):
+        if distances is None:
+            distances = self.quick_scan()
+        limit = self._quickRange
+        for i in range(len(distances)):
+            self._mean[i] = min(distances[i], limit)
+            self._var[i] = 0.0
+        self.changed = -1
+        return self._mean
+
+    #   Function to test the distances of a scan against the baseline model, constant time per sensor: a sensor
+    #   changed if it moved more than the quick threshold and more than z standard deviations from its mean
+    #   Returns the index of the sensor that changed the most, -1 if nothing changed
+    def test_baseline(self, distances):
+        mean = self._mean
+        var = self._var
+        level = self._level
+        limit = self._quickRange
+        threshold2 = self._quickThreshold * self._quickThreshold
+        z2 = self._z2
+        index = -1
+        biggest = 0.0
+        for i in range(len(distances)):
+            x = distances[i]
+            if x > limit:
+                x = limit
+            level[i] = x
+            d2 = (x - mean[i]) * (x - mean[i])
+            if d2 > threshold2 and d2 > z2 * var[i] and d2 > biggest:
+                biggest = d2
+                index = i
+        self.changed = index
+        return index
+
+    #   Function to add the last tested scan to the running mean and variance of every sensor
+    def update_baseline(self):
+        mean = self._mean
+        var = self._var
+        level = self._level
+        alpha = self._alpha
+        for i in range(len(level)):
+            d = level[i] - mean[i]
+            mean[i] += alpha * d
+            var[i] = (1 - alpha) * (var[i] + alpha * d * d)
+
+    #   Function to run a quick scan and test it against the baseline model, the model is updated if nothing changed
+    #   Returns the index of the sensor that changed the most, -1 if nothing changed
+    def quick_changed(self):
+        index = self.test_baseline(self.quick_scan())
+        if index < 0:
+            self.update_baseline()
+        return index
+
+    #   Function to check with a quick scan that the board did not change during a full scan
+    #   Returns False if a sensor that sees something in range now disagrees with the distances
+    def quick_matches(self, distances):
+        quick = self.quick_scan()
+        for i in range(len(quick)):
+            if quick[i] < self._quickRange or distances[i] < self._quickRange:
+                if abs(quick[i] - distances[i]) > self._quickThreshold:
+                    return False
+        return True
+
+    #   Function to check with a quick scan if something is in range of any sensor
+    def quick_present(self):
+        quick = self.quick_scan()
+        for i in range(len(quick)):
+            if quick[i] < self._quickRange:
+                return True
+        return False
+
+    #   Generator of the two tier detection, every frame is (kind, index, distances):
+    #       * QUICK - a quick scan: the sensor that changed against the baseline model (-1 if none) and the quick
+    #         distances
+    #       * DART - a change confirmed by the region of interest scan and a quick scan after it, with an object in
+    #         range: the sensor that changed and the distances of the region of interest scan
+    #   A change that the region of interest scan does not see any more (an object that crossed the board) is a
+    #   false alarm, the model takes the scan. A change without an object in range (a dart pulled out) becomes the
+    #   baseline and is not sent. With darts already on the board, only a sensor that changed and now sees an
+    #   object in range makes a DART. After a DART frame the caller solves the location (the manager keeps the scan
+    #   and the baseline before the dart) and sets the baseline of the next change. The quick scan that confirms a
+    #   change is also the next detection scan, so no scan of the board is run twice. The distances are the buffers
+    #   of the manager, copy them to keep them
+    def scan_stream(self):
+        confirmed = False
+        while True:
+            if confirmed:
+                quick = self._quick
+                confirmed = False
+            else:
+                quick = self.quick_scan()
+            index = self.test_baseline(quick)
+            if index < 0:
+                self.update_baseline()
+            yield QUICK, index, quick
+            if index < 0:
+                continue
+            #   Region of interest scan, discarded if the board changed while it ran
+            distances = self.read_subset(self.get_subset(index))
+            confirmed = True
+            if not self.quick_matches(distances) or self.changed < 0:
+                continue
+            if distances[self.changed] < self._quickRange:
+                yield DART, index, distances
+            else:
+                #   The change was not a dart: take the board as it is now as the baseline
+                self.set_baseline(distances)
+
     #   Function to get the 2 adjacent sensors to the closest object
     def get_adjacent_sensors(self):
         #   Get the index of the sensor with the smallest distance
-        index = self._distances.index(min(self._distances))
+        index = 0
+        for i in range(1, len(self._distances)):
+            if self._distances[i] < self._distances[index]:
+                index = i
         #   Check one sensor to the left and one to the right and pick the one with the smallest distance
         if index == 0:
             #   If the index is 0, then the sensor to the left is the last sensor
@@ -179,123 +649,99 @@ class UltraManager:
                     return left, index
                 return index, right
     
+    #   Function to select the location solver, "lsq" or "pair"
+    def set_solver(self, mode, range_cm=30):
+        if mode not in ("lsq", "pair"):
+            raise ValueError(mode)
+        self._solverMode = mode
+        self._range = range_cm
+
+    #   Function to load the fingerprint index built by tools/make_fingerprints.py, returns True if it was loaded
+    def load_fingerprints(self, path="fingerprints.bin"):
+        index = FingerprintIndex.load(path)
+        if index is not None and index.sensors != len(self._sensors):
+            index = None
+        self._fingerprints = index
+        return index is not None
+
     #   Function to get the location of the closest object given the index of the sensor
     def get_location_index(self, index, distance1, distance2):
+        if self._solverMode == "lsq":
+            #   Use the sensors that changed between the two lists and see something in range
+            indices = [index]
+            for i in range(len(distance1)):
+                if i != index and abs(distance1[i] - distance2[i]) >= 1 and self._distances[i] < self._range:
+                    indices.append(i)
+            return self.solve_lsq(indices)
         #   Get the 2 adjacent sensors to the closest object
         left, right = self.get_adjacent_sensors_index(index, distance1, distance2)
-        #   Check if the 2 sensors are the same
-        if left == right:
-            #   Get the x and y coordinates from the sensor
-            x1, y1 = self._sensors[left]._location
-            #   Get the distance from the sensor
-            r1 = self._distances[left]
-            #   Calculate the distance from the center (0, 0) and the sensor
-            d = math.sqrt(x1**2 + y1**2)
-            #   Get second radius
-            r2 = d - r1
-            # Calculate the intersection points of the two circles
-            a = (r1**2 - r2**2 + d**2) / (2*d)
-            h = 0
-            x3 = x1 + a*(0 - x1)/d
-            y3 = y1 + a*(0 - y1)/d
-            return (x3, y3)
-        else:
-            #   Get the x and y coordinates from the sensors
-            x1, y1 = self._sensors[left]._location
-            x2, y2 = self._sensors[right]._location
-            #   Get the distance from the sensors
-            r1 = self._distances[left]
-            r2 = self._distances[right]
-            # Calculate the distance between the centers of the two circles
-            d = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-            
+        return self.solve_pair(left, right)
 
-            # Check if the two circles overlap or are disjoint
-            if d > r1 + r2:
-                return ("None", "None")
-            elif d < abs(r1 - r2):
-                return ("None", "None")
-
-            # Calculate the intersection points of the two circles
-            a = (r1**2 - r2**2 + d**2) / (2*d)
-            h = math.sqrt(r1**2 - a**2)
-            x3 = x1 + a*(x2 - x1)/d
-            y3 = y1 + a*(y2 - y1)/d
-            #   Circle Intersections
-            rX1 = x3 + h*(y2 - y1)/d
-            rY1 = y3 - h*(x2 - x1)/d
-            rX2 = x3 - h*(y2 - y1)/d
-            rY2 = y3 + h*(x2 - x1)/d
-
-            #   Check which point is inside the board and return it
-            if self.is_inside_board(rX1, rY1):
-                return (rX1, rY1)
-            else:
-                return (rX2, rY2)
-            
-        
     #   Function to get the location of the closest object
     def get_location(self):
+        if self._solverMode == "lsq":
+            return self.solve_lsq(None)
         #   Get the 2 adjacent sensors to the closest object
         left, right = self.get_adjacent_sensors()
-        #   Check if the 2 sensors are the same
-        if left == right:
-            #   Get the x and y coordinates from the sensor
-            x1, y1 = self._sensors[left]._location
-            #   Get the distance from the sensor
-            r1 = self._distances[left]
-            #   Calculate the distance from the center (0, 0) and the sensor
-            d = math.sqrt(x1**2 + y1**2)
-            #   Get second radius
-            r2 = d - r1
-            # Calculate the intersection points of the two circles
-            a = (r1**2 - r2**2 + d**2) / (2*d)
-            h = 0
-            x3 = x1 + a*(0 - x1)/d
-            y3 = y1 + a*(0 - y1)/d
-            #   Circle Intersections
-            rX1 = x3 + h*(0 - y1)/d
-            rY1 = y3 - h*(0 - x1)/d
-            rX2 = x3 - h*(0 - y1)/d
-            rY2 = y3 + h*(0 - x1)/d
-            #   Check which point is inside the board and return it
-            if self.is_inside_board(rX1, rY1):
-                return (rX1, rY1)
-            else:
-                return (rX2, rY2)
-        else:
-            #   Get the x and y coordinates from the sensors
-            x1, y1 = self._sensors[left]._location
-            x2, y2 = self._sensors[right]._location
-            #   Get the distance from the sensors
-            r1 = self._distances[left]
-            r2 = self._distances[right]
-            # Calculate the distance between the centers of the two circles
-            d = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-            
+        return self.solve_pair(left, right)
+
+    #   Function to get the location and the RMS residual in cm from the sensors in indices
+    #   (every sensor under the range if indices is None, or the closest sensor if none is), None if no sensor is given
+    #   With the fingerprint index the whole scan is matched first and the solver only polishes that location
+    def locate(self, indices=None):
+        t0 = time.ticks_us()
+        start = None
+        if indices is None:
+            indices = [i for i in range(len(self._sensors)) if self._distances[i] < self._range]
+            if not indices:
+                closest = 0
+                for i in range(1, len(self._distances)):
+                    if self._distances[i] < self._distances[closest]:
+                        closest = i
+                indices = [closest]
+            if self._fingerprints is not None:
+                #   The quarantined sensors are left out of the match
+                mask = self.health.mask if self.health.degraded() else None
+                start = self._fingerprints.lookup(self._distances, mask)
+                #   An ambiguous match or a start off the board is left to the linear start of the solver
+                if start is not None and not self.is_inside_board(start[0], start[1]):
+                    start = None
+        result = self._solver.solve(indices, self._distances, self.is_inside_board, start)
+        if start is not None and (result is None or not self.is_inside_board(result[0], result[1])):
+            #   The refinement of the match left the board, solve again without it
+            result = self._solver.solve(indices, self._distances, self.is_inside_board)
+        metrics.registry.since_us(metrics.SOLVE, t0)
+        return result
 
-            # Check if the two circles overlap or are disjoint
-            if d > r1 + r2:
-                return ("None", "None")
-            elif d < abs(r1 - r2):
-                return ("None", "None")
-
-            # Calculate the intersection points of the two circles
-            a = (r1**2 - r2**2 + d**2) / (2*d)
-            h = math.sqrt(r1**2 - a**2)
-            x3 = x1 + a*(x2 - x1)/d
-            y3 = y1 + a*(y2 - y1)/d
-            #   Circle Intersections
-            rX1 = x3 + h*(y2 - y1)/d
-            rY1 = y3 - h*(x2 - x1)/d
-            rX2 = x3 - h*(y2 - y1)/d
-            rY2 = y3 + h*(x2 - x1)/d
+    #   Function to get the location with the least squares solver, keeps the residual in self.residual
+    def solve_lsq(self, indices):
+        result = self.locate(indices)
+        if result is None:
+            return ("None", "None")
+        self.residual = result[2]
+        return (result[0], result[1])
 
+    #   Function to get the location of the object seen by two sensors (or one sensor if left == right)
+    def solve_pair(self, left, right):
+        #   Get the x and y coordinates from the sensor
+        x1, y1 = self._sensors[left]._location
+        #   Get the distance from the sensor
+        r1 = self._distances[left]
+        #   Check if the 2 sensors are the same
+        if left == right:
+            #   The object is on the line from the sensor to the center of the board
+            return kernels.center_point(x1, y1, r1)
+        x2, y2 = self._sensors[right]._location
+        r2 = self._distances[right]
+        #   Calculate the intersection points of the two circles
+        points = kernels.circle_intersection(x1, y1, r1, x2, y2, r2)
+        if points is None:
+            return ("None", "None")
         #   Check which point is inside the board and return it
-        if self.is_inside_board(rX1, rY1):
-            return (rX1, rY1)
+        if self.is_inside_board(points[0], points[1]):
+            return (points[0], points[1])
         else:
-            return (rX2, rY2)
+            return (points[2], points[3])
         
     #   Function to check if a point is inside the board
     def is_inside_board(self, x, y):
@@ -305,38 +751,9 @@ class UltraManager:
         else:
             return False
         
-    #   Function that will get two lists of distances and check if they are the same within a certain threshold
-    def check_same(self, dList1, dList2):
-        #   Check if the values are the same within a certain threshold (1 cm)
-        for i in range(len(dList1)):
-            if abs(dList1[i] - dList2[i]) > 1:
-                #   if the values are more than 30 cm ignore them
-                if dList1[i] > 30 or dList2[i] > 30:
-                    continue
-                else:
-                    #   If the values are not the same, return False
-                    return False
-        return True
-    
-    #   Function that will get two lists of distances 
-    #   The first list will be the state of the sensors before a new dart is thrown
-    #   The second list will be the state of the sensors after a new dart is thrown
-    #   The function will return the location of the dart
-    def get_dart_location(self, dList1, dList2):
-        #   Check which dart has the biggiest change in distance compared to the previous state
-        biggest_change = 1
-        biggest_change_index = 0
-        for i in range(len(dList1)):
-            if abs(dList1[i] - dList2[i]) > biggest_change:
-                if dList1[i] > 20 or dList2[i] > 20:
-                    continue
-                biggest_change = abs(dList1[i] - dList2[i])
-                biggest_change_index = i
-        #   Set that list into the distances list
-        self._distances = dList2
-        #   Get the location of the dart
-        (x, y) = self.get_location_index(biggest_change_index, dList1, dList2)
-        #   Return the location of the dart
-        return (x, y)
-
-        
+    #   Function to get the location of a new dart from the last full scan and the baseline model (the board before
+    #   the dart): the sensor that changed the most is the closest to the new dart
+    def get_new_location(self):
+        if self.changed < 0:
+            return ("None", "None")
+        return self.get_location_index(self.changed, self._mean, self._level)
@@ -0,0 +1,210 @@
+"""
+This module contains the wire format of the requests to the game server: JSON (the original format) or a
+compact binary frame of fixed layout struct records, chosen by content negotiation.
+
+Binary frame (little endian), content type CONTENT_TYPE:
+    * header (struct FRAME): version, action code, number of records
+    * gettingNewGame (1) - one POLL record: seconds the server may hold the request (long-poll)
+    * sendDart (2) - one DART record per dart, several darts in one frame:
+      seq, game_id, player_id, game_turn, x and y in 1/100 cm (NO_LOCATION if the dart was not found),
+      segment, multiplier, points
+    * nextTurn (3) - one TURN record: seq, game_id, player_id, game_turn
+
+Binary replies use the same header and action code:
+    * gettingNewGame - NEW_GAME record: flags (1 gameStatus, 2 longPoll), game_id, player_id, game_turn
+    * sendDart - DARTS_REPLY record (success, duplicates) followed by one ACK record (seq) per dart
+    * nextTurn - TURN_REPLY record: turn, duplicate
+
+The requests are encoded into a preallocated buffer and the replies are decoded into the same dicts as the
+JSON replies, so the callers do not depend on the format. A server that answers a binary request with
+anything else than a binary reply does not know the format: the codec switches to JSON and the request
+is sent again.
+"""
+
+# Import the libraries
+import struct
+from hal import ujson
+
+CONTENT_TYPE = "application/x-point-detector"
+VERSION = 1
+ACTIONS = {"gettingNewGame": 1, "sendDart": 2, "sendDarts": 2, "nextTurn": 3}
+NAMES = {1: "gettingNewGame", 2: "sendDarts", 3: "nextTurn"}
+FRAME = "<BBH"
+DART = "<IIHHhhBBH"
+TURN = "<IIHH"
+POLL = "<H"
+NEW_GAME = "<BIHH"
+DARTS_REPLY = "<BH"
+ACK = "<I"
+TURN_REPLY = "<BB"
+FRAME_SIZE = struct.calcsize(FRAME)
+DART_SIZE = struct.calcsize(DART)
+TURN_SIZE = struct.calcsize(TURN)
+NO_LOCATION = -32768
+MAX_DARTS = 16      #   Maximum number of darts in one frame (size of the preallocated buffer)
+
+
+#   Location in 1/100 cm, NO_LOCATION for a dart that was not found
+def _centi(value):
+    if not isinstance(value, (int, float)):
+        return NO_LOCATION
+    return max(-32767, min(32767, int(round(value * 100))))
+
+
+def _location(value):
+    return None if value == NO_LOCATION else value / 100
+
+
+#   Codec class
+class Codec:
+    """
+    This class encodes the requests and decodes the replies in the negotiated format
+
+    Attributes:
+        *   binary - True while the server answers binary frames, False to send JSON
+        *   fallbacks - number of times the server did not answer in binary
+    """
+
+    def __init__(self, binary=True):
+        self.binary = binary
+        self.fallbacks = 0
+        self._buffer = bytearray(FRAME_SIZE + MAX_DARTS * DART_SIZE)
+        self._headers = {}
+        self._base = None
+
+    #   Headers of a request: the given headers and the content type of the format
+    def headers(self, headers=None):
+        if self._base is not headers or self._headers.get("Content-Type") != self.content_type:
+            self._base = headers
+            self._headers = dict(headers or {})
+            self._headers["Content-Type"] = self.content_type
+            if self.binary:
+                self._headers["Accept"] = CONTENT_TYPE + ", application/json"
+            else:
+                self._headers.pop("Accept", None)
+        return self._headers
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPE if self.binary else "application/json"
+
+    #   Body of a request for an action and its events (dicts like the JSON requests)
+    def encode(self, action, events):
+        if not self.binary:
+            if action == "sendDarts":
+                if len(events) > 1:
+                    return ujson.dumps({"action": "sendDarts", "darts": events})
+                return ujson.dumps(events[0])
+            if events:
+                return ujson.dumps(events[0])
+            return ujson.dumps({"action": action})
+        code = ACTIONS[action]
+        buf = self._buffer
+        size = FRAME_SIZE
+        if code == 2:
+            for event in events:
+                struct.pack_into(DART, buf, size, event.get("seq", 0), int(event["game_id"]),
+                                 int(event["player_id"]), int(event["game_turn"]),
+                                 _centi(event["dart_locationx"]), _centi(event["dart_locationy"]),
+                                 event.get("dart_segment", 0), event.get("dart_multiplier", 0),
+                                 event.get("dart_points", 0))
+                size += DART_SIZE
+            count = len(events)
+        elif code == 3:
+            event = events[0]
+            struct.pack_into(TURN, buf, size, event.get("seq", 0), int(event["game_id"]),
+                             int(event["player_id"]), int(event["game_turn"]))
+            size += TURN_SIZE
+            count = 1
+        else:
+            struct.pack_into(POLL, buf, size, events[0].get("wait", 0) if events else 0)
+            size += struct.calcsize(POLL)
+            count = 1
+        struct.pack_into(FRAME, buf, 0, VERSION, code, count)
+        return bytes(memoryview(buf)[:size])
+
+    #   Reply of the server as a dict, or None if a binary request got an answer in another format
+    #   (the codec switched to JSON and the request has to be sent again)
+    def decode(self, response):
+        if not self.binary:
+            return response.json()
+        if response.content_type != CONTENT_TYPE:
+            self.binary = False
+            self.fallbacks += 1
+            return None
+        return decode_reply(response.content)
+
+    #   Send one request and return the reply, falls back to JSON if the server does not know the format
+    def post(self, client, url, action, events=(), headers=None, timeout=None):
+        while True:
+            response = client.post(url, data=self.encode(action, events), headers=self.headers(headers),
+                                   timeout=timeout)
+            reply = self.decode(response)
+            response.close()
+            if reply is not None:
+                return reply
+
+    #   Coroutine of post, the other tasks run while the request waits for the server
+    async def apost(self, client, url, action, events=(), headers=None, timeout=None):
+        while True:
+            response = await client.apost(url, data=self.encode(action, events), headers=self.headers(headers),
+                                          timeout=timeout)
+            reply = self.decode(response)
+            response.close()
+            if reply is not None:
+                return reply
+
+
+#   Reply frame to a dict like the JSON reply
+def decode_reply(data):
+    version, code, count = struct.unpack_from(FRAME, data, 0)
+    if code == 1:
+        flags, game_id, player_id, game_turn = struct.unpack_from(NEW_GAME, data, FRAME_SIZE)
+        if not flags & 1:
+            return {"gameStatus": False, "longPoll": bool(flags & 2)}
+        return {"gameStatus": True, "game_id": game_id, "player_id": player_id, "game_turn": game_turn,
+                "longPoll": bool(flags & 2)}
+    if code == 2:
+        success, duplicates = struct.unpack_from(DARTS_REPLY, data, FRAME_SIZE)
+        offset = FRAME_SIZE + struct.calcsize(DARTS_REPLY)
+        acks = [struct.unpack_from(ACK, data, offset + 4 * i)[0] for i in range(count)]
+        return {"success": bool(success), "acks": acks, "duplicates": duplicates}
+    turn, duplicate = struct.unpack_from(TURN_REPLY, data, FRAME_SIZE)
+    return {"turn": bool(turn), "duplicate": bool(duplicate)}
+
+
+#   Request frame to the dict of the JSON request (used by the stand-in server)
+def decode_request(data):
+    version, code, count = struct.unpack_from(FRAME, data, 0)
+    if code == 1:
+        wait = struct.unpack_from(POLL, data, FRAME_SIZE)[0] if count else 0
+        return {"action": "gettingNewGame", "wait": wait}
+    if code == 2:
+        darts = []
+        for i in range(count):
+            seq, game_id, player_id, game_turn, x, y, segment, multiplier, points = struct.unpack_from(
+                DART, data, FRAME_SIZE + i * DART_SIZE)
+            darts.append({"action": "sendDart", "seq": seq, "game_id": game_id, "player_id": player_id,
+                          "game_turn": game_turn, "dart_locationx": _location(x),
+                          "dart_locationy": _location(y), "dart_segment": segment,
+                          "dart_multiplier": multiplier, "dart_points": points})
+        return {"action": "sendDarts", "darts": darts}
+    seq, game_id, player_id, game_turn = struct.unpack_from(TURN, data, FRAME_SIZE)
+    return {"action": "nextTurn", "seq": seq, "game_id": game_id, "player_id": player_id,
+            "game_turn": game_turn}
+
+
+#   Reply dict to a reply frame (used by the stand-in server)
+def encode_reply(action, reply):
+    code = ACTIONS[action]
+    if code == 1:
+        flags = (1 if reply.get("gameStatus") else 0) | (2 if reply.get("longPoll") else 0)
+        return struct.pack(FRAME + NEW_GAME[1:], VERSION, 1, 1, flags,
+                           reply.get("game_id", 0), reply.get("player_id", 0), reply.get("game_turn", 0))
+    if code == 2:
+        acks = reply.get("acks", [])
+        return (struct.pack(FRAME + DARTS_REPLY[1:], VERSION, 2, len(acks), bool(reply.get("success")),
+                            reply.get("duplicates", 0)) +
+                b"".join(struct.pack(ACK, seq or 0) for seq in acks))
+    return struct.pack(FRAME + TURN_REPLY[1:], VERSION, 3, 1, bool(reply.get("turn")),
+                       bool(reply.get("duplicate")))